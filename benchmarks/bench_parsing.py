@@ -0,0 +1,144 @@
+"""
+Micro-benchmark: BeautifulSoup parsing vs the streaming lxml parsers.
+
+Builds a synthetic main page and video page and times:
+  * the BeautifulSoup path the bot used before (whole page, html.parser)
+  * the streaming ListingParser reading the whole listing
+  * the streaming ListingParser stopping at the stored last ID / after the first block
+  * both approaches on a video page
+
+Run from the repository root:
+    python benchmarks/bench_parsing.py [--blocks 120] [--new 3] [--repeat 20]
+"""
+import os
+import sys
+import argparse
+import timeit
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from page_parser import ListingParser, VideoSourceParser  # noqa: E402
+
+CHUNK_SIZE = 16 * 1024  # Roughly what a socket read hands the parser
+
+
+def build_listing(blocks):
+    """A main page with `blocks` video blocks and some surrounding markup"""
+    head = '<html><head><title>Videos</title>' + '<script>var x = 1;</script>' * 20 + '</head><body>'
+    nav = '<div class="nav">' + ''.join(f'<a href="/c/{i}">Category {i}</a>' for i in range(50)) + '</div>'
+    items = ''.join(
+        f'<li class="video_block" id="{100000 - i}">'
+        f'<a class="image" href="/video/{100000 - i}/"><img src="/thumbs/{i}.jpg" alt="Video {i}"></a>'
+        f'<div class="info"><a class="title" href="/video/{100000 - i}/">Video title number {i}</a>'
+        f'<span class="duration">12:34</span><span class="views">{i * 37} views</span></div></li>'
+        for i in range(blocks)
+    )
+    footer = '<div class="footer">' + '<p>Footer text</p>' * 100 + '</div></body></html>'
+    return (head + nav + f'<ul class="videos_ul">{items}</ul>' + footer).encode()
+
+
+def build_video_page():
+    """A video page with the player after a typical amount of header markup"""
+    head = '<html><head><title>Video</title>' + '<link rel="stylesheet" href="/s.css">' * 20 + '</head><body>'
+    nav = '<div class="nav">' + ''.join(f'<a href="/c/{i}">Category {i}</a>' for i in range(50)) + '</div>'
+    player = ('<div class="col_video"><div class="player-wrapper">'
+              '<video src="/files/video.mp4" controls></video></div></div>')
+    related = '<ul class="related">' + ''.join(
+        f'<li><a href="/video/{i}/"><img src="/thumbs/{i}.jpg"></a><p>Related {i}</p></li>' for i in range(200)
+    ) + '</ul>'
+    return (head + nav + player + related + '</body></html>').encode()
+
+
+def chunks(data):
+    return [data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+
+
+def bs4_listing(html, stop_id=None):
+    soup = BeautifulSoup(html, 'html.parser')
+    videos = []
+    for block in soup.find('ul', class_='videos_ul').find_all('li', class_='video_block'):
+        if block.get('id') == stop_id:
+            break
+        link = block.find('a', class_='image')
+        videos.append({'id': block.get('id'), 'url': link.get('href') if link else None})
+    return videos
+
+
+def stream_listing(parts, stop_id=None, limit=None):
+    parser = ListingParser(stop=(lambda video_id: video_id == stop_id) if stop_id else None, limit=limit)
+    read = 0
+    for chunk in parts:
+        read += len(chunk)
+        if parser.feed(chunk):
+            break
+    else:
+        parser.finish()
+    return parser.videos, read
+
+
+def bs4_video(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return soup.find('div', class_='col_video').find('div', class_='player-wrapper').find('video').get('src')
+
+
+def stream_video(parts):
+    parser = VideoSourceParser()
+    read = 0
+    for chunk in parts:
+        read += len(chunk)
+        if parser.feed(chunk):
+            break
+    else:
+        parser.finish()
+    return parser.src, read
+
+
+def report(name, func, repeat, read=None, total=None):
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    line = f"{name:<42} {best * 1000:9.3f} ms"
+    if read is not None:
+        line += f"   read {read / 1024:7.1f} of {total / 1024:.1f} KiB"
+    print(line)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--blocks', type=int, default=120, help='video blocks on the main page')
+    arg_parser.add_argument('--new', type=int, default=3, help='new videos before the stored last ID')
+    arg_parser.add_argument('--repeat', type=int, default=20, help='timing repetitions (best is reported)')
+    args = arg_parser.parse_args()
+
+    listing = build_listing(args.blocks)
+    listing_parts = chunks(listing)
+    stop_id = str(100000 - args.new)
+
+    # Both paths must agree before their timings mean anything
+    assert bs4_listing(listing, stop_id) == stream_listing(listing_parts, stop_id)[0]
+    assert bs4_listing(listing) == stream_listing(listing_parts)[0]
+
+    print(f"Main page: {len(listing) / 1024:.1f} KiB, {args.blocks} blocks, {args.new} new\n")
+    baseline = report("BeautifulSoup (html.parser)", lambda: bs4_listing(listing, stop_id), args.repeat)
+    for name, kwargs in (
+        ("lxml streaming, whole listing", {}),
+        ("lxml streaming, stop at last ID", {'stop_id': stop_id}),
+        ("lxml streaming, first block only", {'limit': 1}),
+    ):
+        read = stream_listing(listing_parts, **kwargs)[1]
+        best = report(name, lambda: stream_listing(listing_parts, **kwargs), args.repeat, read, len(listing))
+        print(f"{'':<42} {baseline / best:9.1f}x faster")
+
+    page = build_video_page()
+    page_parts = chunks(page)
+    assert bs4_video(page) == stream_video(page_parts)[0]
+
+    print(f"\nVideo page: {len(page) / 1024:.1f} KiB\n")
+    baseline = report("BeautifulSoup (html.parser)", lambda: bs4_video(page), args.repeat)
+    read = stream_video(page_parts)[1]
+    best = report("lxml streaming, stop at video tag", lambda: stream_video(page_parts), args.repeat, read, len(page))
+    print(f"{'':<42} {baseline / best:9.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
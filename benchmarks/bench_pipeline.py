@@ -0,0 +1,169 @@
+"""
+End-to-end benchmark: VideoParserBot against a local fake website and fake Bot API.
+
+For every combination of --videos (backlog size) and --size-mb (file size) the bot
+runs in a fresh process, so peak RSS belongs to that run alone. The fake services
+(benchmarks/fake_services.py) run in a separate process with the given bandwidth
+limits. The bot starts with a baseline video already recorded, finds the backlog in
+one check and processes it with the real pipeline (download, faststart, thumbnail,
+upload, notifications). Reported per run:
+  * videos per hour over the whole backlog
+  * time to publish, from the start of the check to the upload of the first video,
+    the median and the last one
+  * average MB/s from the website to Telegram
+  * peak RSS of the bot process
+
+Run from the repository root (Linux):
+    python benchmarks/bench_pipeline.py [--videos 1,5] [--size-mb 20,200]
+        [--download-mbps 40] [--upload-mbps 20] [--jobs 2] [--moov-front]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FAKE_SERVICES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_services.py')
+CHANNEL_ID = '-100'
+
+
+def start_services(args, videos, size_mb, workdir):
+    """Start the fake website and Bot API; returns (process, ports)"""
+    command = [
+        sys.executable, FAKE_SERVICES, '--videos', str(videos), '--size-mb', str(size_mb),
+        '--download-mbps', str(args.download_mbps), '--upload-mbps', str(args.upload_mbps), '--workdir', workdir
+    ]
+    if not args.moov_front:
+        command.append('--moov-at-end')
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line:
+        process.wait()
+        raise RuntimeError("Fake services did not start")
+    return process, json.loads(line)
+
+
+async def run_pipeline(ports):
+    """Process the fake backlog with the real bot; returns (start time, published count, Bot API records)"""
+    # Configuration is read at import time
+    import video_parser_bot
+    import state_store
+
+    bot = video_parser_bot.VideoParserBot()
+    try:
+        bot.store.discover([{'id': ports['baseline_id'], 'url': None}], state=state_store.BASELINE)
+        started = time.time()
+        new_videos = await bot.get_new_videos()
+        published = await bot.process_backlog(new_videos)
+    finally:
+        await bot.close()
+    async with httpx.AsyncClient() as client:
+        records = (await client.get(f"http://127.0.0.1:{ports['api']}/stats")).json()
+    return started, published, records
+
+
+def run_one(args, videos, size_mb):
+    """One benchmark run in this process; returns the result dict"""
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    process, ports = start_services(args, videos, size_mb, workdir)
+    try:
+        os.environ.update({
+            'WEBSITE_URL': f"http://127.0.0.1:{ports['site']}/",
+            'TELEGRAM_BOT_TOKEN': '123456:bench',
+            'LOCAL_BOT_API_SERVER': f"http://127.0.0.1:{ports['api']}",
+            'TELEGRAM_CHANNEL_ID': CHANNEL_ID,
+            'ADMIN_ID': '1',
+            'STATE_DB_FILE': os.path.join(workdir, 'bot_state.db'),
+            'METRICS_PORT': '0',
+            'METRICS_FILE': os.path.join(workdir, 'metrics.jsonl'),
+            'MAX_CONCURRENT_JOBS': str(args.jobs),
+        })
+        os.chdir(workdir)
+        sys.path.insert(0, ROOT)
+        logging.disable(logging.NOTSET if args.verbose else logging.WARNING)
+
+        rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started, published, records = asyncio.run(run_pipeline(ports))
+        finished = time.time()
+    finally:
+        process.terminate()
+        process.wait()
+        if args.keep:
+            print(f"Kept {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    posts = sorted(
+        record['finished'] - started for record in records
+        if record['method'] in ('sendVideo', 'sendMediaGroup') and record['chat_id'] == CHANNEL_ID
+    )
+    uploaded = sum(record['bytes'] for record in records if record['method'] in ('sendVideo', 'sendMediaGroup'))
+    wall = finished - started
+    return {
+        'videos': videos,
+        'size_mb': size_mb,
+        'published': published,
+        'wall': wall,
+        'videos_per_hour': published / wall * 3600 if wall else 0,
+        'first': posts[0] if posts else None,
+        'median': statistics.median(posts) if posts else None,
+        'last': posts[-1] if posts else None,
+        'mb_per_second': uploaded / (1024 * 1024) / wall if wall else 0,
+        # ru_maxrss is in KiB on Linux
+        'rss_start_mb': rss_start / 1024,
+        'rss_peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def format_seconds(value):
+    return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--videos', default='1,5', help='backlog sizes, comma-separated')
+    arg_parser.add_argument('--size-mb', default='20,200', help='video sizes in MB, comma-separated')
+    arg_parser.add_argument('--download-mbps', type=float, default=0, help='website bandwidth in MB/s (0: unlimited)')
+    arg_parser.add_argument('--upload-mbps', type=float, default=0, help='Bot API bandwidth in MB/s (0: unlimited)')
+    arg_parser.add_argument('--jobs', type=int, default=2, help='MAX_CONCURRENT_JOBS of the bot')
+    arg_parser.add_argument('--moov-front', action='store_true', help='serve faststart MP4s (default: moov at the end)')
+    arg_parser.add_argument('--keep', action='store_true', help='keep the temporary work directories')
+    arg_parser.add_argument('--verbose', action='store_true', help='show the bot log')
+    arg_parser.add_argument('--run-one', nargs=2, type=int, metavar=('VIDEOS', 'SIZE_MB'), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(args, *args.run_one)))
+        return
+
+    print(f"Website {args.download_mbps or 'unlimited'} MB/s, Bot API {args.upload_mbps or 'unlimited'} MB/s, "
+          f"{args.jobs} concurrent jobs, moov {'in front' if args.moov_front else 'at the end'}\n")
+    print(f"{'videos':>6} {'MB':>6} {'done':>5} {'wall s':>8} {'videos/h':>9} "
+          f"{'first s':>8} {'median s':>8} {'last s':>8} {'MB/s':>7} {'RSS MB':>7}")
+    options = sys.argv[1:]
+    for videos in (int(value) for value in args.videos.split(',')):
+        for size_mb in (int(value) for value in args.size_mb.split(',')):
+            # A fresh process per run, so peak RSS is not carried over
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__)] + options + ['--run-one', str(videos), str(size_mb)],
+                stdout=subprocess.PIPE, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{result['videos']:>6} {result['size_mb']:>6} {result['published']:>5} {result['wall']:8.1f} "
+                  f"{result['videos_per_hour']:9.0f} {format_seconds(result['first'])} "
+                  f"{format_seconds(result['median'])} {format_seconds(result['last'])} "
+                  f"{result['mb_per_second']:7.1f} {result['rss_peak_mb']:7.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Startup benchmark: cost of a `video_parser_bot.py --once` check that finds nothing new.
+
+Runs the bot as cron would, against the local fake website (benchmarks/fake_services.py)
+with a state database that already knows every listed video, and reports per run:
+  * wall time of the whole process, from exec to exit
+  * peak RSS of the process
+Also times a bare `import video_parser_bot`, with and without the heavy modules it
+loads lazily (python-telegram-bot, OpenCV), to show what a quiet check avoids.
+
+Run from the repository root (Linux):
+    python benchmarks/bench_startup.py [--repeat 5]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BOT = os.path.join(ROOT, 'video_parser_bot.py')
+FAKE_SERVICES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_services.py')
+
+
+def measure(command, env, cwd):
+    """Run a command; returns (wall seconds, peak RSS in MB, exit code)"""
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in KiB on Linux
+    return time.perf_counter() - started, usage.ru_maxrss / 1024, process.returncode
+
+
+def report(name, runs):
+    walls = [wall for wall, _, _ in runs]
+    peaks = [peak for _, peak, _ in runs]
+    failed = sum(1 for _, _, code in runs if code)
+    print(f"{name:<44} {statistics.median(walls) * 1000:8.0f} {min(walls) * 1000:8.0f} "
+          f"{statistics.median(peaks):8.1f}{'   (' + str(failed) + ' failed)' if failed else ''}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--repeat', type=int, default=5, help='runs per measurement')
+    args = arg_parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    services = subprocess.Popen(
+        [sys.executable, FAKE_SERVICES, '--videos', '5', '--size-mb', '1', '--workdir', workdir],
+        stdout=subprocess.PIPE, text=True
+    )
+    try:
+        ports = json.loads(services.stdout.readline())
+        env = dict(
+            os.environ,
+            WEBSITE_URL=f"http://127.0.0.1:{ports['site']}/",
+            TELEGRAM_BOT_TOKEN='123456:bench',
+            LOCAL_BOT_API_SERVER=f"http://127.0.0.1:{ports['api']}",
+            TELEGRAM_CHANNEL_ID='-100',
+            ADMIN_ID='1',
+            STATE_DB_FILE=os.path.join(workdir, 'bot_state.db'),
+            METRICS_PORT='0',
+            METRICS_FILE='',
+            LISTING_CACHE_TTL='0',
+        )
+        # The first run records every listed video as the baseline; later checks find nothing new
+        _, _, code = measure([sys.executable, BOT, '--once'], env, workdir)
+        if code:
+            raise RuntimeError(f"Baseline run failed with exit code {code}")
+
+        print(f"{'':<44} {'median':>8} {'best':>8} {'RSS':>8}")
+        print(f"{'':<44} {'ms':>8} {'ms':>8} {'MB':>8}")
+        report("--once, nothing new", [
+            measure([sys.executable, BOT, '--once'], env, workdir) for _ in range(args.repeat)
+        ])
+        report("import video_parser_bot", [
+            measure([sys.executable, '-c', 'import video_parser_bot'], dict(env, PYTHONPATH=ROOT), workdir)
+            for _ in range(args.repeat)
+        ])
+        report("import video_parser_bot + telegram + cv2", [
+            measure([sys.executable, '-c', 'import video_parser_bot, telegram, cv2'], dict(env, PYTHONPATH=ROOT), workdir)
+            for _ in range(args.repeat)
+        ])
+        report("python -c pass (interpreter only)", [
+            measure([sys.executable, '-c', 'pass'], env, workdir) for _ in range(args.repeat)
+        ])
+    finally:
+        services.terminate()
+        services.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
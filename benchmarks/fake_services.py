@@ -0,0 +1,415 @@
+"""
+Local stand-ins for the website and the Telegram Bot API, for offline benchmarks.
+
+  * FakeSite serves a generated main page (ul.videos_ul with li.video_block items),
+    video pages and MP4 files, with Range support and optional bandwidth throttling.
+    Every video is served from one generated MP4 with the video ID written into its
+    media data, so each video has its own content (and fingerprint) without a file
+    per video on disk.
+  * FakeBotApi accepts the Bot API methods the bot uses (sendVideo, sendMediaGroup,
+    sendMessage, editMessageText, deleteMessage, ...), reads upload bodies without
+    keeping them, optionally throttled, and records the timing of every request.
+    GET /stats returns the records as JSON.
+
+Both are minimal HTTP/1.1 servers on asyncio with keep-alive. Run them on their own:
+    python benchmarks/fake_services.py --videos 10 --size-mb 50 [--download-mbps 40]
+or use them from bench_pipeline.py, which starts this script as a subprocess.
+"""
+import os
+import sys
+import json
+import time
+import re
+import struct
+import asyncio
+import argparse
+import urllib.parse
+
+READ_SIZE = 256 * 1024  # Bytes per read/write when serving or receiving bodies
+SALT_SIZE = 64  # Bytes of media data overwritten with the video ID
+HEAD_SIZE = 64 * 1024  # Bytes kept from the start of an upload body (the fields come before the files)
+# A 160x90 H.264 (baseline) picture: parameter sets and one IDR slice, written at the
+# start of every keyframe sample so thumbnails decode like they would from a real video
+SPS = bytes.fromhex('6742c00bd9028df930110000030001000003003' '20f142a48')
+PPS = bytes.fromhex('68cb8112c8')
+IDR = bytes.fromhex(
+    '6588840af118a00021471c00040fa38000818c9c9c9c9c9c9c9c9c9d75d75d75d75d75d75d75d75d75d75d75d75'
+    'd75d75d75d75d75d75d75d75d75d75d75d75d75e0'
+)
+CHAT_ID_RE = re.compile(rb'name="chat_id"\r\n\r\n([^\r]+)|chat_id=([^&]+)|"chat_id": ?"?([^",}]+)')
+
+
+def _box(box_type, payload):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def _full_box(box_type, payload, version=0, flags=0):
+    return _box(box_type, struct.pack('>I', (version << 24) | flags) + payload)
+
+
+def _matrix():
+    return struct.pack('>9I', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+
+
+def _moov(width, height, fps, sample_sizes, chunk_offsets, samples_per_chunk, keyframe_interval):
+    """A moov box with one H.264 video track laid out as given"""
+    timescale = fps * 1000
+    count = len(sample_sizes)
+    duration = count * 1000
+    wide = max(chunk_offsets, default=0) > 0xFFFFFFFF
+
+    mvhd = _full_box(b'mvhd', struct.pack('>IIII', 0, 0, timescale, duration) + struct.pack('>IH10x', 0x10000, 0x100)
+                     + _matrix() + bytes(24) + struct.pack('>I', 2))
+    tkhd = _full_box(b'tkhd', struct.pack('>IIIII', 0, 0, 1, 0, duration) + bytes(8) + struct.pack('>HHHH', 0, 0, 0, 0)
+                     + _matrix() + struct.pack('>II', width << 16, height << 16), flags=3)
+    mdhd = _full_box(b'mdhd', struct.pack('>IIIIHH', 0, 0, timescale, duration, 0x55c4, 0))
+    hdlr = _full_box(b'hdlr', struct.pack('>I4s12x', 0, b'vide') + b'VideoHandler\0')
+    vmhd = _full_box(b'vmhd', bytes(8), flags=1)
+    dinf = _box(b'dinf', _full_box(b'dref', struct.pack('>I', 1) + _full_box(b'url ', b'', flags=1)))
+
+    avcc = _box(b'avcC', bytes([1, 0x42, 0xc0, 0x0b, 0xff, 0xe1]) + struct.pack('>H', len(SPS)) + SPS
+                + bytes([1]) + struct.pack('>H', len(PPS)) + PPS)
+    avc1 = _box(b'avc1', bytes(6) + struct.pack('>H', 1) + bytes(16) + struct.pack('>HH', width, height)
+                + struct.pack('>III', 0x480000, 0x480000, 0) + struct.pack('>H', 1) + bytes(32)
+                + struct.pack('>Hh', 0x18, -1) + avcc)
+    stsd = _full_box(b'stsd', struct.pack('>I', 1) + avc1)
+    stts = _full_box(b'stts', struct.pack('>III', 1, count, 1000))
+    keyframes = range(1, count + 1, keyframe_interval)
+    stss = _full_box(b'stss', struct.pack(f'>I{len(keyframes)}I', len(keyframes), *keyframes))
+    stsc = _full_box(b'stsc', struct.pack('>IIII', 1, 1, samples_per_chunk, 1))
+    stsz = _full_box(b'stsz', struct.pack(f'>II{count}I', 0, count, *sample_sizes))
+    stco = _full_box(b'co64' if wide else b'stco',
+                     struct.pack(f'>I{len(chunk_offsets)}{"Q" if wide else "I"}', len(chunk_offsets), *chunk_offsets))
+    stbl = _box(b'stbl', stsd + stts + stss + stsc + stsz + stco)
+    minf = _box(b'minf', vmhd + dinf + stbl)
+    mdia = _box(b'mdia', mdhd + hdlr + minf)
+    trak = _box(b'trak', tkhd + mdia)
+    return _box(b'moov', mvhd + trak)
+
+
+def generate_mp4(path, size, duration=600, fps=25, width=1280, height=720, moov_at_end=True):
+    """
+    Write an MP4 of about `size` bytes: a valid container (duration, resolution, sample
+    tables with a keyframe every 2 s) around filler media data. Keyframes hold a small
+    real picture, other samples are random bytes, so players cannot play the video but
+    everything the bot reads or decodes is real. Returns the file offset where per-video
+    salt may be written (inside the second sample, which is never decoded).
+    """
+    ftyp = _box(b'ftyp', b'isom' + struct.pack('>I', 512) + b'isomiso2avc1mp41')
+    count = duration * fps
+    samples_per_chunk = fps
+    keyframe_interval = 2 * fps
+    payload = max(size - 64 * 1024, count * (len(IDR) + 16))
+    sample_sizes = [payload // count] * count
+    sample_sizes[-1] += payload - sum(sample_sizes)
+
+    def layout(mdat_offset):
+        offsets, position = [], mdat_offset + 16
+        for index in range(0, count, samples_per_chunk):
+            offsets.append(position)
+            position += sum(sample_sizes[index:index + samples_per_chunk])
+        return offsets
+
+    moov_args = (width, height, fps, sample_sizes)
+    if moov_at_end:
+        moov = _moov(*moov_args, layout(len(ftyp)), samples_per_chunk, keyframe_interval)
+        mdat_offset = len(ftyp)
+    else:
+        # The moov size does not depend on the offsets it holds (as long as their width stays the same)
+        size_probe = _moov(*moov_args, layout(0), samples_per_chunk, keyframe_interval)
+        mdat_offset = len(ftyp) + len(size_probe)
+        moov = _moov(*moov_args, layout(mdat_offset), samples_per_chunk, keyframe_interval)
+
+    noise = os.urandom(4 * 1024 * 1024)
+    picture = struct.pack('>I', len(IDR)) + IDR
+    position = 0
+    with open(path, 'wb') as f:
+        f.write(ftyp)
+        if not moov_at_end:
+            f.write(moov)
+        f.write(struct.pack('>I4sQ', 1, b'mdat', 16 + payload))
+        for index, sample_size in enumerate(sample_sizes):
+            if index % keyframe_interval == 0:
+                # The picture, then a filler NAL unit (type 12) up to the sample size
+                filler = sample_size - len(picture) - 4
+                f.write(picture + struct.pack('>IB', filler, 12) + b'\xff' * (filler - 1))
+                continue
+            while sample_size:
+                data = noise[position:position + sample_size]
+                f.write(data)
+                sample_size -= len(data)
+                position = (position + len(data)) % len(noise)
+        if moov_at_end:
+            f.write(moov)
+    return mdat_offset + 16 + sample_sizes[0]
+
+
+class Throttle:
+    """Shared bandwidth limit in bytes per second (None: unlimited)"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._available_at = time.monotonic()
+
+    async def consume(self, size):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._available_at = max(self._available_at, now) + size / self.rate
+        if self._available_at > now:
+            await asyncio.sleep(self._available_at - now)
+
+
+async def read_request(reader):
+    """Read a request line and headers; returns (method, path, headers) or None at EOF"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, path, _ = line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return method, path, headers
+
+
+async def read_body(reader, headers, throttle=None, keep=True):
+    """
+    Read a request body (Content-Length or chunked); returns (body, size). Without keep,
+    only the first HEAD_SIZE bytes are returned.
+    """
+    parts = []
+    size = 0
+
+    async def take(count):
+        nonlocal size
+        while count:
+            data = await reader.read(min(READ_SIZE, count))
+            if not data:
+                raise ConnectionError("Connection closed in the request body")
+            count -= len(data)
+            size += len(data)
+            if keep or size - len(data) < HEAD_SIZE:
+                parts.append(data)
+            if throttle:
+                await throttle.consume(len(data))
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            chunk_size = int((await reader.readline()).split(b';')[0], 16)
+            if not chunk_size:
+                await reader.readline()
+                break
+            await take(chunk_size)
+            await reader.readline()
+    else:
+        await take(int(headers.get('content-length', 0)))
+    body = b''.join(parts)
+    return (body if keep else body[:HEAD_SIZE]), size
+
+
+def write_head(writer, status, headers):
+    lines = [f'HTTP/1.1 {status}'] + [f'{name}: {value}' for name, value in headers.items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+
+class FakeSite:
+    """The website: main page, video pages and (throttled, range-capable) video files"""
+
+    def __init__(self, mp4_path, salt_offset, videos, first_id=1000, rate=None):
+        self.mp4_path = mp4_path
+        self.salt_offset = salt_offset
+        self.size = os.path.getsize(mp4_path)
+        # Newest first, like the real listing; the oldest one is the bot's baseline
+        self.ids = [str(first_id + index) for index in range(videos, -1, -1)]
+        self.throttle = Throttle(rate)
+
+    def listing(self):
+        items = ''.join(
+            f'<li class="video_block" id="{video_id}"><a class="image" href="/video/{video_id}/">'
+            f'<img src="/thumbs/{video_id}.jpg"></a><a class="title" href="/video/{video_id}/">Video {video_id}</a></li>'
+            for video_id in self.ids
+        )
+        return f'<html><head><title>Videos</title></head><body><ul class="videos_ul">{items}</ul></body></html>'.encode()
+
+    def video_page(self, video_id):
+        return (f'<html><body><div class="col_video"><div class="player-wrapper">'
+                f'<video src="/files/{video_id}.mp4" controls></video></div></div></body></html>').encode()
+
+    def salt(self, video_id):
+        return video_id.encode().ljust(SALT_SIZE, b'#')
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers = request
+                await read_body(reader, headers, keep=False)
+                if path == '/':
+                    await self.send(writer, 200, self.listing(), 'text/html; charset=utf-8')
+                elif path.startswith('/video/'):
+                    await self.send(writer, 200, self.video_page(path.strip('/').split('/')[-1]), 'text/html; charset=utf-8')
+                elif path.startswith('/files/') and path.endswith('.mp4'):
+                    await self.send_file(writer, method, path[len('/files/'):-len('.mp4')], headers.get('range'))
+                else:
+                    await self.send(writer, 404, b'Not found', 'text/plain')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, body, content_type):
+        write_head(writer, {200: '200 OK', 404: '404 Not Found'}[status],
+                   {'Content-Type': content_type, 'Content-Length': len(body)})
+        writer.write(body)
+        await writer.drain()
+
+    async def send_file(self, writer, method, video_id, range_header):
+        start, end = 0, self.size - 1
+        status = '200 OK'
+        headers = {'Content-Type': 'video/mp4', 'Accept-Ranges': 'bytes', 'ETag': f'"{video_id}-{self.size}"'}
+        if range_header and range_header.startswith('bytes='):
+            first, _, last = range_header[len('bytes='):].partition('-')
+            if first:
+                start, end = int(first), min(int(last), self.size - 1) if last else self.size - 1
+            else:
+                start = max(0, self.size - int(last))
+            status = '206 Partial Content'
+            headers['Content-Range'] = f'bytes {start}-{end}/{self.size}'
+        headers['Content-Length'] = end - start + 1
+        write_head(writer, status, headers)
+        if method == 'HEAD':
+            await writer.drain()
+            return
+
+        salt = self.salt(video_id)
+        with open(self.mp4_path, 'rb') as f:
+            f.seek(start)
+            position = start
+            while position <= end:
+                data = bytearray(f.read(min(READ_SIZE, end - position + 1)))
+                # Overwrite the salted bytes of the media data with this video's ID
+                low, high = max(position, self.salt_offset), min(position + len(data), self.salt_offset + SALT_SIZE)
+                if low < high:
+                    data[low - position:high - position] = salt[low - self.salt_offset:high - self.salt_offset]
+                await self.throttle.consume(len(data))
+                writer.write(data)
+                await writer.drain()
+                position += len(data)
+
+
+class FakeBotApi:
+    """The Bot API: answers every method, reads uploads (optionally throttled) and records timings"""
+
+    def __init__(self, rate=None):
+        self.throttle = Throttle(rate)
+        self.records = []
+        self._next_id = 1
+
+    def next_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def message(self, chat_id, video=False):
+        message_id = self.next_id()
+        chat = {'id': int(chat_id) if chat_id and chat_id.lstrip('-').isdigit() else -100, 'type': 'channel'}
+        message = {'message_id': message_id, 'date': int(time.time()), 'chat': chat}
+        if video:
+            message['video'] = {'file_id': f'FILE{message_id}', 'file_unique_id': f'U{message_id}',
+                                'width': 1280, 'height': 720, 'duration': 600}
+        return message
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers = request
+                started = time.time()
+                api_method = path.split('?')[0].rsplit('/', 1)[-1]
+                uploading = 'multipart' in headers.get('content-type', '')
+                body, size = await read_body(reader, headers, self.throttle if uploading else None, keep=False)
+
+                if method == 'GET' and path == '/stats':
+                    payload = json.dumps(self.records).encode()
+                else:
+                    chat_id = self.chat_id(body)
+                    result = self.result(api_method, chat_id, body)
+                    payload = json.dumps({'ok': True, 'result': result}).encode()
+                    self.records.append({
+                        'method': api_method, 'chat_id': chat_id,
+                        'started': started, 'finished': time.time(), 'bytes': size
+                    })
+                write_head(writer, '200 OK', {'Content-Type': 'application/json', 'Content-Length': len(payload)})
+                writer.write(payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def chat_id(body):
+        """chat_id of a multipart, form or JSON request body"""
+        match = CHAT_ID_RE.search(body)
+        if not match:
+            return None
+        value = next(group for group in match.groups() if group is not None)
+        return urllib.parse.unquote(value.decode())
+
+    def result(self, api_method, chat_id, body):
+        if api_method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        if api_method == 'sendVideo':
+            return self.message(chat_id, video=True)
+        if api_method == 'sendMediaGroup':
+            items = body.count(b'"type"') + body.count(b'%22type%22')
+            return [self.message(chat_id, video=True) for _ in range(max(1, items))]
+        if api_method in ('sendMessage', 'editMessageText'):
+            return self.message(chat_id)
+        return True
+
+
+async def serve(args):
+    mp4_path = os.path.join(args.workdir, f'source_{args.size_mb}mb_{"end" if args.moov_at_end else "front"}.mp4')
+    salt_offset = generate_mp4(mp4_path, args.size_mb * 1024 * 1024, moov_at_end=args.moov_at_end)
+    site = FakeSite(mp4_path, salt_offset, args.videos,
+                    rate=args.download_mbps * 1024 * 1024 if args.download_mbps else None)
+    api = FakeBotApi(rate=args.upload_mbps * 1024 * 1024 if args.upload_mbps else None)
+    site_server = await asyncio.start_server(site.handle, '127.0.0.1', args.site_port)
+    api_server = await asyncio.start_server(api.handle, '127.0.0.1', args.api_port)
+    ports = {
+        'site': site_server.sockets[0].getsockname()[1],
+        'api': api_server.sockets[0].getsockname()[1],
+        'baseline_id': site.ids[-1]
+    }
+    # The parent process reads the ports from the first line
+    print(json.dumps(ports), flush=True)
+    async with site_server, api_server:
+        await asyncio.gather(site_server.serve_forever(), api_server.serve_forever())
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--videos', type=int, default=10, help='new videos on the main page')
+    arg_parser.add_argument('--size-mb', type=int, default=50, help='size of each video')
+    arg_parser.add_argument('--download-mbps', type=float, default=0, help='website bandwidth in MB/s (0: unlimited)')
+    arg_parser.add_argument('--upload-mbps', type=float, default=0, help='Bot API bandwidth in MB/s (0: unlimited)')
+    arg_parser.add_argument('--moov-at-end', action='store_true', help='put moov after the media data')
+    arg_parser.add_argument('--site-port', type=int, default=0)
+    arg_parser.add_argument('--api-port', type=int, default=0)
+    arg_parser.add_argument('--workdir', default='.', help='where the generated MP4 is written')
+    try:
+        asyncio.run(serve(arg_parser.parse_args()))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+
+import httpx
+from telegram import Message
+from telegram.error import RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+
+class Reiterable:
+    """An async iterable that calls `factory()` for a new async iterator every time"""
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def __aiter__(self):
+        return self.factory().__aiter__()
+
+
+class UploadFile:
+    """
+    A file part of a multipart upload whose size is known before sending.
+    Parts made by from_bytes() and from_path() can be sent again when a request is retried.
+    """
+
+    def __init__(self, filename, size, chunks, content_type='application/octet-stream'):
+        self.filename = filename
+        self.size = size
+        self.chunks = chunks  # Async iterable yielding exactly `size` bytes
+        self.content_type = content_type
+
+    @classmethod
+    def from_bytes(cls, filename, data, content_type='application/octet-stream'):
+        """Create a part from an in-memory payload (e.g. a thumbnail)"""
+        async def chunks():
+            yield data
+        return cls(filename, len(data), Reiterable(chunks), content_type)
+
+    @classmethod
+    def from_path(cls, path, content_type='application/octet-stream', chunk_size=1024 * 1024):
+        """Create a part that reads a file from disk as the body is sent"""
+        async def chunks():
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = await asyncio.to_thread(f.read, chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        return cls(os.path.basename(path), os.path.getsize(path), Reiterable(chunks), content_type)
+
+
+class UploadProgress:
+    """
+    Logs bytes sent and throughput of an upload, at most every `interval` seconds.
+    `listener`, if given, is called with (bytes sent, total size) after every chunk.
+    """
+
+    def __init__(self, name, total, interval=10.0, listener=None):
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.listener = listener
+        self.sent = 0
+        self.started = time.monotonic()
+        self._logged = self.started
+
+    def update(self, sent):
+        self.sent += sent
+        if self.listener:
+            self.listener(self.sent, self.total)
+        now = time.monotonic()
+        if now - self._logged >= self.interval:
+            self._logged = now
+            logger.info(
+                f"Uploading {self.name}: {self.sent / (1024 * 1024):.1f}/{self.total / (1024 * 1024):.1f} MB "
+                f"({self.sent * 100 // max(1, self.total)}%), {self.rate():.1f} MB/s"
+            )
+
+    def finish(self):
+        logger.info(
+            f"Sent {self.name}: {self.sent / (1024 * 1024):.1f} MB in {time.monotonic() - self.started:.1f}s "
+            f"({self.rate():.1f} MB/s)"
+        )
+
+    def rate(self):
+        """Average throughput so far in MB/s"""
+        return self.sent / (1024 * 1024) / max(time.monotonic() - self.started, 1e-6)
+
+
+class MultipartBody:
+    """
+    A multipart/form-data body produced incrementally from async sources.
+
+    The exact Content-Length is computed up front from the field values and the
+    declared file sizes, so the body can be streamed without chunked encoding.
+    File bytes sent are reported to progress (an UploadProgress), if given, and paced
+    by throttle (with an async consume(size), e.g. a ratelimit.BandwidthLimiter).
+    """
+
+    def __init__(self, fields, files, progress=None, throttle=None):
+        self.boundary = uuid.uuid4().hex
+        self.progress = progress
+        self.throttle = throttle
+        self._parts = []
+        for name, value in fields.items():
+            header = (
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            ).encode() + str(value).encode() + b'\r\n'
+            self._parts.append((header, None))
+        for name, upload in files.items():
+            header = (
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"; filename="{upload.filename}"\r\n'
+                f'Content-Type: {upload.content_type}\r\n\r\n'
+            ).encode()
+            self._parts.append((header, upload))
+        self._closing = f'--{self.boundary}--\r\n'.encode()
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    @property
+    def content_length(self):
+        length = len(self._closing)
+        for header, upload in self._parts:
+            length += len(header)
+            if upload is not None:
+                length += upload.size + 2
+        return length
+
+    async def __aiter__(self):
+        for header, upload in self._parts:
+            yield header
+            if upload is None:
+                continue
+            sent = 0
+            async for chunk in upload.chunks:
+                if self.throttle:
+                    await self.throttle.consume(len(chunk))
+                sent += len(chunk)
+                if self.progress:
+                    self.progress.update(len(chunk))
+                yield chunk
+            if sent != upload.size:
+                raise TelegramError(f"Upload of {upload.filename} ended after {sent} of {upload.size} bytes")
+            yield b'\r\n'
+        yield self._closing
+        if self.progress:
+            self.progress.finish()
+
+    @property
+    def files_size(self):
+        """Total size of the file parts"""
+        return sum(upload.size for _, upload in self._parts if upload is not None)
+
+
+class BotApiUploader:
+    """
+    Calls Bot API methods with a streamed multipart body.
+
+    python-telegram-bot reads a whole file into memory before sending it; this uploader
+    writes the request body as the bytes become available instead, so memory use does
+    not depend on the file size. Uploads of at least `progress_min_size` bytes log
+    their progress every `progress_interval` seconds and report it to the optional
+    `on_progress(sent, total)` callback of each method. File bytes are paced by
+    `throttle`, if given (see MultipartBody).
+    """
+
+    def __init__(self, bot, timeout=600, progress_min_size=8 * 1024 * 1024, progress_interval=10.0, throttle=None):
+        self.bot = bot
+        self.throttle = throttle
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(timeout))
+        self.progress_min_size = progress_min_size
+        self.progress_interval = progress_interval
+
+    async def send_video(self, chat_id, video, thumbnail=None, on_progress=None, **params):
+        """Send an UploadFile as a video; returns the resulting telegram.Message"""
+        fields = {'chat_id': chat_id}
+        files = {'video': video}
+        if thumbnail is not None:
+            # Thumbnails must reference a separately attached multipart part
+            fields['thumbnail'] = 'attach://thumbnail_file'
+            files['thumbnail_file'] = thumbnail
+        for name, value in params.items():
+            if value is None:
+                continue
+            fields[name] = str(value).lower() if isinstance(value, bool) else value
+        result = await self._post('sendVideo', self._body(fields, files, video.filename, on_progress))
+        return Message.de_json(result, self.bot)
+
+    async def send_media_group(self, chat_id, media, on_progress=None, **params):
+        """
+        Send an album of videos. Each item of media is a dict with an UploadFile as
+        'media', an optional UploadFile 'thumbnail' and other InputMediaVideo fields
+        (caption, duration, ...). Returns the resulting list of telegram.Message.
+        """
+        files = {}
+        items = []
+        for index, item in enumerate(media):
+            entry = {'type': 'video'}
+            for name, value in item.items():
+                if value is None:
+                    continue
+                if isinstance(value, UploadFile):
+                    attach_name = f'{name}{index}'
+                    files[attach_name] = value
+                    entry[name] = f'attach://{attach_name}'
+                else:
+                    entry[name] = value
+            items.append(entry)
+        fields = {'chat_id': chat_id, 'media': json.dumps(items)}
+        for name, value in params.items():
+            if value is not None:
+                fields[name] = str(value).lower() if isinstance(value, bool) else value
+        result = await self._post('sendMediaGroup', self._body(fields, files, f"album of {len(items)}", on_progress))
+        return [Message.de_json(message, self.bot) for message in result]
+
+    def _body(self, fields, files, name, on_progress=None):
+        """Build a multipart body, with progress reporting when the files are large"""
+        body = MultipartBody(fields, files, throttle=self.throttle)
+        if body.files_size >= self.progress_min_size:
+            body.progress = UploadProgress(name, body.files_size, self.progress_interval, on_progress)
+        return body
+
+    async def _post(self, method, body):
+        """POST a multipart body to a Bot API method and return the decoded result"""
+        response = await self.client.post(
+            f"{self.bot.base_url}/{method}",
+            content=body,
+            headers={
+                'Content-Type': body.content_type,
+                'Content-Length': str(body.content_length)
+            }
+        )
+        try:
+            data = response.json()
+        except ValueError:
+            raise TelegramError(f"Invalid response from Bot API (HTTP {response.status_code})")
+
+        if not data.get('ok'):
+            parameters = data.get('parameters') or {}
+            if parameters.get('retry_after'):
+                raise RetryAfter(parameters['retry_after'])
+            raise TelegramError(data.get('description', f"HTTP {response.status_code}"))
+        return data['result']
+
+    async def aclose(self):
+        """Close the upload connection pool"""
+        await self.client.aclose()
@@ -0,0 +1,150 @@
+import os
+import signal
+import asyncio
+import logging
+import itertools
+import multiprocessing
+from queue import Empty
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# In a worker process: queue telling the parent which process runs which task
+_task_pids = None
+
+
+class CpuTimeout(Exception):
+    """A task in the CPU pool did not finish in time"""
+
+
+def _init_worker(task_pids):
+    global _task_pids
+    _task_pids = task_pids
+
+
+def _run_task(task_id, func, *args):
+    """Report the worker process running a task, then run it"""
+    _task_pids.put((task_id, os.getpid()))
+    return func(*args)
+
+
+class CpuPool:
+    """
+    Runs CPU-heavy steps (MP4 table parsing, OpenCV decoding, resizing and JPEG
+    encoding) off the event loop, on a fixed number of reused workers.
+
+    Workers are threads, or processes with mode='process'. Each task gets `timeout`
+    seconds, counted from when a worker picks it up. A task that times out (or crashes
+    its worker process) raises, and only that task fails: its pool is retired, new
+    tasks go to a new pool, and the other tasks of the retired pool run to completion.
+    Once they have, the worker processes still stuck in timed-out tasks are killed and
+    the retired pool is shut down; a hung thread cannot be stopped and is left to finish
+    on its own. Functions run in process mode must be picklable (module-level).
+    """
+
+    def __init__(self, workers=2, mode='thread', timeout=60.0):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown CPU pool mode {mode!r} (expected 'thread' or 'process')")
+        self.workers = max(1, workers)
+        self.mode = mode
+        self.timeout = timeout
+        self._executor = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._task_ids = itertools.count()
+        self._task_pids = None
+        self._pids = {}  # Task ID -> worker process, for tasks in flight or timed out
+        self._running = {}  # Executor -> IDs of the tasks awaited on it
+        self._hung = {}  # Retired executor -> IDs of its timed-out tasks
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.mode == 'process':
+                # Forking a process with running threads is unsafe
+                context = multiprocessing.get_context('spawn')
+                if self._task_pids is None:
+                    self._task_pids = context.Queue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context,
+                    initializer=_init_worker, initargs=(self._task_pids,)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cpu')
+            self._running[self._executor] = set()
+        return self._executor
+
+    async def run(self, func, *args, timeout=None):
+        """Run func(*args) in a worker and return its result; raises CpuTimeout after the timeout"""
+        timeout = timeout or self.timeout
+        # Wait for a free worker first, so queueing does not count against the timeout
+        async with self._slots:
+            executor = self._get_executor()
+            task_id = next(self._task_ids)
+            loop = asyncio.get_running_loop()
+            if self.mode == 'process':
+                future = loop.run_in_executor(executor, _run_task, task_id, func, *args)
+            else:
+                future = loop.run_in_executor(executor, func, *args)
+            self._running[executor].add(task_id)
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"{func.__name__} did not finish within {timeout}s, retiring the {self.mode} pool")
+                self._retire(executor)
+                self._hung[executor].add(task_id)
+                raise CpuTimeout(f"{func.__name__} timed out after {timeout}s") from None
+            except BrokenProcessPool:
+                logger.error(f"A worker process died running {func.__name__}, retiring the process pool")
+                self._retire(executor)
+                raise
+            finally:
+                self._collect_pids()
+                self._running[executor].discard(task_id)
+                if task_id not in self._hung.get(executor, ()):
+                    self._pids.pop(task_id, None)
+                self._reap(executor)
+
+    def _retire(self, executor):
+        """Stop giving tasks to a pool with a stuck or dead worker; the next task starts a new one"""
+        if self._executor is executor:
+            self._executor = None
+        self._hung.setdefault(executor, set())
+
+    def _reap(self, executor):
+        """Shut a retired pool down once only its timed-out tasks are left"""
+        if executor not in self._hung or self._running[executor]:
+            return
+        self._kill(self._hung.pop(executor))
+        del self._running[executor]
+        executor.shutdown(wait=False)
+
+    def _collect_pids(self):
+        """Note which process runs each task in flight; reports of finished tasks are dropped"""
+        if self._task_pids is None:
+            return
+        while True:
+            try:
+                task_id, pid = self._task_pids.get_nowait()
+            except (Empty, OSError, ValueError):
+                return
+            if any(task_id in tasks for tasks in (*self._running.values(), *self._hung.values())):
+                self._pids[task_id] = pid
+
+    def _kill(self, task_ids):
+        """Kill the worker processes stuck in the given tasks"""
+        for task_id in task_ids:
+            pid = self._pids.pop(task_id, None)
+            if pid is None:
+                continue
+            try:
+                os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+            except OSError:
+                pass  # The task finished after all and the worker exited
+
+    def close(self):
+        self._collect_pids()
+        for executor in list(self._running):
+            self._kill(self._hung.pop(executor, ()))
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._running.clear()
+        self._executor = None
@@ -0,0 +1,437 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+# Content hashes are built from digests of fixed-size blocks, so segments downloaded in any
+# order (or resumed later) can each hash their own bytes. Changing it changes every hash.
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Statuses with which a CDN rejects an expired signed URL
+EXPIRED_URL_STATUSES = (403, 410)
+
+# Byte ranges and sizes refer to the stored file, so bodies must not be compressed in transit
+IDENTITY_ENCODING = {'Accept-Encoding': 'identity'}
+
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed"""
+
+
+class IncompleteDownload(DownloadError):
+    """A transfer ended early or out of step; another try resumes or restarts it"""
+
+
+def _check_encoding(response):
+    """Refuse a body the server compressed anyway: its length and offsets would not match the file"""
+    encoding = response.headers.get('content-encoding', 'identity').strip().lower()
+    if encoding not in ('', 'identity'):
+        raise DownloadError(f"Server sent a {encoding}-encoded body for a file download")
+
+
+class BlockHasher:
+    """
+    Hashes a contiguous byte range, starting at a block boundary, into per-block digests.
+    """
+
+    def __init__(self):
+        self.digests = []
+        self._block = hashlib.sha256()
+        self._filled = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), HASH_BLOCK_SIZE - self._filled)
+            self._block.update(view[:take])
+            self._filled += take
+            view = view[take:]
+            if self._filled == HASH_BLOCK_SIZE:
+                self._finish_block()
+
+    def _finish_block(self):
+        self.digests.append(self._block.hexdigest())
+        self._block = hashlib.sha256()
+        self._filled = 0
+
+    def finish(self):
+        """Return the digests of all blocks, including a final partial one"""
+        if self._filled:
+            self._finish_block()
+        return self.digests
+
+
+def content_hash(block_digests):
+    """Combine the block digests of a whole file into its content hash"""
+    return hashlib.sha256(''.join(block_digests).encode()).hexdigest()
+
+
+@asynccontextmanager
+async def _admit_all(size):
+    yield
+
+
+def hash_file(path):
+    """Content hash of a file on disk (same scheme as a download)"""
+    hasher = BlockHasher()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(HASH_BLOCK_SIZE)
+            if not data:
+                break
+            hasher.update(data)
+    return content_hash(hasher.finish())
+
+
+class DownloadProgress:
+    """
+    Tracks which byte ranges of a download are on disk.
+
+    Stages that only need part of the file (e.g. the moov atom or a single keyframe)
+    can wait for exactly those bytes instead of the whole download. `listener`, if
+    given, is called with (bytes on disk, total size) whenever a range finishes.
+    """
+
+    def __init__(self, listener=None):
+        self.total_size = None
+        self.error = None
+        self.listener = listener
+        self._ranges = []  # Sorted, non-overlapping [start, end) ranges
+        self._changed = asyncio.Condition()
+
+    @property
+    def downloaded(self):
+        """Bytes on disk so far"""
+        return sum(range_end - range_start for range_start, range_end in self._ranges)
+
+    def _covered(self, start, end):
+        for range_start, range_end in self._ranges:
+            if range_start <= start and end <= range_end:
+                return True
+        return False
+
+    async def set_size(self, total_size):
+        async with self._changed:
+            self.total_size = total_size
+            self._changed.notify_all()
+
+    async def mark(self, start, end):
+        """Record that bytes [start, end) are on disk"""
+        async with self._changed:
+            merged = []
+            for range_start, range_end in sorted(self._ranges + [(start, end)]):
+                if merged and range_start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+                else:
+                    merged.append((range_start, range_end))
+            self._ranges = merged
+            self._changed.notify_all()
+        if self.listener:
+            self.listener(self.downloaded, self.total_size)
+
+    async def fail(self, error):
+        """Wake up all waiters: the download will not complete"""
+        async with self._changed:
+            self.error = error
+            self._changed.notify_all()
+
+    async def wait_for(self, start, end):
+        """Wait until bytes [start, end) are on disk (end is clipped to the file size)"""
+        def ready():
+            if self.error is not None:
+                return True
+            if self.total_size is None:
+                return False
+            return self._covered(min(start, self.total_size), min(end, self.total_size))
+
+        async with self._changed:
+            await self._changed.wait_for(ready)
+            if self.error is not None:
+                raise DownloadError(f"Download failed: {self.error}")
+        return min(end, self.total_size)
+
+
+class SegmentedDownloader:
+    """
+    Download a file over several parallel HTTP Range requests.
+
+    The file is split into fixed-size byte ranges which are fetched concurrently into a
+    preallocated file. Finished segments are recorded in a ``.parts.json`` sidecar next
+    to the file, so an interrupted download resumes from the missing segments instead of
+    starting again from byte 0. Servers that ignore ``Range`` get a single-stream download.
+
+    Each segment hashes its bytes as they stream in (see HASH_BLOCK_SIZE); the digests
+    are kept in the sidecar with the segment, and combined into the file's content hash.
+    Received bytes are paced by throttle (with an async consume(size)), if given.
+    Disk writes run in threads, so a slow disk does not stall the event loop.
+    """
+
+    def __init__(self, http, connections=4, segment_size=16 * 1024 * 1024, chunk_size=1024 * 1024, throttle=None):
+        self.http = http
+        self.throttle = throttle
+        self.connections = max(1, connections)
+        # Segments start on hash block boundaries
+        blocks = -(-max(chunk_size, segment_size) // HASH_BLOCK_SIZE)
+        self.segment_size = blocks * HASH_BLOCK_SIZE
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def state_path(save_path):
+        """Path of the sidecar file recording finished segments"""
+        return f"{save_path}.parts.json"
+
+    async def fingerprint(self, url, sample_size=1024 * 1024):
+        """
+        Cheap identity of a remote file from its size and its first and last sample_size
+        bytes, fetched with two range requests. Returns None if the server ignores ranges.
+        """
+        head, total_size = await self._fetch_range(url, 0, sample_size - 1)
+        if head is None:
+            return None
+        tail = b''
+        if total_size > sample_size:
+            tail, _ = await self._fetch_range(url, max(sample_size, total_size - sample_size), total_size - 1)
+            if tail is None:
+                return None
+        return f"{total_size}:{hashlib.sha256(head + tail).hexdigest()}"
+
+    async def _fetch_range(self, url, start, end):
+        """Return (bytes, total size) of a byte range, or (None, None) without range support"""
+        async with self.http.stream(url, headers={'Range': f'bytes={start}-{end}', **IDENTITY_ENCODING}) as response:
+            response.raise_for_status()
+            _check_encoding(response)
+            match = CONTENT_RANGE_RE.match(response.headers.get('content-range', ''))
+            if response.status_code != 206 or not match or match.group(3) == '*' or int(match.group(1)) != start:
+                return None, None
+            return await response.aread(), int(match.group(3))
+
+    async def download(self, url, save_path, progress=None, admit=None, refresh_url=None, retry=None):
+        """
+        Download url to save_path, resuming a previous partial download if possible.
+        Finished byte ranges are reported to progress (a DownloadProgress), if given.
+        Once the size is known, the transfer runs inside admit(size), an async context
+        manager that can hold it back (e.g. until there is disk space), if given.
+        When the server rejects the URL as expired (403/410), `await refresh_url()` is
+        asked for a new one once, and the download resumes from the finished segments.
+        Each try runs as `await retry(attempt, current_url)`, if given, which may call
+        attempt() again after a failure; every try resumes from the segments finished so
+        far. current_url() returns the URL the next try will use.
+        Returns the content hash of the file.
+        """
+        progress = progress or DownloadProgress()
+        refreshed = False
+
+        async def attempt():
+            nonlocal url, refreshed
+            while True:
+                try:
+                    return await self._download(url, save_path, progress, admit or _admit_all)
+                except httpx.HTTPStatusError as e:
+                    if refreshed or refresh_url is None or e.response.status_code not in EXPIRED_URL_STATUSES:
+                        raise
+                    logger.warning(f"Download URL rejected with HTTP {e.response.status_code}, resolving it again")
+                    refreshed = True
+                    url = await refresh_url()
+                    if not url:
+                        raise
+
+        try:
+            return await (retry(attempt, lambda: url) if retry else attempt())
+        except BaseException as e:
+            await progress.fail(e)
+            raise
+
+    async def _download(self, url, save_path, progress, admit):
+        # Probe with a one-byte range request to learn the size and whether ranges work
+        async with self.http.stream(url, headers={'Range': 'bytes=0-0', **IDENTITY_ENCODING}) as response:
+            response.raise_for_status()
+            _check_encoding(response)
+            match = CONTENT_RANGE_RE.match(response.headers.get('content-range', ''))
+            ranged = response.status_code == 206 and match and match.group(3) != '*'
+            if ranged:
+                total_size = int(match.group(3))
+                validator = response.headers.get('etag') or response.headers.get('last-modified')
+            else:
+                total_size = int(response.headers.get('content-length', 0))
+
+        if not ranged:
+            logger.info("Server does not support range requests, using a single stream")
+            # The probe is closed first: waiting for admission must not hold a connection
+            async with admit(total_size):
+                async with self.http.stream(url, headers=IDENTITY_ENCODING) as response:
+                    response.raise_for_status()
+                    _check_encoding(response)
+                    return await self._download_single(response, save_path, progress)
+
+        logger.info(f"Video size: {total_size / (1024*1024):.2f} MB")
+        if not total_size:
+            raise DownloadError("Remote file is empty")
+        async with admit(total_size):
+            return await self._download_segments(url, save_path, progress, total_size, validator)
+
+    async def _download_segments(self, url, save_path, progress, total_size, validator):
+        """Fetch the missing segments of a file of total_size bytes into save_path"""
+        segments = [
+            (start, min(start + self.segment_size, total_size) - 1)
+            for start in range(0, total_size, self.segment_size)
+        ]
+        await progress.set_size(total_size)
+        digests = self._load_state(save_path, total_size, validator)
+        done = set(digests)
+        if done:
+            logger.info(f"Resuming download: {len(done)}/{len(segments)} segments already on disk")
+            for index in done:
+                await progress.mark(segments[index][0], segments[index][1] + 1)
+        else:
+            await asyncio.to_thread(self._preallocate, save_path, total_size)
+            await self._save_state(save_path, total_size, validator, digests)
+        # One sidecar write at a time, so a slower write never replaces a newer record
+        state_lock = asyncio.Lock()
+
+        # Fetch the first and last segments first: they hold the MP4 header and,
+        # for files without faststart, the moov atom needed for metadata and thumbnails
+        order = [0, len(segments) - 1] + list(range(1, len(segments) - 1))
+        pending = asyncio.Queue()
+        for index in dict.fromkeys(order):
+            if index not in done:
+                pending.put_nowait(index)
+
+        async def worker():
+            while not pending.empty():
+                index = pending.get_nowait()
+                start, end = segments[index]
+                digests[index] = await self._download_segment(url, save_path, start, end, validator)
+                done.add(index)
+                async with state_lock:
+                    await self._save_state(save_path, total_size, validator, digests)
+                await progress.mark(start, end + 1)
+                logger.info(f"Downloaded segment {len(done)}/{len(segments)} ({len(done) * 100 // len(segments)}%)")
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.connections, pending.qsize()))]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+
+        os.remove(self.state_path(save_path))
+        return content_hash([digest for index in range(len(segments)) for digest in digests[index]])
+
+    async def _download_segment(self, url, save_path, start, end, validator):
+        """
+        Fetch one byte range and write it at its offset in the preallocated file.
+        Returns the block digests of the range.
+        """
+        headers = {'Range': f'bytes={start}-{end}', **IDENTITY_ENCODING}
+        if validator:
+            # If the file changed on the server we get a full 200 response instead of a range
+            headers['If-Range'] = validator
+        async with self.http.stream(url, headers=headers) as response:
+            response.raise_for_status()
+            _check_encoding(response)
+            match = CONTENT_RANGE_RE.match(response.headers.get('content-range', ''))
+            if response.status_code != 206 or not match or int(match.group(1)) != start:
+                raise IncompleteDownload(f"Server did not honor range {start}-{end} (HTTP {response.status_code})")
+
+            received = 0
+            hasher = BlockHasher()
+            with open(save_path, 'r+b') as f:
+                f.seek(start)
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    if self.throttle:
+                        await self.throttle.consume(len(chunk))
+                    await asyncio.to_thread(f.write, chunk)
+                    hasher.update(chunk)
+                    received += len(chunk)
+
+        if received != end - start + 1:
+            raise IncompleteDownload(f"Segment {start}-{end} is incomplete: got {received} bytes")
+        return hasher.finish()
+
+    async def _download_single(self, response, save_path, progress):
+        """Stream a whole response body to disk (no range support)"""
+        total_size = int(response.headers.get('content-length', 0))
+        logger.info(f"Video size: {total_size / (1024*1024):.2f} MB")
+        if total_size:
+            await progress.set_size(total_size)
+
+        # A partial file from an earlier attempt cannot be reused without ranges
+        if os.path.exists(self.state_path(save_path)):
+            os.remove(self.state_path(save_path))
+
+        received = 0
+        hasher = BlockHasher()
+        with open(save_path, 'wb') as f:
+            async for chunk in response.aiter_bytes(self.chunk_size):
+                if self.throttle:
+                    await self.throttle.consume(len(chunk))
+                await asyncio.to_thread(f.write, chunk)
+                hasher.update(chunk)
+                received += len(chunk)
+                if total_size:
+                    await asyncio.to_thread(f.flush)
+                    await progress.mark(0, received)
+
+        if total_size and received != total_size:
+            raise DownloadError(f"Download is incomplete: got {received} of {total_size} bytes")
+        if not total_size:
+            await progress.set_size(received)
+            await progress.mark(0, received)
+        return content_hash(hasher.finish())
+
+    def _preallocate(self, save_path, total_size):
+        """Create the output file at its final size"""
+        with open(save_path, 'wb') as f:
+            if hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(f.fileno(), 0, total_size)
+                    return
+                except OSError:
+                    pass  # Filesystem without fallocate support
+            f.truncate(total_size)
+
+    def _load_state(self, save_path, total_size, validator):
+        """Return {segment index: block digests} of the finished segments of a matching earlier attempt"""
+        path = self.state_path(save_path)
+        try:
+            if not os.path.exists(path) or not os.path.exists(save_path) or os.path.getsize(save_path) != total_size:
+                return {}
+            with open(path, 'r') as f:
+                state = json.load(f)
+            if (state.get('size') != total_size or state.get('segment_size') != self.segment_size
+                    or state.get('validator') != validator or 'digests' not in state):
+                logger.info("Partial download does not match the remote file, starting over")
+                return {}
+            return {int(index): digests for index, digests in state['digests'].items()}
+        except Exception as e:
+            logger.warning(f"Could not read partial download state: {e}")
+            return {}
+
+    async def _save_state(self, save_path, total_size, validator, digests):
+        """Atomically record which segments are finished, with their block digests"""
+        # Serialized here, as other segments may finish while the file is written
+        state = json.dumps({
+            'size': total_size,
+            'segment_size': self.segment_size,
+            'validator': validator,
+            'digests': {str(index): digests[index] for index in sorted(digests)}
+        })
+        await asyncio.to_thread(self._write_state, self.state_path(save_path), state)
+
+    @staticmethod
+    def _write_state(path, state):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(state)
+        os.replace(tmp_path, path)
@@ -0,0 +1,73 @@
+import copy
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """
+    Shared asynchronous HTTP client used for scraping and downloading.
+
+    All requests go through one keep-alive connection pool. On top of the pool-wide
+    limit, each host gets its own connection limit so a long download cannot take
+    every connection away from page fetches on other hosts.
+    """
+
+    def __init__(self, headers=None, connect_timeout=30, read_timeout=60,
+                 max_connections=20, max_connections_per_host=6):
+        self.max_connections_per_host = max_connections_per_host
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            follow_redirects=True
+        )
+        self._host_slots = {}
+        self.extra_headers = {}
+
+    def with_headers(self, headers):
+        """
+        A view of this client that adds headers to every request (e.g. a site's Referer).
+        It shares the connection pool and the per-host limits; close only the original.
+        """
+        view = copy.copy(self)
+        view.extra_headers = {**self.extra_headers, **headers}
+        return view
+
+    def _headers(self, headers):
+        if not self.extra_headers:
+            return headers
+        return {**self.extra_headers, **(headers or {})}
+
+    def _host_slot(self, url):
+        """Return the semaphore limiting concurrent connections to the URL's host"""
+        host = urlsplit(str(url)).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_slots[host] = slot
+        return slot
+
+    async def get(self, url, headers=None):
+        """GET a URL and return the response with its body fully read"""
+        async with self._host_slot(url):
+            return await self.client.get(url, headers=self._headers(headers))
+
+    @asynccontextmanager
+    async def stream(self, url, headers=None, method='GET'):
+        """Open a streaming request; the body is read by the caller inside the context"""
+        async with self._host_slot(url):
+            async with self.client.stream(method, url, headers=self._headers(headers)) as response:
+                yield response
+
+    async def aclose(self):
+        """Close all pooled connections"""
+        await self.client.aclose()
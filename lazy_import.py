@@ -0,0 +1,23 @@
+import sys
+import importlib.util
+
+
+def lazy_import(name):
+    """
+    Return a module that is only executed when one of its attributes is first used.
+
+    Used for the heavy parts of the stack (python-telegram-bot, OpenCV), so a poll
+    that finds nothing new never pays for loading them.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
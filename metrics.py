@@ -0,0 +1,226 @@
+import json
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = 'video_bot'
+
+# Histogram buckets (upper bounds)
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+LAG_BUCKETS = (60, 300, 600, 1800, 3600, 7200, 10800, 14400, 21600, 43200, 86400)
+
+# name: (type, help, buckets)
+FAMILIES = {
+    'stage_duration_seconds': ('histogram', 'Time spent in each pipeline stage', DURATION_BUCKETS),
+    'stage_total': ('counter', 'Pipeline stage runs by outcome', None),
+    'stage_bytes_total': ('counter', 'Bytes moved by each pipeline stage', None),
+    'stage_throughput_bytes_per_second': ('gauge', 'Throughput of the last run of each pipeline stage', None),
+    'retries_total': ('counter', 'Retried operations', None),
+    'bandwidth_bytes_total': ('counter', 'Video bytes downloaded or uploaded through the bandwidth limiter', None),
+    'bandwidth_throughput_bytes_per_second': ('gauge', 'Throughput of the last second of video transfers', None),
+    'bandwidth_limit_bytes_per_second': ('gauge', 'Bandwidth limit in effect (0: unlimited)', None),
+    'bandwidth_throttled_seconds_total': ('counter', 'Time video transfers were held back by the bandwidth limit', None),
+    'circuit_open': ('gauge', 'Whether calls to an endpoint are suspended after repeated failures', None),
+    'queue_depth': ('gauge', 'Videos of the current backlog not yet published', None),
+    'jobs_in_flight': ('gauge', 'Videos being prepared or published', None),
+    'detection_lag_seconds': ('histogram', 'Estimated time from a video appearing on the website to the bot finding it', LAG_BUCKETS),
+    'post_lag_seconds': ('histogram', 'Estimated time from a video appearing on the website to its post in the channel', LAG_BUCKETS),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class StageTimer:
+    """
+    Times one run of a pipeline stage (see Metrics.stage).
+
+    The run counts as a failure when the block raises or `fail()` was called;
+    bytes set with `add_bytes()` are recorded along with the duration.
+    """
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+        self.size = 0
+        self.failed = False
+        self.started = None
+
+    def add_bytes(self, size):
+        self.size += size or 0
+
+    def fail(self):
+        self.failed = True
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Cancellation is neither a success nor a failure of the stage
+        if exc_type is not None and issubclass(exc_type, asyncio.CancelledError):
+            return False
+        outcome = 'failure' if exc_type is not None or self.failed else 'success'
+        self.metrics.record_stage(self.stage, time.monotonic() - self.started, outcome, self.size)
+        return False
+
+
+class Metrics:
+    """
+    In-process metrics of the bot: per-stage latency histograms, byte counts and
+    outcomes, retry counters, queue gauges and lag histograms.
+
+    Everything is kept in memory and rendered in the Prometheus text format by
+    `render()` (served by MetricsServer). When `jsonl_path` is set, every recorded
+    event is also appended to that file as one JSON object per line.
+    """
+
+    def __init__(self, jsonl_path=None):
+        self.jsonl_path = jsonl_path
+        self._samples = {name: {} for name in FAMILIES}
+        self._file = None
+        if jsonl_path:
+            try:
+                self._file = open(jsonl_path, 'a', buffering=1)
+            except OSError as e:
+                logger.warning(f"Could not open metrics file {jsonl_path}: {e}")
+
+    def stage(self, name):
+        """Context manager timing one run of a pipeline stage"""
+        return StageTimer(self, name)
+
+    def record_stage(self, stage, seconds, outcome='success', size=0):
+        """Record one run of a pipeline stage"""
+        self.observe('stage_duration_seconds', seconds, stage=stage)
+        self.inc('stage_total', stage=stage, outcome=outcome)
+        if size:
+            self.inc('stage_bytes_total', size, stage=stage)
+            if seconds > 0:
+                self.set('stage_throughput_bytes_per_second', size / seconds, stage=stage)
+        self._log('stage', stage=stage, seconds=round(seconds, 4), outcome=outcome, bytes=size or None)
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter"""
+        samples = self._samples[name]
+        key = _label_key(labels)
+        samples[key] = samples.get(key, 0) + value
+        if name == 'retries_total':
+            self._log('retry', **labels)
+
+    def set(self, name, value, **labels):
+        """Set a gauge"""
+        self._samples[name][_label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        """Add an observation to a histogram"""
+        buckets = FAMILIES[name][2]
+        key = _label_key(labels)
+        histogram = self._samples[name].get(key)
+        if histogram is None:
+            histogram = self._samples[name][key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram['buckets'][index] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+        if name != 'stage_duration_seconds':
+            self._log(name, value=round(value, 3), **labels)
+
+    def _log(self, event, **fields):
+        if not self._file:
+            return
+        record = {'t': round(time.time(), 3), 'event': event}
+        record.update((name, value) for name, value in fields.items() if value is not None)
+        try:
+            self._file.write(json.dumps(record) + '\n')
+        except OSError as e:
+            logger.warning(f"Could not write metrics file: {e}")
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, (kind, help_text, buckets) in FAMILIES.items():
+            full_name = f'{NAMESPACE}_{name}'
+            lines.append(f'# HELP {full_name} {help_text}')
+            lines.append(f'# TYPE {full_name} {kind}')
+            for key, value in sorted(self._samples[name].items()):
+                if kind != 'histogram':
+                    lines.append(f'{full_name}{_format_labels(key)} {_format_value(value)}')
+                    continue
+                for bound, count in zip(buckets, value['buckets']):
+                    lines.append(f'{full_name}_bucket{_format_labels(key, [("le", bound)])} {count}')
+                lines.append(f'{full_name}_bucket{_format_labels(key, [("le", "+Inf")])} {value["count"]}')
+                lines.append(f'{full_name}_sum{_format_labels(key)} {_format_value(value["sum"])}')
+                lines.append(f'{full_name}_count{_format_labels(key)} {value["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class MetricsServer:
+    """Minimal HTTP server answering GET /metrics with Metrics.render()"""
+
+    def __init__(self, metrics, host='127.0.0.1', port=9108):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        """Start listening; a port that is taken is logged, not fatal"""
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        except OSError as e:
+            logger.warning(f"Could not serve metrics on {self.host}:{self.port}: {e}")
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 10)
+            # Skip the request headers
+            while (await asyncio.wait_for(reader.readline(), 10)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] in ('GET', 'HEAD') and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', self.metrics.render().encode()
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            else:
+                status, body, content_type = '404 Not Found', b'Not found\n', 'text/plain'
+            writer.write(
+                f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode()
+            )
+            if parts and parts[0] != 'HEAD':
+                writer.write(body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def aclose(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
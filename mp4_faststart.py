@@ -0,0 +1,163 @@
+import os
+import mmap
+import struct
+import logging
+
+from mp4_probe import CONTAINER_BOXES, iter_boxes, _read_table
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024  # Bytes per kernel copy call (and per read in the fallback)
+MAX_STCO_OFFSET = 0xFFFFFFFF  # Largest chunk offset a 32-bit stco entry can hold
+
+
+def _chunk_offset_tables(buf, offset, size, header_size):
+    """Yield (type, offset, size, header_size) of every stco/co64 box below a container box"""
+    for box_type, child, child_size, child_header in iter_boxes(buf, offset + header_size, offset + size):
+        if box_type in (b'stco', b'co64'):
+            yield box_type, child, child_size, child_header
+        elif box_type in CONTAINER_BOXES:
+            yield from _chunk_offset_tables(buf, child, child_size, child_header)
+
+
+def _box_header(box_type, size, header_size):
+    """Serialize a box header, keeping the 64-bit size form if the box had it"""
+    if header_size == 16:
+        return struct.pack('>I4sQ', 1, box_type, size)
+    return struct.pack('>I4s', size, box_type)
+
+
+def _rebuild(buf, box_type, offset, size, header_size, shift, widen):
+    """
+    Return the bytes of a box with its chunk offsets moved by shift(offset).
+    stco boxes at the offsets in widen become co64; container sizes follow.
+    """
+    if box_type in (b'stco', b'co64'):
+        count = struct.unpack_from('>I', buf, offset + header_size + 4)[0]
+        offsets = shift(_read_table(buf, offset + header_size + 8, count, wide=box_type == b'co64'))
+        wide = box_type == b'co64' or offset in widen
+        body = struct.pack(f'>4xI{count}{"Q" if wide else "I"}', count, *offsets)
+        return _box_header(b'co64' if wide else b'stco', header_size + len(body), header_size) + body
+    if box_type not in CONTAINER_BOXES:
+        return bytes(buf[offset:offset + size])
+    body = b''.join(
+        _rebuild(buf, *child, shift, widen) for child in iter_boxes(buf, offset + header_size, offset + size)
+    )
+    return _box_header(box_type, header_size + len(body), header_size) + body
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _copy_range(src_fd, dst_fd, offset, count):
+    """
+    Append count bytes of the source file starting at offset to the destination.
+
+    The copy stays in the kernel (copy_file_range, which may even share the blocks on
+    filesystems with reflinks, or sendfile) and only falls back to reading chunks
+    into Python where neither is available.
+    """
+    end = offset + count
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while offset < end:
+                copied = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK_SIZE, end - offset), offset)
+                if not copied:
+                    break
+                offset += copied
+        except OSError as e:
+            # Not supported by this kernel or between these filesystems
+            logger.debug(f"copy_file_range unavailable ({e}), trying sendfile")
+    if offset < end and hasattr(os, 'sendfile'):
+        try:
+            while offset < end:
+                copied = os.sendfile(dst_fd, src_fd, offset, min(COPY_CHUNK_SIZE, end - offset))
+                if not copied:
+                    break
+                offset += copied
+        except OSError as e:
+            logger.debug(f"sendfile unavailable ({e}), copying in chunks")
+    while offset < end:
+        chunk = os.pread(src_fd, min(COPY_CHUNK_SIZE, end - offset), offset)
+        if not chunk:
+            raise OSError(f"Unexpected end of file at offset {offset}")
+        _write_all(dst_fd, chunk)
+        offset += len(chunk)
+
+
+def faststart(src_path, dst_path):
+    """
+    Write a copy of an MP4 file with its moov box moved in front of the media data, so a
+    player can start before the whole file has arrived (what `ffmpeg -movflags +faststart`
+    does, without FFmpeg).
+
+    Only the moov box is rebuilt in memory: its stco/co64 chunk offsets are moved by the
+    size of the relocated moov, and stco tables are widened to co64 where an offset would
+    no longer fit in 32 bits. The media data is copied file to file by the kernel.
+    Returns False, without writing dst_path, when moov already comes first or the file is
+    not a complete, unfragmented MP4.
+    """
+    if not os.path.getsize(src_path):
+        return False
+    with open(src_path, 'rb') as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        boxes = list(iter_boxes(mm))
+        types = [box[0] for box in boxes]
+        if b'moov' not in types or b'mdat' not in types or b'moof' in types:
+            return False
+        if boxes[-1][1] + boxes[-1][2] != len(mm):
+            logger.warning(f"MP4 file is truncated, not moving moov: {src_path}")
+            return False
+        moov = boxes[types.index(b'moov')]
+        mdat_offset = boxes[types.index(b'mdat')][1]
+        _, moov_offset, moov_size, moov_header = moov
+        if moov_offset < mdat_offset:
+            return False
+        moov_end = moov_offset + moov_size
+
+        # Chunk offsets of each stco table, to check which ones still fit after the move
+        narrow = {
+            offset: _read_table(mm, offset + header_size + 8, struct.unpack_from('>I', mm, offset + header_size + 4)[0])
+            for box_type, offset, _, header_size in _chunk_offset_tables(mm, moov_offset, moov_size, moov_header)
+            if box_type == b'stco'
+        }
+        widen = set()
+        while True:
+            new_moov_size = moov_size + sum(4 * len(narrow[offset]) for offset in widen)
+            growth = new_moov_size - moov_size
+
+            def shift(offsets):
+                # Media data between the old mdat start and moov moves down by the new moov,
+                # media data after the old moov only by its growth
+                return [
+                    value + new_moov_size if mdat_offset <= value < moov_offset
+                    else value + growth if value >= moov_end
+                    else value
+                    for value in offsets
+                ]
+
+            overflowing = {
+                offset for offset, offsets in narrow.items()
+                if offset not in widen and max(shift(offsets), default=0) > MAX_STCO_OFFSET
+            }
+            if not overflowing:
+                break
+            # Widening grows moov, which moves the media data again
+            widen |= overflowing
+
+        new_moov = _rebuild(mm, b'moov', moov_offset, moov_size, moov_header, shift, widen)
+        if widen:
+            logger.info(f"Converted {len(widen)} stco table(s) to co64")
+
+        fd = os.open(dst_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            src_fd = src.fileno()
+            _copy_range(src_fd, fd, 0, mdat_offset)
+            _write_all(fd, new_moov)
+            _copy_range(src_fd, fd, mdat_offset, moov_offset - mdat_offset)
+            _copy_range(src_fd, fd, moov_end, len(mm) - moov_end)
+        finally:
+            os.close(fd)
+    return True
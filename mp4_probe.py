@@ -0,0 +1,525 @@
+import os
+import sys
+import mmap
+import array
+import bisect
+import struct
+import logging
+import itertools
+
+logger = logging.getLogger(__name__)
+
+# Boxes whose payload is a plain list of child boxes
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts', b'dinf', b'mvex'}
+
+
+def iter_boxes(buf, start=0, end=None):
+    """
+    Yield (type, offset, size, header_size) for the boxes between start and end.
+
+    The walk stops at a header that is cut off by the end of the buffer. A box whose
+    body extends past the buffer is still yielded, so callers working on the first few
+    MB of a file can tell where the next top-level box starts.
+    """
+    end = len(buf) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', buf, offset)
+        header_size = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from('>Q', buf, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            # The last box of the file extends to its end
+            size = end - offset
+        if size < header_size:
+            logger.warning(f"Corrupt MP4 box at offset {offset}")
+            return
+        yield box_type, offset, size, header_size
+        offset += size
+
+
+def find_box(buf, box_type, start=0, end=None):
+    """Return (offset, size, header_size) of the first child box of the given type"""
+    for found_type, offset, size, header_size in iter_boxes(buf, start, end):
+        if found_type == box_type:
+            return offset, size, header_size
+    return None
+
+
+def locate_moov(buf):
+    """
+    Walk the top-level boxes of a file (or of its first few MB).
+
+    Returns a dict with 'moov_offset'/'moov_size' (None when moov was not reached),
+    'mdat_offset' and 'next_offset', the file offset where the walk left the buffer.
+    When moov sits after mdat, 'next_offset' is where a Range request for it starts.
+    """
+    layout = {'moov_offset': None, 'moov_size': None, 'mdat_offset': None, 'next_offset': 0}
+    for box_type, offset, size, header_size in iter_boxes(buf):
+        if box_type == b'moov':
+            layout['moov_offset'] = offset
+            layout['moov_size'] = size
+        elif box_type == b'mdat' and layout['mdat_offset'] is None:
+            layout['mdat_offset'] = offset
+        layout['next_offset'] = offset + size
+    return layout
+
+
+def _full_box_version(buf, offset, header_size):
+    """Return (version, payload offset) of a full box"""
+    return buf[offset + header_size], offset + header_size + 4
+
+
+def parse_moov(buf, offset, size):
+    """
+    Parse a moov box held in buf at offset.
+
+    Returns a dict with the movie 'duration' in seconds and a list of 'tracks', each with
+    its handler type ('vide', 'soun', ...), display 'width'/'height', media 'timescale'
+    and the location of its sample table ('stbl_offset', 'stbl_size') within buf.
+    """
+    end = offset + size
+    header_size = 16 if struct.unpack_from('>I', buf, offset)[0] == 1 else 8
+    info = {'duration': None, 'tracks': []}
+
+    mvhd = find_box(buf, b'mvhd', offset + header_size, end)
+    if mvhd:
+        version, pos = _full_box_version(buf, mvhd[0], mvhd[2])
+        if version == 1:
+            timescale, duration = struct.unpack_from('>IQ', buf, pos + 16)
+        else:
+            timescale, duration = struct.unpack_from('>II', buf, pos + 8)
+        if timescale:
+            info['duration'] = duration / timescale
+
+    for box_type, trak_offset, trak_size, trak_header in iter_boxes(buf, offset + header_size, end):
+        if box_type != b'trak':
+            continue
+        trak_end = trak_offset + trak_size
+        track = {'handler': None, 'width': 0, 'height': 0, 'timescale': None, 'duration': None,
+                 'media_time': 0, 'stbl_offset': None, 'stbl_size': None}
+
+        tkhd = find_box(buf, b'tkhd', trak_offset + trak_header, trak_end)
+        if tkhd:
+            version, pos = _full_box_version(buf, tkhd[0], tkhd[2])
+            # Skip times, track id, duration, reserved, layer/group/volume and the matrix
+            pos += (32 if version == 1 else 20) + 8 + 8 + 36
+            width, height = struct.unpack_from('>II', buf, pos)
+            track['width'] = width >> 16
+            track['height'] = height >> 16
+
+        edts = find_box(buf, b'edts', trak_offset + trak_header, trak_end)
+        if edts:
+            elst = find_box(buf, b'elst', edts[0] + edts[2], edts[0] + edts[1])
+            if elst:
+                track['media_time'] = _first_media_time(buf, elst[0], elst[2])
+
+        mdia = find_box(buf, b'mdia', trak_offset + trak_header, trak_end)
+        if mdia:
+            mdia_start, mdia_end = mdia[0] + mdia[2], mdia[0] + mdia[1]
+            mdhd = find_box(buf, b'mdhd', mdia_start, mdia_end)
+            if mdhd:
+                version, pos = _full_box_version(buf, mdhd[0], mdhd[2])
+                if version == 1:
+                    timescale, duration = struct.unpack_from('>IQ', buf, pos + 16)
+                else:
+                    timescale, duration = struct.unpack_from('>II', buf, pos + 8)
+                track['timescale'] = timescale
+                track['duration'] = duration / timescale if timescale else None
+            hdlr = find_box(buf, b'hdlr', mdia_start, mdia_end)
+            if hdlr:
+                track['handler'] = bytes(buf[hdlr[0] + hdlr[2] + 8:hdlr[0] + hdlr[2] + 12]).decode('latin-1')
+            minf = find_box(buf, b'minf', mdia_start, mdia_end)
+            if minf:
+                stbl = find_box(buf, b'stbl', minf[0] + minf[2], minf[0] + minf[1])
+                if stbl:
+                    track['stbl_offset'], track['stbl_size'] = stbl[0], stbl[1]
+
+        info['tracks'].append(track)
+
+    # Fragmented or unusual files may leave the movie duration empty
+    if not info['duration']:
+        durations = [track['duration'] for track in info['tracks'] if track['duration']]
+        info['duration'] = max(durations) if durations else None
+    return info
+
+
+def _first_media_time(buf, offset, header_size):
+    """Return the media time where presentation starts, from an elst box"""
+    version, pos = _full_box_version(buf, offset, header_size)
+    entry_count = struct.unpack_from('>I', buf, pos)[0]
+    pos += 4
+    for _ in range(entry_count):
+        if version == 1:
+            _, media_time = struct.unpack_from('>Qq', buf, pos)
+            pos += 20
+        else:
+            _, media_time = struct.unpack_from('>Ii', buf, pos)
+            pos += 12
+        # An empty edit (-1) only delays the start; the next entry holds the media time
+        if media_time != -1:
+            return media_time
+    return 0
+
+
+def video_track(info):
+    """Return the first video track of a parsed moov, or None"""
+    for track in info['tracks']:
+        if track['handler'] == 'vide':
+            return track
+    return None
+
+
+def _metadata(buf, moov_offset, moov_size, layout):
+    """Build the metadata dict used for Telegram uploads from a moov box"""
+    info = parse_moov(buf, moov_offset, moov_size)
+    track = video_track(info)
+    if not track or not info['duration'] or not track['width'] or not track['height']:
+        return None
+    return {
+        'duration': int(round(info['duration'])),
+        'width': track['width'],
+        'height': track['height'],
+        'moov_offset': layout['moov_offset'],
+        'moov_size': layout['moov_size'],
+        'mdat_offset': layout['mdat_offset'],
+        # Playback can start before the download finishes only when moov precedes mdat
+        'faststart': layout['mdat_offset'] is None or layout['moov_offset'] < layout['mdat_offset']
+    }
+
+
+def probe_file(path):
+    """
+    Read duration, width and height of an MP4 file without decoding any frames.
+    Only the box headers and the moov box are touched, through mmap.
+    Returns None when the file is not a usable MP4.
+    """
+    if not os.path.getsize(path):
+        return None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        layout = locate_moov(mm)
+        if layout['moov_offset'] is None or layout['moov_offset'] + layout['moov_size'] > len(mm):
+            return None
+        return _metadata(mm, layout['moov_offset'], layout['moov_size'], layout)
+
+
+def probe_bytes(head, tail=None, tail_offset=None):
+    """
+    Read metadata from the first few MB of an MP4 file, e.g. fetched with a Range request.
+
+    When moov comes after mdat, pass the bytes starting at the returned layout's
+    'next_offset' as tail (with tail_offset set to that offset). Returns (metadata, layout);
+    metadata is None when moov is not (completely) available in the given bytes.
+    """
+    layout = locate_moov(head)
+    if layout['moov_offset'] is not None and layout['moov_offset'] + layout['moov_size'] <= len(head):
+        return _metadata(head, layout['moov_offset'], layout['moov_size'], layout), layout
+
+    if tail is not None and tail_offset is not None:
+        moov = find_box(tail, b'moov')
+        if moov and moov[0] + moov[1] <= len(tail):
+            layout['moov_offset'] = tail_offset + moov[0]
+            layout['moov_size'] = moov[1]
+            return _metadata(tail, moov[0], moov[1], layout), layout
+    return None, layout
+
+
+def _read_table(buf, offset, count, wide=False):
+    """Read a big-endian table of unsigned 32-bit (or 64-bit) integers"""
+    table = array.array('Q' if wide else 'I')
+    if table.itemsize != (8 if wide else 4):
+        return list(struct.unpack_from(f'>{count}{"Q" if wide else "I"}', buf, offset))
+    table.frombytes(buf[offset:offset + count * table.itemsize])
+    if sys.byteorder == 'little':
+        table.byteswap()
+    return table
+
+
+def _sample_tables(buf, track):
+    """Read the sample tables of a track needed to locate and time samples"""
+    start = track['stbl_offset'] + (16 if struct.unpack_from('>I', buf, track['stbl_offset'])[0] == 1 else 8)
+    end = track['stbl_offset'] + track['stbl_size']
+    boxes = {box_type: (offset + header_size + 4, offset + size)
+             for box_type, offset, size, header_size in iter_boxes(buf, start, end)}
+    tables = {}
+
+    pos, _ = boxes[b'stts']
+    count = struct.unpack_from('>I', buf, pos)[0]
+    tables['stts'] = _read_table(buf, pos + 4, count * 2)
+
+    tables['ctts'] = None
+    if b'ctts' in boxes:
+        pos, _ = boxes[b'ctts']
+        count = struct.unpack_from('>I', buf, pos)[0]
+        # Offsets may be signed in version 1; reinterpret when reading single values
+        tables['ctts'] = _read_table(buf, pos + 4, count * 2)
+
+    # Without stss every sample is a keyframe
+    tables['stss'] = None
+    if b'stss' in boxes:
+        pos, _ = boxes[b'stss']
+        count = struct.unpack_from('>I', buf, pos)[0]
+        tables['stss'] = _read_table(buf, pos + 4, count)
+
+    pos, _ = boxes[b'stsc']
+    count = struct.unpack_from('>I', buf, pos)[0]
+    tables['stsc'] = _read_table(buf, pos + 4, count * 3)
+
+    if b'stco' in boxes:
+        pos, _ = boxes[b'stco']
+        count = struct.unpack_from('>I', buf, pos)[0]
+        tables['chunk_offsets'] = _read_table(buf, pos + 4, count)
+    else:
+        pos, _ = boxes[b'co64']
+        count = struct.unpack_from('>I', buf, pos)[0]
+        tables['chunk_offsets'] = _read_table(buf, pos + 4, count, wide=True)
+
+    pos, _ = boxes[b'stsz']
+    sample_size, count = struct.unpack_from('>II', buf, pos)
+    tables['sample_count'] = count
+    tables['sample_size'] = sample_size
+    tables['stsz'] = None if sample_size else _read_table(buf, pos + 8, count)
+    return tables
+
+
+def _decode_times(tables, samples):
+    """Return the decode time of each requested sample number (1-based, ascending)"""
+    times = {}
+    stts = tables['stts']
+    wanted = iter(samples)
+    sample = next(wanted, None)
+    first, time = 1, 0
+    for i in range(0, len(stts), 2):
+        count, delta = stts[i], stts[i + 1]
+        while sample is not None and sample < first + count:
+            times[sample] = time + (sample - first) * delta
+            sample = next(wanted, None)
+        first += count
+        time += count * delta
+    return times
+
+
+def _composition_offset(tables, sample):
+    """Return the composition (presentation - decode) offset of a sample"""
+    ctts = tables['ctts']
+    if ctts is None:
+        return 0
+    first = 1
+    for i in range(0, len(ctts), 2):
+        count, offset = ctts[i], ctts[i + 1]
+        if sample < first + count:
+            return offset - (1 << 32) if offset >= 1 << 31 else offset
+        first += count
+    return 0
+
+
+def _sample_location(tables, sample):
+    """Return (file offset, size) of a sample number (1-based)"""
+    stsc, chunk_offsets = tables['stsc'], tables['chunk_offsets']
+    first_sample = 1
+    for i in range(0, len(stsc), 3):
+        first_chunk, samples_per_chunk = stsc[i], stsc[i + 1]
+        next_chunk = stsc[i + 3] if i + 3 < len(stsc) else len(chunk_offsets) + 1
+        run_samples = (next_chunk - first_chunk) * samples_per_chunk
+        if sample < first_sample + run_samples:
+            chunk_index = (sample - first_sample) // samples_per_chunk
+            chunk_first_sample = first_sample + chunk_index * samples_per_chunk
+            offset = chunk_offsets[first_chunk - 1 + chunk_index]
+            if tables['stsz'] is None:
+                offset += (sample - chunk_first_sample) * tables['sample_size']
+                return offset, tables['sample_size']
+            stsz = tables['stsz']
+            offset += sum(stsz[chunk_first_sample - 1:sample - 1])
+            return offset, stsz[sample - 1]
+        first_sample += run_samples
+    raise ValueError(f"Sample {sample} is not mapped to a chunk")
+
+
+def keyframe_near(buf, track, target_time, limit_offset=None):
+    """
+    Find the keyframe of a track whose presentation time is nearest to target_time.
+
+    Only the sample tables are read, so seeking to the returned 'time' decodes that
+    single frame. With limit_offset, only keyframes whose bytes end before that file
+    offset are considered (e.g. the part of a file downloaded so far).
+    Returns a dict with 'time' (seconds), 'offset', 'size' and 'sample', or None.
+    """
+    tables = _sample_tables(buf, track)
+    timescale = track['timescale']
+    if not timescale or not tables['sample_count']:
+        return None
+    sync = tables['stss'] if tables['stss'] is not None else range(1, tables['sample_count'] + 1)
+
+    decode_times = _decode_times(tables, sync)
+    candidates = []
+    for sample in sync:
+        if sample not in decode_times:
+            continue
+        presentation = decode_times[sample] + _composition_offset(tables, sample) - track['media_time']
+        candidates.append((abs(presentation / timescale - target_time), max(presentation, 0) / timescale, sample))
+
+    for _, time, sample in sorted(candidates):
+        offset, size = _sample_location(tables, sample)
+        if limit_offset is None or offset + size <= limit_offset:
+            return {'time': time, 'offset': offset, 'size': size, 'sample': sample}
+    return None
+
+
+def _parameter_sets(buf, track):
+    """
+    Read the codec configuration of an H.264 or HEVC track.
+    Returns (codec, NAL length size, Annex B parameter sets) or None for other codecs.
+    """
+    start = track['stbl_offset'] + 8
+    stsd = find_box(buf, b'stsd', start, track['stbl_offset'] + track['stbl_size'])
+    if not stsd:
+        return None
+    entry = stsd[0] + stsd[2] + 8  # Skip version/flags and the entry count
+    entry_size, entry_type = struct.unpack_from('>I4s', buf, entry)
+    # Child boxes follow the 78 byte visual sample entry fields
+    children_start, children_end = entry + 8 + 78, entry + entry_size
+    nal_units = []
+
+    if entry_type in (b'avc1', b'avc3'):
+        avcc = find_box(buf, b'avcC', children_start, children_end)
+        if not avcc:
+            return None
+        pos = avcc[0] + avcc[2]
+        length_size = (buf[pos + 4] & 3) + 1
+        pos += 5
+        for mask in (0x1f, 0xff):  # SPS count is 5 bits, PPS count 8 bits
+            count = buf[pos] & mask
+            pos += 1
+            for _ in range(count):
+                size = struct.unpack_from('>H', buf, pos)[0]
+                nal_units.append(bytes(buf[pos + 2:pos + 2 + size]))
+                pos += 2 + size
+        codec = 'h264'
+    elif entry_type in (b'hvc1', b'hev1'):
+        hvcc = find_box(buf, b'hvcC', children_start, children_end)
+        if not hvcc:
+            return None
+        pos = hvcc[0] + hvcc[2]
+        length_size = (buf[pos + 21] & 3) + 1
+        arrays = buf[pos + 22]
+        pos += 23
+        for _ in range(arrays):
+            count = struct.unpack_from('>H', buf, pos + 1)[0]
+            pos += 3
+            for _ in range(count):
+                size = struct.unpack_from('>H', buf, pos)[0]
+                nal_units.append(bytes(buf[pos + 2:pos + 2 + size]))
+                pos += 2 + size
+        codec = 'hevc'
+    else:
+        return None
+
+    return codec, length_size, b''.join(b'\0\0\0\1' + nal for nal in nal_units)
+
+
+def find_thumbnail_keyframe(path, moov_offset, moov_size, target_time, limit_offset=None):
+    """
+    Locate the keyframe to grab a thumbnail from in a (possibly partial) MP4 file.
+
+    Besides the keyframe location, the result holds the track's 'codec', NAL
+    'length_size' and Annex B 'parameter_sets' when the codec is H.264 or HEVC,
+    so the keyframe can be decoded on its own with keyframe_bitstream().
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if moov_offset + moov_size > len(mm):
+            return None
+        track = video_track(parse_moov(mm, moov_offset, moov_size))
+        if not track or track['stbl_offset'] is None:
+            return None
+        keyframe = keyframe_near(mm, track, target_time, limit_offset)
+        if keyframe:
+            config = _parameter_sets(mm, track)
+            keyframe['codec'], keyframe['length_size'], keyframe['parameter_sets'] = config or (None, None, None)
+        return keyframe
+
+
+def keyframe_bitstream(keyframe, sample):
+    """
+    Turn the bytes of a keyframe sample into a standalone Annex B elementary stream
+    (parameter sets followed by the frame's NAL units) that a decoder can open directly.
+    """
+    length_size = keyframe['length_size']
+    parts = [keyframe['parameter_sets']]
+    pos = 0
+    while pos + length_size <= len(sample):
+        size = int.from_bytes(sample[pos:pos + length_size], 'big')
+        parts.append(b'\0\0\0\1' + bytes(sample[pos + length_size:pos + length_size + size]))
+        pos += length_size + size
+    return b''.join(parts)
+
+
+def _track_samples(tables, track):
+    """Yield (decode time in seconds, size) of every sample of a track"""
+    timescale = track['timescale']
+    stts, stsz = tables['stts'], tables['stsz']
+    sample, time = 0, -track['media_time']
+    for i in range(0, len(stts), 2):
+        count, delta = stts[i], stts[i + 1]
+        for _ in range(count):
+            if sample >= tables['sample_count']:
+                return
+            yield time / timescale, stsz[sample] if stsz is not None else tables['sample_size']
+            sample += 1
+            time += delta
+
+
+def plan_split(path, max_part_size):
+    """
+    Plan cuts of an MP4 file into parts of at most max_part_size bytes, at keyframes only,
+    so each part can be written with a stream copy and still starts with a decodable frame.
+
+    Part sizes are estimated from the sample tables of all tracks. Returns a list of
+    (start, end) times in seconds, end being None for the last part, or None when the
+    file cannot be read or a single keyframe interval is larger than max_part_size.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        layout = locate_moov(mm)
+        if layout['moov_offset'] is None or layout['moov_offset'] + layout['moov_size'] > len(mm):
+            return None
+        info = parse_moov(mm, layout['moov_offset'], layout['moov_size'])
+        video = video_track(info)
+        if not video or video['stbl_offset'] is None or not video['timescale']:
+            return None
+
+        # Bytes of all tracks by decode time
+        samples = []
+        for track in info['tracks']:
+            if track['stbl_offset'] is None or not track['timescale']:
+                continue
+            samples.extend(_track_samples(_sample_tables(mm, track), track))
+        samples.sort()
+        times = [time for time, _ in samples]
+        cumulative = list(itertools.accumulate((size for _, size in samples), initial=0))
+
+        tables = _sample_tables(mm, video)
+        sync = tables['stss'] if tables['stss'] is not None else range(1, tables['sample_count'] + 1)
+        decode_times = _decode_times(tables, sync)
+        keyframes = sorted(
+            (decode_times[sample] + _composition_offset(tables, sample) - video['media_time']) / video['timescale']
+            for sample in sync if sample in decode_times
+        )
+
+    def bytes_before(time):
+        return cumulative[bisect.bisect_left(times, time)]
+
+    parts = []
+    start = 0.0
+    candidates = [time for time in keyframes if time > 0]
+    while cumulative[-1] - bytes_before(start) > max_part_size:
+        budget = bytes_before(start) + max_part_size
+        # The last keyframe that still keeps this part within the limit
+        cuts = [time for time in candidates if time > start and bytes_before(time) <= budget]
+        if not cuts:
+            return None
+        parts.append((start, cuts[-1]))
+        start = cuts[-1]
+    parts.append((start, None))
+    return parts
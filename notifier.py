@@ -0,0 +1,162 @@
+import time
+import asyncio
+import logging
+from telegram.error import BadRequest
+from retry import Retrier, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096  # Telegram's limit for one text message
+
+
+class AdminNotifier:
+    """
+    Delivers admin notifications from a background task, so the pipeline never waits
+    for Telegram.
+
+    send() queues a one-off message; messages queued within `coalesce_delay` of each
+    other go out as one message. status() sets the text of a live status message per
+    key (e.g. a video ID): the first status sends a message, later ones edit it, at most
+    every `edit_interval` seconds, and only the latest text is sent. A final status is
+    delivered without waiting for the interval and ends that status message.
+
+    Deliveries run as 'notification' operations of `retrier` (a retry.Retrier): flood
+    control (RetryAfter) is waited out and transient failures are retried, per its
+    policy, before the notification is dropped. Without a retrier, a notification gets
+    3 tries, 2s apart and more, with retries counted in `metrics`, if given.
+    """
+
+    def __init__(self, bot, chat_id, coalesce_delay=1.0, edit_interval=5.0, retrier=None, metrics=None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.coalesce_delay = coalesce_delay
+        self.edit_interval = edit_interval
+        self.retrier = retrier or Retrier(
+            {'notification': RetryPolicy(attempts=3, base_delay=2.0, max_flood_wait=None)}, metrics=metrics
+        )
+        self._messages = []  # Queued one-off texts, oldest first
+        self._statuses = {}  # Key -> {'text', 'message_id', 'sent_at', 'dirty', 'final'}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closing = False
+
+    def send(self, text):
+        """Queue a one-off HTML message. Returns False when no admin chat is configured."""
+        if not self.chat_id:
+            logger.warning("ADMIN_ID not set, skipping admin notification")
+            return False
+        self._messages.append(text)
+        self._wake()
+        return True
+
+    def status(self, key, text, final=False):
+        """Set the text of the live status message for key; a final status ends it"""
+        if not self.chat_id:
+            return
+        status = self._statuses.setdefault(
+            key, {'text': None, 'message_id': None, 'sent_at': None, 'dirty': False, 'final': False}
+        )
+        if status['text'] == text and not final:
+            return
+        status.update(text=text, dirty=True, final=final)
+        self._wake()
+
+    def _wake(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def _next_due(self):
+        """Seconds until a throttled status edit may be sent, or None when nothing waits"""
+        waits = [
+            status['sent_at'] + self.edit_interval - time.monotonic()
+            for status in self._statuses.values()
+            if status['dirty'] and status['sent_at'] is not None
+        ]
+        return max(0.0, min(waits)) if waits else None
+
+    def _pending(self):
+        return bool(self._messages) or any(status['dirty'] for status in self._statuses.values())
+
+    async def _run(self):
+        while True:
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._next_due())
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                # Let a burst of notifications pile up, so it goes out as few requests
+                await asyncio.sleep(self.coalesce_delay)
+            await self._flush(force=self._closing)
+            if self._closing and not self._pending():
+                return
+
+    async def _flush(self, force=False):
+        """Send queued messages and the status changes whose edit interval has passed"""
+        while self._messages:
+            batch = [self._messages.pop(0)]
+            while self._messages and len('\n\n'.join(batch + self._messages[:1])) <= MAX_MESSAGE_LENGTH:
+                batch.append(self._messages.pop(0))
+            await self._deliver(self.bot.send_message, text='\n\n'.join(batch))
+
+        now = time.monotonic()
+        for key, status in list(self._statuses.items()):
+            if not status['dirty']:
+                continue
+            throttled = status['sent_at'] is not None and now - status['sent_at'] < self.edit_interval
+            if throttled and not status['final'] and not force:
+                continue
+            status['dirty'] = False
+            status['sent_at'] = now
+            text = status['text']
+            if status['message_id'] is not None:
+                try:
+                    await self._call(self.bot.edit_message_text, message_id=status['message_id'], text=text)
+                except BadRequest as e:
+                    if 'not modified' not in str(e).lower():
+                        # E.g. the message was deleted: continue in a new one
+                        logger.warning(f"Could not edit status message: {e}")
+                        status['message_id'] = None
+            if status['message_id'] is None:
+                message = await self._deliver(self.bot.send_message, text=text)
+                status['message_id'] = message.message_id if message else None
+            if status['final'] and not status['dirty']:
+                del self._statuses[key]
+
+    async def _deliver(self, method, **params):
+        """Call a Bot API method, logging instead of raising when it is rejected"""
+        try:
+            return await self._call(method, **params)
+        except BadRequest as e:
+            logger.error(f"Telegram rejected admin notification: {e}")
+            return None
+
+    async def _call(self, method, **params):
+        """Call a Bot API method with retries; returns None when every attempt failed"""
+        try:
+            return await self.retrier.call(
+                'notification', self.bot.base_url, method,
+                chat_id=self.chat_id,
+                parse_mode='HTML',
+                read_timeout=30,
+                write_timeout=30,
+                connect_timeout=30,
+                **params
+            )
+        except BadRequest:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to send admin notification: {e}")
+            return None
+
+    async def aclose(self, timeout=10.0):
+        """Deliver what is still pending (for at most timeout seconds) and stop"""
+        self._closing = True
+        if self._task is None or self._task.done():
+            return
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Gave up delivering pending admin notifications")
@@ -0,0 +1,161 @@
+from lxml import etree
+
+
+def has_class(attrib, class_name):
+    """Match an element's class attribute the way BeautifulSoup's class_ does"""
+    return class_name is None or class_name in attrib.get('class', '').split()
+
+
+class _StreamingParser:
+    """
+    Base class for incremental lxml parsers fed with response chunks.
+
+    lxml calls start()/end() as the chunks are fed, without building a tree. Once
+    `stopped` is set, the caller stops reading the response.
+    """
+
+    def __init__(self, encoding=None):
+        self.stopped = False
+        self._depth = 0
+        self._parser = etree.HTMLParser(target=self, encoding=encoding)
+
+    def feed(self, chunk):
+        """Feed the next chunk of the page; returns True once parsing can stop"""
+        if not self.stopped:
+            self._parser.feed(chunk)
+        return self.stopped
+
+    def finish(self):
+        """Signal the end of the page"""
+        if not self.stopped:
+            try:
+                self._parser.close()
+            except etree.XMLSyntaxError:
+                pass  # Nothing was fed (empty page)
+        self.stopped = True
+
+    def start(self, tag, attrib):
+        self._depth += 1
+
+    def end(self, tag):
+        self._depth -= 1
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        return None
+
+
+class ListingParser(_StreamingParser):
+    """
+    Collect the video blocks of the main page, newest first.
+
+    Collects {'id', 'url'} for every item block inside the first container. Parsing
+    stops at the first block whose ID satisfies `stop` (not included; its ID is kept in
+    `stopped_at`) or once `limit` blocks are collected, so only the new part of the page
+    is ever read.
+    """
+
+    def __init__(self, container=('ul', 'videos_ul'), item=('li', 'video_block'), link=('a', 'image'),
+                 stop=None, limit=None, encoding=None):
+        super().__init__(encoding)
+        self.container, self.item, self.link = container, item, link
+        self.stop = stop
+        self.limit = limit
+        self.found_container = False
+        self.stopped_at = None
+        self.videos = []
+        self._container_depth = None
+        self._item_depth = None
+        self._current = None
+
+    def start(self, tag, attrib):
+        super().start(tag, attrib)
+        if self.stopped:
+            return
+        if self._container_depth is None:
+            if not self.found_container and tag == self.container[0] and has_class(attrib, self.container[1]):
+                self.found_container = True
+                self._container_depth = self._depth
+            return
+
+        if tag == self.item[0] and has_class(attrib, self.item[1]):
+            if self._current is not None:
+                # A block nested in an unclosed one: the enclosing block ends here
+                self._finish_item()
+                if self.stopped:
+                    return
+            video_id = attrib.get('id')
+            if self.stop is not None and video_id and self.stop(video_id):
+                self.stopped_at = video_id
+                self.stopped = True
+                return
+            self._current = {'id': video_id, 'url': None}
+            self._item_depth = self._depth
+        elif self._current is not None and self._current['url'] is None \
+                and tag == self.link[0] and has_class(attrib, self.link[1]):
+            self._current['url'] = attrib.get('href') or None
+
+    def end(self, tag):
+        if not self.stopped:
+            if self._current is not None and self._depth == self._item_depth:
+                self._finish_item()
+            elif self._depth == self._container_depth:
+                # Only the first container is used
+                self._container_depth = None
+                self.stopped = True
+        super().end(tag)
+
+    def _finish_item(self):
+        self.videos.append(self._current)
+        self._current = None
+        if self.limit and len(self.videos) >= self.limit:
+            self.stopped = True
+
+
+class VideoSourceParser(_StreamingParser):
+    """
+    Find the video source on a video page by element nesting.
+
+    Follows `path` (by default div.col_video -> div.player-wrapper -> video), taking the
+    first match at each level like chained BeautifulSoup find() calls, and stops as soon
+    as the last element is reached. `src` holds its src attribute; `missing` names the
+    first element of the path that could not be found.
+    """
+
+    def __init__(self, path=(('div', 'col_video'), ('div', 'player-wrapper'), ('video', None)), encoding=None):
+        super().__init__(encoding)
+        self.path = path
+        self.src = None
+        self.missing = None
+        self._matched_depths = []
+
+    def start(self, tag, attrib):
+        super().start(tag, attrib)
+        if self.stopped:
+            return
+        tag_name, class_name = self.path[len(self._matched_depths)]
+        if tag == tag_name and has_class(attrib, class_name):
+            self._matched_depths.append(self._depth)
+            if len(self._matched_depths) == len(self.path):
+                self.src = attrib.get('src') or None
+                self.stopped = True
+
+    def end(self, tag):
+        if not self.stopped and self._matched_depths and self._depth == self._matched_depths[-1]:
+            # The matched element closed without containing the next one
+            self.missing = self.path[len(self._matched_depths)]
+            self.stopped = True
+        super().end(tag)
+
+    def finish(self):
+        if not self.stopped and self.src is None and self.missing is None:
+            self.missing = self.path[len(self._matched_depths)]
+        super().finish()
+
+
+def describe(selector):
+    """Format a (tag, class) selector for log messages"""
+    tag, class_name = selector
+    return f"{tag}.{class_name}" if class_name else f"{tag} tag"
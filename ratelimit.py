@@ -0,0 +1,143 @@
+import re
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_ENTRY_RE = re.compile(r'^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})=(\d+)/(\d+)$')
+SCHEDULE_CHECK_INTERVAL = 30  # Seconds between looks at the schedule
+THROUGHPUT_WINDOW = 1.0  # Seconds of traffic averaged into the throughput gauge
+
+
+def parse_schedule(text):
+    """
+    Parse a bandwidth schedule: ';'- or ','-separated "HH:MM-HH:MM=DOWN/UP" windows in
+    local time, with limits in KB/s (0: unlimited). A window may span midnight
+    (22:00-06:00). Returns a list of (start minute, end minute, download bytes/s,
+    upload bytes/s). Raises ValueError on malformed entries.
+    """
+    windows = []
+    for entry in re.split(r'[;,]', text or ''):
+        entry = entry.strip().replace(' ', '')
+        if not entry:
+            continue
+        match = SCHEDULE_ENTRY_RE.match(entry)
+        if not match:
+            raise ValueError(f"Bad bandwidth schedule entry {entry!r} (expected HH:MM-HH:MM=DOWN/UP in KB/s)")
+        start_hour, start_minute, end_hour, end_minute, download, upload = map(int, match.groups())
+        # Hours 0-23 and minutes 0-59; a window may also end at 24:00
+        if start_hour > 23 or start_minute > 59 or end_minute > 59 or end_hour > 24 or (end_hour == 24 and end_minute):
+            raise ValueError(
+                f"Bad time in bandwidth schedule entry {entry!r} (expected 00:00-23:59, or 24:00 as an end time)"
+            )
+        windows.append((start_hour * 60 + start_minute, end_hour * 60 + end_minute, download * 1024, upload * 1024))
+    return windows
+
+
+class TokenBucket:
+    """
+    Token bucket of `rate` bytes per second holding at most `burst` seconds of tokens.
+    A request larger than the tokens on hand borrows against future tokens, so the
+    bucket never splits chunks, and concurrent callers are served in the order they
+    asked. A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate=0, burst=1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = rate * burst
+        self.updated = time.monotonic()
+
+    def set_rate(self, rate):
+        self._refill()
+        # Coming from unlimited, start with a full bucket
+        self.tokens = min(self.tokens, rate * self.burst) if self.rate else rate * self.burst
+        self.rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.rate * self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, size):
+        """Take size bytes of tokens; returns the seconds to wait before sending them"""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        self.tokens -= size
+        return max(0.0, -self.tokens / self.rate)
+
+
+class BandwidthLimiter:
+    """
+    Shapes one direction of the bot's traffic (downloads or uploads) to `rate` bytes
+    per second over all transfers sharing it, or to the rate of the `schedule` window
+    (from parse_schedule, one direction) covering the current local time.
+
+    Transfers call consume() for every chunk inside their streaming loops, so the
+    traffic is spread out evenly instead of paused between files. Bytes moved, time
+    held back, the limit in effect and the throughput of the last second are recorded
+    in `metrics`, if given, labelled with `direction`.
+    """
+
+    def __init__(self, direction, rate=0, schedule=(), metrics=None):
+        self.direction = direction
+        self.default_rate = rate
+        self.schedule = list(schedule)
+        self.metrics = metrics
+        self.bucket = TokenBucket()
+        self.throughput = 0.0
+        self._next_schedule_check = 0.0
+        self._window_started = time.monotonic()
+        self._window_bytes = 0
+        self._update_limit()
+
+    def scheduled_rate(self, now=None):
+        """The limit in effect at local time `now` (a timestamp; default: now)"""
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        for start, end, rate in self.schedule:
+            if start <= minute < end or (end < start and (minute >= start or minute < end)):
+                return rate
+        return self.default_rate
+
+    def _update_limit(self):
+        rate = self.scheduled_rate()
+        if rate != self.bucket.rate:
+            logger.info(f"{self.direction.capitalize()} bandwidth limit: "
+                        f"{f'{rate / 1024:.0f} KB/s' if rate else 'unlimited'}")
+            self.bucket.set_rate(rate)
+        if self.metrics:
+            self.metrics.set('bandwidth_limit_bytes_per_second', rate, direction=self.direction)
+        self._next_schedule_check = time.monotonic() + SCHEDULE_CHECK_INTERVAL
+
+    async def consume(self, size):
+        """Account for size bytes about to be sent or just received, waiting as the limit requires"""
+        if self.schedule and time.monotonic() >= self._next_schedule_check:
+            self._update_limit()
+        wait = self.bucket.reserve(size)
+        if wait > 0:
+            if self.metrics:
+                self.metrics.inc('bandwidth_throttled_seconds_total', wait, direction=self.direction)
+            await asyncio.sleep(wait)
+        self._account(size)
+
+    async def shape(self, chunks):
+        """Yield the chunks of an async iterable at the pace of the limit"""
+        async for chunk in chunks:
+            await self.consume(len(chunk))
+            yield chunk
+
+    def _account(self, size):
+        self._window_bytes += size
+        if self.metrics:
+            self.metrics.inc('bandwidth_bytes_total', size, direction=self.direction)
+        elapsed = time.monotonic() - self._window_started
+        if elapsed >= THROUGHPUT_WINDOW:
+            self.throughput = self._window_bytes / elapsed
+            if self.metrics:
+                self.metrics.set('bandwidth_throughput_bytes_per_second', self.throughput, direction=self.direction)
+            self._window_started += elapsed
+            self._window_bytes = 0
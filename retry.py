@@ -0,0 +1,231 @@
+import time
+import random
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# How a failure is handled
+RETRY = 'retry'  # Transient: try again after a backoff delay
+FLOOD_WAIT = 'flood_wait'  # Rate limited: try again after the delay the server asked for
+FATAL = 'fatal'  # Retrying cannot help
+
+# Statuses worth retrying: timeouts, rate limiting and server-side failures
+RETRYABLE_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+# Transport errors raised before the request was completely sent, so the server cannot
+# have acted on it: safe to retry even for requests that must not run twice
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.WriteError, httpx.WriteTimeout)
+
+
+class CircuitOpen(Exception):
+    """An endpoint failed too often; calls to it are refused until its reset timeout passes"""
+
+
+class RetryPolicy:
+    """
+    How one kind of operation is retried: up to `attempts` tries with jittered exponential
+    backoff (base_delay, doubled per retry, capped at max_delay, each delay shortened by
+    up to `jitter` of itself). Flood waits (Telegram RetryAfter, HTTP 429/503 with
+    Retry-After) sleep as long as asked, unless that is over `max_flood_wait` seconds.
+
+    Operations that are not `idempotent` (e.g. posting a video) are only retried when the
+    request cannot have reached the server, or the server refused it; a timeout waiting
+    for the response is final, as the post may have gone out. `retry_on` adds exception
+    types that are always retried.
+    """
+
+    def __init__(self, attempts=4, base_delay=2.0, max_delay=60.0, jitter=0.5, max_flood_wait=600,
+                 idempotent=True, retry_on=()):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_flood_wait = max_flood_wait
+        self.idempotent = idempotent
+        self.retry_on = tuple(retry_on)
+
+    def delay(self, retry):
+        """Seconds to wait before the given retry (1 for the first)"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def classify(self, error):
+        """Return (RETRY, FLOOD_WAIT or FATAL, seconds to wait for a flood wait)"""
+        if isinstance(error, CircuitOpen):
+            return FATAL, None
+        if isinstance(error, self.retry_on):
+            return RETRY, None
+
+        # Telegram's errors are matched by name: python-telegram-bot is only loaded when used
+        names = {cls.__name__ for cls in type(error).__mro__}
+        retry_after = getattr(error, 'retry_after', None)
+        if 'RetryAfter' in names and retry_after is not None:
+            # Newer versions report a timedelta
+            seconds = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else retry_after
+            return FLOOD_WAIT, float(seconds)
+        if 'TelegramError' in names:
+            # BadRequest is a NetworkError too, but a rejected request fails the same way again
+            if 'BadRequest' not in names and 'NetworkError' in names and self.idempotent:
+                return RETRY, None
+            return FATAL, None
+
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            retry_after = error.response.headers.get('retry-after', '')
+            if status in (429, 503) and retry_after.isdigit():
+                return FLOOD_WAIT, float(retry_after)
+            return (RETRY if status in RETRYABLE_STATUSES else FATAL), None
+        if isinstance(error, UNSENT_ERRORS):
+            return RETRY, None
+        if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError, asyncio.TimeoutError)):
+            return (RETRY if self.idempotent else FATAL), None
+        return FATAL, None
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an endpoint after `failure_threshold` consecutive transient failures.
+    While open, calls fail at once with CircuitOpen; after `reset_timeout` seconds one
+    trial call goes through, and closes the circuit if it succeeds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False  # A trial call of a half-open circuit is running
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def before_call(self, endpoint):
+        """Raise CircuitOpen unless a call may go through now"""
+        if self.opened_at is None:
+            return
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        if remaining > 0 or self.trial:
+            raise CircuitOpen(
+                f"{endpoint} failed {self.failures} times in a row, not calling it for another {max(0, remaining):.0f}s"
+            )
+        self.trial = True
+
+    def succeeded(self):
+        """Record a call that reached the endpoint; returns True if this closed the circuit"""
+        was_open = self.opened_at is not None
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        return was_open
+
+    def failed(self):
+        """Record a transient failure; returns True if this opened the circuit"""
+        self.failures += 1
+        self.trial = False
+        if self.opened_at is not None:
+            # The trial call failed: stay open for another reset_timeout
+            self.opened_at = time.monotonic()
+            return False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def abandoned(self):
+        """Record a call that was cancelled before its outcome was known"""
+        self.trial = False
+
+
+class Retrier:
+    """
+    Runs network operations (fetch, resolve, download, upload, notification) under the
+    RetryPolicy of their kind, with one CircuitBreaker per endpoint (host) shared by all
+    of them, so a host that is down fails fast instead of tying up every worker in
+    retries. Retries and circuit changes are counted in `metrics`, if given.
+    """
+
+    def __init__(self, policies, failure_threshold=5, reset_timeout=60.0, metrics=None):
+        self.policies = policies
+        self.default_policy = RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.metrics = metrics
+        self.breakers = {}
+
+    def breaker(self, endpoint):
+        """The circuit breaker of an endpoint (a host, or a URL of it)"""
+        host = urlsplit(endpoint).netloc or endpoint
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return host, self.breakers[host]
+
+    async def call(self, operation, endpoint, func, *args, **kwargs):
+        """
+        Await func(*args, **kwargs), retrying per the operation's policy. Raises the last
+        error once retrying cannot help, or CircuitOpen while the endpoint's circuit is open.
+        `endpoint` may be a function returning it, called before each try, for operations
+        whose URL changes between tries (e.g. a download URL that was resolved again).
+        """
+        policy = self.policies.get(operation, self.default_policy)
+        attempt = 1
+        while True:
+            host, breaker = self.breaker(endpoint() if callable(endpoint) else endpoint)
+            breaker.before_call(host)
+            try:
+                result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                breaker.abandoned()
+                raise
+            except Exception as e:
+                host, breaker = self._ended_on(endpoint, host, breaker)
+                kind, wait = policy.classify(e)
+                if kind == RETRY:
+                    if breaker.failed():
+                        logger.error(f"Opening the circuit of {host} for {self.reset_timeout:.0f}s "
+                                     f"after {breaker.failures} failures in a row")
+                        self._set_circuit(host, 1)
+                else:
+                    # The endpoint answered, or the failure is not its fault
+                    self._record_success(host, breaker)
+                if kind == FATAL or attempt >= policy.attempts or breaker.is_open:
+                    raise
+                if kind == FLOOD_WAIT:
+                    if policy.max_flood_wait is not None and wait > policy.max_flood_wait:
+                        logger.error(f"{operation} rate limited for {wait:.0f}s by {host}, giving up for now")
+                        raise
+                    delay = wait
+                else:
+                    delay = policy.delay(attempt)
+                attempt += 1
+                logger.warning(f"{operation} failed on {host} ({type(e).__name__}: {e}), "
+                               f"retrying in {delay:.1f}s (attempt {attempt}/{policy.attempts})")
+                if self.metrics:
+                    self.metrics.inc('retries_total', operation=operation if kind == RETRY else f'{operation}_{kind}')
+                await asyncio.sleep(delay)
+            else:
+                host, breaker = self._ended_on(endpoint, host, breaker)
+                self._record_success(host, breaker)
+                return result
+
+    def _ended_on(self, endpoint, host, breaker):
+        """The host and breaker a try ended on; the endpoint may have moved during the try"""
+        if not callable(endpoint):
+            return host, breaker
+        current_host, current_breaker = self.breaker(endpoint())
+        if current_host != host:
+            breaker.abandoned()
+        return current_host, current_breaker
+
+    def _record_success(self, host, breaker):
+        if breaker.succeeded():
+            logger.info(f"Circuit of {host} closed again")
+            self._set_circuit(host, 0)
+
+    def _set_circuit(self, host, value):
+        if self.metrics:
+            self.metrics.set('circuit_open', value, endpoint=host)
@@ -0,0 +1,160 @@
+import os
+import json
+import math
+import time
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    """
+    Chooses how long to wait before the next check of the website.
+
+    Every check that finds new videos records a detection: the uploads happened between
+    the previous check and this one. From a few detections the scheduler learns the
+    site's upload cadence and predicts a window for the next upload. It sleeps through
+    the quiet part of the cycle, checks more often inside the window, and backs off when
+    the upload is overdue. Without enough history it checks every `default_interval`,
+    as before.
+
+    Checks are paid for with credits earned at the rate of fixed `default_interval`
+    polling (times `budget`), so the scheduler never makes more requests than that.
+    """
+
+    MIN_GAPS = 3  # Gaps between detections needed before the cadence is trusted
+    HISTORY_SIZE = 50  # Detections kept
+    PROJECTED = 4  # Recent detections combined into the prediction
+    BURST = 4  # Checks that can be saved up during quiet hours and spent inside a window
+
+    def __init__(self, history_file, default_interval, min_interval, max_interval, jitter=0.1, budget=1.0):
+        self.history_file = history_file
+        self.default_interval = default_interval
+        self.min_interval = min(min_interval, max_interval)
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.budget = budget
+        self.detections = self.load_history()
+        self.last_check = None
+        # Check credits: earned at the fixed-interval rate (times the budget), one spent per check
+        self.credit_rate = budget / default_interval
+        self.credits = float(self.BURST)
+        self.credits_at = None
+
+    def _refill(self, now):
+        """Add the credits earned since the last refill"""
+        if self.credits_at is not None:
+            self.credits = min(self.BURST, self.credits + (now - self.credits_at) * self.credit_rate)
+        self.credits_at = now
+
+    def load_history(self):
+        """Load detections ([after, at, count]) from file"""
+        try:
+            if os.path.exists(self.history_file):
+                with open(self.history_file, 'r') as f:
+                    return sorted(json.load(f).get('detections', []))[-self.HISTORY_SIZE:]
+        except Exception as e:
+            logger.error(f"Error loading detection history: {e}")
+        return []
+
+    def save_history(self):
+        """Atomically save detections to file"""
+        tmp_path = f"{self.history_file}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'detections': self.detections}, f)
+            os.replace(tmp_path, self.history_file)
+        except Exception as e:
+            logger.error(f"Error saving detection history: {e}")
+
+    def record_check(self, new_count, timestamp=None):
+        """
+        Record the outcome of a check that found new_count new videos. They were uploaded
+        somewhere between the previous check and this one; that bracket is what gets recorded.
+        """
+        now = timestamp if timestamp is not None else time.time()
+        self._refill(now)
+        self.credits -= 1
+        if new_count:
+            after = self.last_check if self.last_check is not None else now - self.default_interval
+            self.detections.append([after, now, new_count])
+            self.detections = self.detections[-self.HISTORY_SIZE:]
+            self.save_history()
+        self.last_check = now
+
+    def _uploads(self):
+        """(bracket midpoint, upload number) of every detection, counting missed uploads"""
+        uploads = []
+        number = 0
+        for after, at, count in self.detections:
+            number += count
+            uploads.append(((after + at) / 2, number))
+        return uploads
+
+    def cadence(self):
+        """Return the typical gap between uploads, or None without enough history"""
+        if len(self.detections) <= self.MIN_GAPS:
+            return None
+        uploads = self._uploads()
+        # Least-squares slope of upload time over upload number: each midpoint is off by up
+        # to half its bracket, which averages out over the history
+        mean_time = sum(t for t, _ in uploads) / len(uploads)
+        mean_number = sum(n for _, n in uploads) / len(uploads)
+        variance = sum((n - mean_number) ** 2 for _, n in uploads)
+        if not variance:
+            return None
+        return sum((t - mean_time) * (n - mean_number) for t, n in uploads) / variance
+
+    def predicted_window(self):
+        """Return (start, end) timestamps of the next expected upload, or None"""
+        gap = self.cadence()
+        if gap is None:
+            return None
+        uploads = self._uploads()
+        upcoming = uploads[-1][1] + 1
+
+        # Project the last few brackets forward and intersect them: checks land at different
+        # points of each cycle, so together they pin down when a regular site uploads
+        starts, ends = [], []
+        for (after, at, _), (_, number) in zip(self.detections[-self.PROJECTED:], uploads[-self.PROJECTED:]):
+            steps = upcoming - number
+            starts.append(after + steps * gap)
+            ends.append(at + steps * gap)
+        start, end = max(starts), min(ends)
+        if start > end:
+            # The brackets disagree by as much as the site's timing varies: the upload is
+            # expected somewhere in between
+            start, end = end, start
+        margin = self.min_interval / 2
+        return start - margin, end + margin
+
+    def next_interval(self, now=None):
+        """Seconds to sleep before the next check (jitter included)"""
+        now = now if now is not None else time.time()
+        window = self.predicted_window()
+        if window is None:
+            interval = self.default_interval
+        else:
+            start, end = window
+            if now < end:
+                # Spread the checks that can be afforded evenly over the window, the last one
+                # at its end. Without spare checks that is the only one.
+                self._refill(now)
+                affordable = max(1, int(self.credits + (end - now) * self.credit_rate))
+                spacing = max(1.0, (end - start) / affordable)
+                target = end - min(int((end - now) / spacing), affordable - 1) * spacing
+                interval = target - now
+            else:
+                # Overdue: each wait is as long as the upload is late, so polls thin out geometrically
+                interval = now - end
+
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        if self.jitter:
+            # Capped, so long sleeps still end close to the predicted window
+            interval += random.uniform(-1, 1) * min(self.jitter * interval, self.min_interval / 2)
+        # Never check faster than the credits allow, so the total stays within the budget
+        self._refill(now)
+        if self.credits < 1:
+            interval = max(interval, (1 - self.credits) / self.credit_rate)
+        return max(1, int(math.ceil(interval)))
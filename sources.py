@@ -0,0 +1,80 @@
+import re
+import json
+
+# Page structure of the original website, as (tag, class) selectors
+DEFAULT_SELECTORS = {
+    'container': ('ul', 'videos_ul'),
+    'item': ('li', 'video_block'),
+    'link': ('a', 'image'),
+    'video': (('div', 'col_video'), ('div', 'player-wrapper'), ('video', None)),
+}
+
+NAME_RE = re.compile(r'^[A-Za-z0-9_-]+$')  # Source names are used in file names
+
+
+def parse_selector(selector):
+    """Parse 'tag.class' (or just 'tag') into a (tag, class) selector"""
+    if not isinstance(selector, str) or not selector.strip():
+        raise ValueError(f"Invalid selector: {selector!r}")
+    tag, _, class_name = selector.strip().partition('.')
+    return tag, class_name or None
+
+
+def parse_selectors(config):
+    """Selectors of a source: the defaults, overridden by the 'selectors' entry of its config"""
+    selectors = dict(DEFAULT_SELECTORS)
+    for key, value in (config or {}).items():
+        if key not in DEFAULT_SELECTORS:
+            raise ValueError(f"Unknown selector {key!r} (expected one of {', '.join(DEFAULT_SELECTORS)})")
+        if key == 'video':
+            # The path to the video tag, outermost element first
+            if isinstance(value, str):
+                value = value.split()
+            selectors[key] = tuple(parse_selector(part) for part in value)
+        else:
+            selectors[key] = parse_selector(value)
+    return selectors
+
+
+def load_sources(path, defaults):
+    """
+    Load the source -> channel mappings from a JSON file: a list of objects with a unique
+    'name', 'website_url' and 'channel_id', and optionally 'check_interval',
+    'poll_min_interval', 'poll_max_interval', 'selectors', 'state_db' and 'poll_history'.
+
+    Missing settings are taken from defaults; each source gets its own state database and
+    poll history (named after the source unless given). Raises ValueError when the file
+    is invalid.
+    """
+    with open(path, 'r') as f:
+        entries = json.load(f)
+    if isinstance(entries, dict):
+        entries = entries.get('sources')
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must contain a non-empty list of sources")
+
+    sources = []
+    for index, entry in enumerate(entries):
+        name = entry.get('name') if isinstance(entry, dict) else None
+        if not name or not NAME_RE.match(str(name)):
+            raise ValueError(f"Source {index + 1} in {path} needs a name of letters, digits, '-' and '_'")
+        if any(source['name'] == name for source in sources):
+            raise ValueError(f"Duplicate source name {name!r} in {path}")
+        missing = [key for key in ('website_url', 'channel_id') if not entry.get(key)]
+        if missing:
+            raise ValueError(f"Source {name!r} in {path} is missing {', '.join(missing)}")
+
+        check_interval = int(entry.get('check_interval', defaults['check_interval']))
+        sources.append({
+            'name': name,
+            'website_url': entry['website_url'],
+            'channel_id': str(entry['channel_id']),
+            'check_interval': check_interval,
+            'poll_min_interval': int(entry.get('poll_min_interval', defaults['poll_min_interval'])),
+            'poll_max_interval': int(entry.get('poll_max_interval', 2 * check_interval)),
+            'selectors': parse_selectors(entry.get('selectors')),
+            'state_db': entry.get('state_db', f'bot_state_{name}.db'),
+            'poll_history': entry.get('poll_history', f'poll_history_{name}.json'),
+            'legacy_state': None,
+        })
+    return sources
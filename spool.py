@@ -0,0 +1,144 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+RECHECK_INTERVAL = 30  # Seconds between free space checks while a reservation waits
+
+
+class SpoolError(Exception):
+    """A file cannot be given space in the spool"""
+
+
+class Spool:
+    """
+    Directory for temporary video files, with a byte budget and a free space floor.
+
+    Before a file is written, reserve() waits until its size fits the budget (the bytes
+    reserved by other files) and leaves at least `min_free` bytes free on the disk. When
+    space is short, the reservation with the lowest priority (the video queued first)
+    goes ahead anyway, so videos that wait on each other to be published in order never
+    wait on each other for space too. Reservations last until release().
+    """
+
+    def __init__(self, directory='', budget=0, min_free=0):
+        self.directory = directory
+        self.budget = budget
+        self.min_free = min_free
+        self._reserved = {}  # Path -> (bytes, priority)
+        self._waiters = {}  # Token -> {'priority', 'future'}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def reserved(self):
+        """Bytes reserved over all files"""
+        return sum(size for size, _ in self._reserved.values())
+
+    def free_space(self):
+        return shutil.disk_usage(self.directory or '.').free
+
+    @staticmethod
+    def allocated(path):
+        """Bytes a file already occupies on disk (0 if it does not exist)"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return 0
+        blocks = getattr(stat, 'st_blocks', None)
+        return min(stat.st_size, blocks * 512) if blocks is not None else stat.st_size
+
+    def _fits(self, path, size):
+        """(fits the budget, fits the disk) for size bytes of path"""
+        others = sum(reserved for other, (reserved, _) in self._reserved.items() if other != path)
+        fits_budget = not self.budget or others + size <= self.budget
+        # A resumed file already occupies part of its size
+        needed = max(0, size - self.allocated(path))
+        return fits_budget, self.free_space() - needed >= self.min_free
+
+    def try_reserve(self, path, size, priority=None):
+        """Reserve size bytes for path if they fit right away; returns whether they did"""
+        if all(self._fits(path, size)):
+            self._reserved[path] = (size, time.monotonic() if priority is None else priority)
+            return True
+        return False
+
+    async def reserve(self, path, size, priority=None):
+        """
+        Wait until size bytes for path fit, then reserve them. Raises SpoolError when the
+        first queued file does not fit on the disk at all.
+        """
+        priority = time.monotonic() if priority is None else priority
+        token = object()
+        waiter = self._waiters[token] = {'priority': priority, 'future': None}
+        waited = None
+        try:
+            while True:
+                fits_budget, fits_disk = self._fits(path, size)
+                if fits_budget and fits_disk:
+                    break
+                first = all(
+                    priority <= other['priority'] for other in self._waiters.values()
+                ) and all(priority <= other for _, other in self._reserved.values())
+                if first:
+                    if not fits_disk:
+                        raise SpoolError(
+                            f"Not enough free space for {size / (1024 * 1024):.2f} MB in the spool "
+                            f"({self.free_space() / (1024 * 1024):.2f} MB free)"
+                        )
+                    logger.warning(f"Spool budget exceeded by {os.path.basename(path)}: it is first in line")
+                    break
+                if waited is None:
+                    waited = time.monotonic()
+                    logger.info(f"Waiting for spool space for {os.path.basename(path)} "
+                                f"({size / (1024 * 1024):.2f} MB, {self.reserved() / (1024 * 1024):.2f} MB reserved)")
+                waiter['future'] = asyncio.get_running_loop().create_future()
+                try:
+                    # Free space can also change outside the bot
+                    await asyncio.wait_for(waiter['future'], RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            self._reserved[path] = (size, priority)
+            if waited is not None:
+                logger.info(f"Got spool space after {time.monotonic() - waited:.1f}s")
+        finally:
+            del self._waiters[token]
+            # The first in line may have changed
+            self._wake()
+
+    def release(self, path):
+        """Give back the reservation of path (the file itself is left alone)"""
+        if self._reserved.pop(path, None) is not None:
+            self._wake()
+
+    def _wake(self):
+        for waiter in self._waiters.values():
+            if waiter['future'] is not None and not waiter['future'].done():
+                waiter['future'].set_result(None)
+
+    def scan(self, directory, keep, prefix='temp_video_'):
+        """
+        Remove leftover files named prefix* in directory for which keep(name) is false.
+        Returns (kept, removed) file names.
+        """
+        kept, removed = [], []
+        try:
+            names = sorted(os.listdir(directory or '.'))
+        except OSError as e:
+            logger.warning(f"Could not scan the spool directory: {e}")
+            return kept, removed
+        for name in names:
+            path = os.path.join(directory, name)
+            if not name.startswith(prefix) or not os.path.isfile(path):
+                continue
+            if keep(name):
+                kept.append(name)
+                continue
+            try:
+                os.remove(path)
+                removed.append(name)
+            except OSError as e:
+                logger.warning(f"Could not remove leftover file {path}: {e}")
+        return kept, removed
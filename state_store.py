@@ -0,0 +1,193 @@
+import time
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Video states, in pipeline order
+DISCOVERED = 'discovered'
+URL_RESOLVED = 'url_resolved'
+DOWNLOADING = 'downloading'
+DOWNLOADED = 'downloaded'
+UPLOADED = 'uploaded'
+FAILED = 'failed'
+BASELINE = 'baseline'  # Already on the website when tracking started; never processed
+ABANDONED = 'abandoned'  # Failed too many times; given up so newer videos are not held back
+
+# Videos in these states are never processed again
+SETTLED_STATES = (UPLOADED, BASELINE, ABANDONED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    page_url TEXT,
+    download_url TEXT,
+    path TEXT,
+    size INTEGER,
+    file_id TEXT,
+    message_id INTEGER,
+    fingerprint TEXT,
+    content_hash TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    discovered_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transitions (
+    video_id TEXT NOT NULL REFERENCES videos(id),
+    state TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transitions_video ON transitions(video_id);
+CREATE TABLE IF NOT EXISTS media (
+    key TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    size INTEGER,
+    video_id TEXT,
+    created_at REAL NOT NULL
+);
+"""
+
+# Columns added to the videos table after its first release: (name, type)
+ADDED_COLUMNS = (('fingerprint', 'TEXT'), ('content_hash', 'TEXT'))
+
+# Columns that can be set along with a state change
+FIELDS = ('page_url', 'download_url', 'path', 'size', 'file_id', 'message_id', 'fingerprint', 'content_hash', 'error')
+
+
+class StateStore:
+    """
+    Per-video pipeline state in an embedded SQLite database.
+
+    Each video has one row with its current state and what the pipeline learned about it
+    (download URL, temp file, size, Telegram file_id), plus a timestamped row per state
+    change. Every change is a single transaction in WAL mode, so a crash never leaves a
+    half-written state behind. Current states are also kept in memory for O(1) lookups.
+
+    The media table maps content keys (early fingerprint, content hash) of uploaded files
+    to their Telegram file_id, so the same video listed again is re-sent, not re-uploaded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self._states = {row['id']: row['state'] for row in self.conn.execute('SELECT id, state FROM videos')}
+
+    def _migrate(self):
+        """Add columns missing from a database created by an older version"""
+        existing = {row['name'] for row in self.conn.execute('PRAGMA table_info(videos)')}
+        with self.conn:
+            for name, column_type in ADDED_COLUMNS:
+                if name not in existing:
+                    self.conn.execute(f'ALTER TABLE videos ADD COLUMN {name} {column_type}')
+
+    def __contains__(self, video_id):
+        return video_id in self._states
+
+    def __len__(self):
+        return len(self._states)
+
+    def state(self, video_id):
+        """Current state of a video, or None if it was never seen"""
+        return self._states.get(video_id)
+
+    def is_settled(self, video_id):
+        """Whether a video needs no more processing (uploaded or part of the baseline)"""
+        return self._states.get(video_id) in SETTLED_STATES
+
+    def get(self, video_id):
+        """Return a video's row as a dict, or None"""
+        row = self.conn.execute('SELECT * FROM videos WHERE id = ?', (video_id,)).fetchone()
+        return dict(row) if row else None
+
+    def timeline(self, video_id):
+        """Return the (state, timestamp) changes of a video, oldest first"""
+        return [
+            (row['state'], row['at'])
+            for row in self.conn.execute(
+                'SELECT state, at FROM transitions WHERE video_id = ? ORDER BY rowid', (video_id,)
+            )
+        ]
+
+    def last_uploaded(self):
+        """ID of the most recently uploaded video, or None"""
+        row = self.conn.execute(
+            'SELECT id FROM videos WHERE state = ? ORDER BY updated_at DESC LIMIT 1', (UPLOADED,)
+        ).fetchone()
+        return row['id'] if row else None
+
+    def counts(self):
+        """Number of videos in each state"""
+        return dict(self.conn.execute('SELECT state, COUNT(*) FROM videos GROUP BY state').fetchall())
+
+    def discover(self, videos, state=DISCOVERED):
+        """Add videos ({'id', 'url'}) that were never seen before; known videos are left alone"""
+        now = time.time()
+        added = list({video['id']: video for video in videos if video['id'] not in self._states}.values())
+        if not added:
+            return 0
+        with self.conn:
+            for video in added:
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO videos (id, state, page_url, discovered_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                    (video['id'], state, video.get('url'), now, now)
+                )
+                self.conn.execute(
+                    'INSERT INTO transitions (video_id, state, at) VALUES (?, ?, ?)', (video['id'], state, now)
+                )
+        for video in added:
+            self._states[video['id']] = state
+        return len(added)
+
+    def transition(self, video_id, state, **fields):
+        """Move a video to a new state, updating the given columns in the same transaction"""
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown video fields: {', '.join(sorted(unknown))}")
+        now = time.time()
+        assignments = ['state = ?', 'updated_at = ?'] + [f'{name} = ?' for name in fields]
+        values = [state, now] + list(fields.values())
+        if state == FAILED:
+            assignments.append('attempts = attempts + 1')
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR IGNORE INTO videos (id, state, discovered_at, updated_at) VALUES (?, ?, ?, ?)',
+                (video_id, state, now, now)
+            )
+            self.conn.execute(f'UPDATE videos SET {", ".join(assignments)} WHERE id = ?', values + [video_id])
+            self.conn.execute('INSERT INTO transitions (video_id, state, at) VALUES (?, ?, ?)', (video_id, state, now))
+        self._states[video_id] = state
+
+    def find_media(self, *keys):
+        """Return the media row ({'key', 'file_id', 'size', 'video_id', ...}) of the first known key, or None"""
+        for key in keys:
+            if key:
+                row = self.conn.execute('SELECT * FROM media WHERE key = ?', (key,)).fetchone()
+                if row:
+                    return dict(row)
+        return None
+
+    def remember_media(self, keys, file_id, size=None, video_id=None):
+        """Map content keys of an uploaded file to its Telegram file_id"""
+        now = time.time()
+        with self.conn:
+            for key in keys:
+                if key:
+                    self.conn.execute(
+                        'INSERT OR REPLACE INTO media (key, file_id, size, video_id, created_at) VALUES (?, ?, ?, ?, ?)',
+                        (key, file_id, size, video_id, now)
+                    )
+
+    def forget_media(self, file_id):
+        """Drop every content key mapped to a file_id that Telegram no longer accepts"""
+        with self.conn:
+            self.conn.execute('DELETE FROM media WHERE file_id = ?', (file_id,))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,104 @@
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from cpu_pool import CpuPool, CpuTimeout
+
+# Module-level tasks, so process workers can run them
+release = threading.Event()
+
+
+def double(value):
+    return value * 2
+
+
+def sleep_for(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def hang_thread():
+    release.wait(30)
+
+
+def hang_process(pid_path):
+    with open(pid_path, 'w') as f:
+        f.write(str(os.getpid()))
+    time.sleep(1000)
+
+
+def crash():
+    os._exit(1)
+
+
+def live_children():
+    # active_children() also reaps workers that have exited
+    return {process.pid for process in multiprocessing.active_children()}
+
+
+def test_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        CpuPool(mode='fork')
+
+
+def test_thread_timeout_fails_only_that_task():
+    async def main():
+        pool = CpuPool(workers=2, timeout=0.3)
+        try:
+            results = await asyncio.gather(
+                pool.run(hang_thread), pool.run(sleep_for, 0.6, timeout=5), return_exceptions=True
+            )
+            assert isinstance(results[0], CpuTimeout)
+            assert results[1] == os.getpid()
+            # New tasks go to a new pool
+            assert await pool.run(double, 21) == 42
+        finally:
+            release.set()
+            pool.close()
+
+    asyncio.run(main())
+
+
+def test_process_timeout_kills_hung_worker_after_the_others_finish(tmp_path):
+    pid_path = str(tmp_path / 'hung.pid')
+
+    async def main():
+        pool = CpuPool(workers=2, mode='process', timeout=1.0)
+        try:
+            # Start the workers first, so process startup does not count against the timeout
+            assert await pool.run(double, 1, timeout=30) == 2
+            results = await asyncio.gather(
+                pool.run(hang_process, pid_path), pool.run(sleep_for, 2.0, timeout=30), return_exceptions=True
+            )
+            assert isinstance(results[0], CpuTimeout)
+            # The task running beside the hung one was not cancelled or killed
+            assert isinstance(results[1], int)
+
+            hung_pid = int(open(pid_path).read())
+            deadline = time.monotonic() + 10
+            while hung_pid in live_children() and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            assert hung_pid not in live_children()
+            assert await pool.run(double, 21, timeout=30) == 42
+        finally:
+            pool.close()
+
+    asyncio.run(main())
+
+
+def test_process_crash_raises_and_pool_recovers():
+    async def main():
+        pool = CpuPool(workers=1, mode='process', timeout=30)
+        try:
+            with pytest.raises(BrokenProcessPool):
+                await pool.run(crash)
+            assert await pool.run(double, 4) == 8
+        finally:
+            pool.close()
+
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import mp4_probe
+import mp4_faststart
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from fake_services import generate_mp4  # noqa: E402
+
+
+def make_mp4(tmp_path, moov_at_end=True):
+    path = str(tmp_path / 'video.mp4')
+    generate_mp4(path, 2 * 1024 * 1024, duration=40, width=640, height=360, moov_at_end=moov_at_end)
+    return path
+
+
+def read_samples(path):
+    """Chunk offset box type and the bytes of every video sample, located through the sample tables"""
+    metadata = mp4_probe.probe_file(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    track = mp4_probe.video_track(mp4_probe.parse_moov(data, metadata['moov_offset'], metadata['moov_size']))
+    tables = mp4_probe._sample_tables(data, track)
+    boxes = {box[0] for box in mp4_faststart._chunk_offset_tables(
+        data, metadata['moov_offset'], metadata['moov_size'], 8
+    )}
+    samples = []
+    for sample in range(1, tables['sample_count'] + 1):
+        offset, size = mp4_probe._sample_location(tables, sample)
+        samples.append(data[offset:offset + size])
+    return boxes, samples
+
+
+def test_faststart_moves_moov_and_keeps_samples(tmp_path):
+    src = make_mp4(tmp_path)
+    dst = str(tmp_path / 'faststart.mp4')
+    assert not mp4_probe.probe_file(src)['faststart']
+
+    assert mp4_faststart.faststart(src, dst)
+    metadata = mp4_probe.probe_file(dst)
+    assert metadata['faststart'] and metadata['moov_offset'] < metadata['mdat_offset']
+    assert (metadata['duration'], metadata['width'], metadata['height']) == (40, 640, 360)
+    assert os.path.getsize(dst) == os.path.getsize(src)
+
+    boxes, samples = read_samples(src)
+    new_boxes, new_samples = read_samples(dst)
+    assert boxes == new_boxes == {b'stco'}
+    assert new_samples == samples
+
+
+def test_faststart_widens_offsets_that_overflow(tmp_path, monkeypatch):
+    src = make_mp4(tmp_path)
+    dst = str(tmp_path / 'faststart.mp4')
+    # Pretend the moved offsets no longer fit in 32 bits, as in a file over 4 GB
+    monkeypatch.setattr(mp4_faststart, 'MAX_STCO_OFFSET', 1024 * 1024)
+
+    assert mp4_faststart.faststart(src, dst)
+    boxes, samples = read_samples(src)
+    new_boxes, new_samples = read_samples(dst)
+    assert new_boxes == {b'co64'}
+    # co64 entries are 8 bytes instead of 4: moov grew by 4 bytes per chunk
+    chunks = len(samples) // 25
+    assert os.path.getsize(dst) == os.path.getsize(src) + 4 * chunks
+    assert new_samples == samples
+
+
+def test_faststart_leaves_faststart_and_truncated_files(tmp_path):
+    dst = str(tmp_path / 'faststart.mp4')
+    assert not mp4_faststart.faststart(make_mp4(tmp_path, moov_at_end=False), dst)
+
+    src = make_mp4(tmp_path)
+    with open(src, 'r+b') as f:
+        f.truncate(os.path.getsize(src) - 100)
+    assert not mp4_faststart.faststart(src, dst)
+    assert not os.path.exists(dst)
@@ -0,0 +1,80 @@
+import os
+import sys
+import struct
+
+import mp4_probe
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from fake_services import generate_mp4  # noqa: E402
+
+SIZE = 3 * 1024 * 1024
+DURATION = 60  # Seconds; keyframes every 2 s at 25 fps
+
+
+def make_mp4(tmp_path, moov_at_end):
+    path = str(tmp_path / f"video_{'end' if moov_at_end else 'front'}.mp4")
+    generate_mp4(path, SIZE, duration=DURATION, width=640, height=360, moov_at_end=moov_at_end)
+    return path
+
+
+def media_bytes(path):
+    """Bytes of all samples: the payload of the (64-bit sized) mdat box"""
+    with open(path, 'rb') as f:
+        layout = mp4_probe.locate_moov(f.read())
+        f.seek(layout['mdat_offset'])
+        _, _, size = struct.unpack('>I4sQ', f.read(16))
+    return size - 16
+
+
+def test_probe_file(tmp_path):
+    for moov_at_end in (False, True):
+        metadata = mp4_probe.probe_file(make_mp4(tmp_path, moov_at_end))
+        assert (metadata['duration'], metadata['width'], metadata['height']) == (DURATION, 640, 360)
+        assert metadata['faststart'] is not moov_at_end
+
+
+def test_probe_bytes_head_with_moov(tmp_path):
+    with open(make_mp4(tmp_path, moov_at_end=False), 'rb') as f:
+        head = f.read(256 * 1024)
+    metadata, layout = mp4_probe.probe_bytes(head)
+    assert (metadata['duration'], metadata['width'], metadata['height']) == (DURATION, 640, 360)
+    assert metadata['faststart']
+    assert layout['moov_offset'] < layout['mdat_offset']
+
+
+def test_probe_bytes_moov_at_end_needs_tail(tmp_path):
+    path = make_mp4(tmp_path, moov_at_end=True)
+    with open(path, 'rb') as f:
+        head = f.read(256 * 1024)
+        metadata, layout = mp4_probe.probe_bytes(head)
+        assert metadata is None
+        # The walk leaves the head at the end of mdat, where moov starts
+        assert layout['moov_offset'] is None and layout['next_offset'] > len(head)
+        f.seek(layout['next_offset'])
+        tail = f.read()
+
+    metadata, layout = mp4_probe.probe_bytes(head, tail, layout['next_offset'])
+    assert (metadata['duration'], metadata['width'], metadata['height']) == (DURATION, 640, 360)
+    assert not metadata['faststart']
+    assert layout['moov_offset'] + layout['moov_size'] == os.path.getsize(path)
+
+
+def test_probe_rejects_non_mp4(tmp_path):
+    path = tmp_path / 'not_a_video.mp4'
+    path.write_bytes(b'<html>Not found</html>' * 100)
+    assert mp4_probe.probe_file(str(path)) is None
+    assert mp4_probe.probe_bytes(path.read_bytes())[0] is None
+
+
+def test_plan_split_cuts_at_keyframes_within_limit(tmp_path):
+    path = make_mp4(tmp_path, moov_at_end=False)
+    # Media bytes are spread evenly over 30 keyframe intervals: 10 intervals fit a part
+    limit = media_bytes(path) // 3 + 16 * 1024
+    assert mp4_probe.plan_split(path, limit) == [(0.0, 20.0), (20.0, 40.0), (40.0, None)]
+
+
+def test_plan_split_single_part_and_impossible_limit(tmp_path):
+    path = make_mp4(tmp_path, moov_at_end=True)
+    assert mp4_probe.plan_split(path, os.path.getsize(path)) == [(0.0, None)]
+    # Less than one keyframe interval per part cannot be cut at keyframes
+    assert mp4_probe.plan_split(path, media_bytes(path) // 60) is None
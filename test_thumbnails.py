@@ -0,0 +1,51 @@
+import os
+import sys
+
+import cv2
+
+import thumbnails
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from fake_services import generate_mp4  # noqa: E402
+
+
+def make_mp4(tmp_path, moov_at_end=False):
+    path = str(tmp_path / 'video.mp4')
+    # Keyframes every 2 s hold a real H.264 picture; the other samples are noise
+    generate_mp4(path, 3 * 1024 * 1024, duration=60, width=640, height=360, moov_at_end=moov_at_end)
+    return path
+
+
+def test_keyframe_nearest_to_time(tmp_path):
+    keyframe = thumbnails.find_thumbnail_keyframe(make_mp4(tmp_path), 10)
+    assert keyframe['time'] == 10.0
+    assert keyframe['codec'] == 'h264' and keyframe['parameter_sets']
+
+
+def test_keyframe_of_partial_download_is_on_disk(tmp_path):
+    path = make_mp4(tmp_path)
+    with open(path, 'rb') as f:
+        head = f.read(os.path.getsize(path) // 10)
+    partial = str(tmp_path / 'partial.mp4')
+    with open(partial, 'wb') as f:
+        f.write(head)
+
+    keyframe = thumbnails.find_thumbnail_keyframe(partial, 10)
+    assert 0 < keyframe['time'] < 10
+    assert keyframe['offset'] + keyframe['size'] <= len(head)
+
+
+def test_thumbnail_from_keyframe(tmp_path):
+    for moov_at_end in (False, True):
+        thumbnail = thumbnails.extract_thumbnail(make_mp4(tmp_path, moov_at_end), str(tmp_path / 'thumb.jpg'), width=320)
+        assert thumbnail == str(tmp_path / 'thumb.jpg')
+        # Scaled to the requested width, keeping the aspect ratio
+        assert cv2.imread(thumbnail).shape == (180, 320, 3)
+        # The temporary elementary stream is cleaned up
+        assert sorted(os.listdir(tmp_path)) == ['thumb.jpg', 'video.mp4']
+
+
+def test_thumbnail_of_unreadable_file(tmp_path):
+    path = tmp_path / 'broken.mp4'
+    path.write_bytes(b'\0' * 4096)
+    assert thumbnails.extract_thumbnail(str(path), str(tmp_path / 'thumb.jpg')) is None
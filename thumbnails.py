@@ -0,0 +1,109 @@
+import os
+import logging
+
+import cv2
+
+import mp4_probe
+
+logger = logging.getLogger(__name__)
+
+# Module-level functions, so they can run in a worker process (see CpuPool)
+
+
+def find_thumbnail_keyframe(video_path, at_time):
+    """
+    Find the keyframe nearest to at_time seconds in the MP4 sample tables.
+    Works on a truncated file too (e.g. the head of a stream): only keyframes
+    whose bytes are in the file are considered.
+    """
+    try:
+        metadata = mp4_probe.probe_file(video_path)
+        if not metadata:
+            return None
+        return mp4_probe.find_thumbnail_keyframe(
+            video_path, metadata['moov_offset'], metadata['moov_size'], at_time,
+            limit_offset=os.path.getsize(video_path)
+        )
+    except Exception as e:
+        logger.warning(f"Could not locate a keyframe for the thumbnail: {e}")
+        return None
+
+
+def decode_keyframe(video_path, keyframe):
+    """
+    Decode a single keyframe on its own: its bytes are wrapped into a tiny elementary
+    stream with the codec parameter sets, so no other frame is read or decoded.
+    """
+    with open(video_path, 'rb') as f:
+        f.seek(keyframe['offset'])
+        sample = f.read(keyframe['size'])
+
+    stream_path = video_path.replace('.mp4', f"_keyframe.{keyframe['codec']}")
+    try:
+        with open(stream_path, 'wb') as f:
+            f.write(mp4_probe.keyframe_bitstream(keyframe, sample))
+        cap = cv2.VideoCapture(stream_path)
+        success, frame = cap.read() if cap.isOpened() else (False, None)
+        cap.release()
+        return frame if success else None
+    finally:
+        if os.path.exists(stream_path):
+            os.remove(stream_path)
+
+
+def extract_thumbnail(video_path, thumbnail_path, keyframe=None, at_time=10, width=320):
+    """
+    Generate a thumbnail from the video using OpenCV; returns its path or None.
+
+    The keyframe nearest to at_time is decoded on its own, so only its bytes need to
+    be on disk. For codecs other than H.264/HEVC OpenCV seeks in the file.
+    """
+    try:
+        logger.info("Generating video thumbnail with OpenCV...")
+
+        if keyframe is None:
+            keyframe = find_thumbnail_keyframe(video_path, at_time)
+
+        frame = None
+        if keyframe and keyframe['parameter_sets']:
+            frame = decode_keyframe(video_path, keyframe)
+
+        if frame is None:
+            # Open video file
+            cap = cv2.VideoCapture(video_path)
+
+            if not cap.isOpened():
+                logger.warning("Could not open video file for thumbnail generation")
+                return None
+
+            # Set position to the keyframe (or at_time) into the video
+            cap.set(cv2.CAP_PROP_POS_MSEC, (keyframe['time'] if keyframe else at_time) * 1000)
+
+            # Read frame
+            success, frame = cap.read()
+
+            if not success:
+                # If seeking fails, try first frame
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                success, frame = cap.read()
+
+            cap.release()
+
+            if not success:
+                logger.warning("Could not extract frame from video")
+                return None
+
+        # Resize to thumbnail size and encode the JPEG in one step
+        height, frame_width = frame.shape[:2]
+        new_height = int((width / frame_width) * height)
+        resized = cv2.resize(frame, (width, new_height), interpolation=cv2.INTER_AREA)
+        if not cv2.imwrite(thumbnail_path, resized, [cv2.IMWRITE_JPEG_QUALITY, 85]):
+            logger.warning("Could not encode thumbnail")
+            return None
+
+        logger.info(f"Thumbnail generated: {thumbnail_path}")
+        return thumbnail_path
+
+    except Exception as e:
+        logger.warning(f"Error generating thumbnail: {e}")
+        return None
@@ -0,0 +1,88 @@
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UrlResolver:
+    """
+    Resolves video pages to download URLs ahead of the downloads.
+
+    prefetch() starts resolving every pending video at once, at most `concurrency` page
+    fetches at a time, so a download never waits for its page. Resolved URLs are cached
+    for `ttl` seconds, because signed CDN URLs expire; invalidate() drops one early,
+    e.g. when the CDN rejects it. `resolve` is a coroutine function taking a page URL
+    and returning the download URL, or None.
+    """
+
+    def __init__(self, resolve, ttl=900, concurrency=4):
+        self.resolve = resolve
+        self.ttl = ttl
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._cache = {}  # Video ID -> (download URL, resolved at)
+        self._pending = {}  # Video ID -> task resolving it
+
+    def seed(self, video_id, url, resolved_at):
+        """Add a URL resolved earlier (e.g. by a previous run) if it is still fresh"""
+        if url and time.time() - resolved_at < self.ttl:
+            self._cache[video_id] = (url, resolved_at)
+
+    def cached(self, video_id):
+        """The fresh cached download URL of a video, or None"""
+        entry = self._cache.get(video_id)
+        if entry is None:
+            return None
+        if time.time() - entry[1] >= self.ttl:
+            del self._cache[video_id]
+            return None
+        return entry[0]
+
+    def invalidate(self, video_id):
+        self._cache.pop(video_id, None)
+
+    def prefetch(self, videos):
+        """Start resolving videos ({'id', 'url'}) that have no fresh URL yet"""
+        started = 0
+        for video in videos:
+            if video.get('url') and not self.cached(video['id']) and video['id'] not in self._pending:
+                self._start(video['id'], video['url'])
+                started += 1
+        if started:
+            logger.info(f"Resolving {started} download URL(s) ahead of the downloads")
+
+    def _start(self, video_id, page_url):
+        task = asyncio.create_task(self._resolve(video_id, page_url))
+        self._pending[video_id] = task
+        task.add_done_callback(lambda _: self._forget(video_id, task))
+        return task
+
+    def _forget(self, video_id, task):
+        if self._pending.get(video_id) is task:
+            del self._pending[video_id]
+
+    async def _resolve(self, video_id, page_url):
+        async with self._slots:
+            url = await self.resolve(page_url)
+        if url:
+            self._cache[video_id] = (url, time.time())
+        return url
+
+    async def get(self, video_id, page_url):
+        """The download URL of a video: cached, being prefetched, or resolved now. None on failure."""
+        url = self.cached(video_id)
+        if url:
+            return url
+        task = self._pending.get(video_id) or self._start(video_id, page_url)
+        # Another caller may be waiting for the same task
+        return await asyncio.shield(task)
+
+    async def refresh(self, video_id, page_url):
+        """Resolve a video's download URL again, replacing the cached one"""
+        self.invalidate(video_id)
+        return await self.get(video_id, page_url)
+
+    def cancel(self):
+        """Stop prefetches that are still running"""
+        for task in list(self._pending.values()):
+            task.cancel()
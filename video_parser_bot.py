@@ -1,17 +1,44 @@
 import os
+import re
+import sys
+import math
 import time
 import json
+import shutil
 import asyncio
-import requests
-from bs4 import BeautifulSoup
-from telegram import Bot
-from telegram.error import TelegramError
+import argparse
+import posixpath
+from functools import cached_property
 from dotenv import load_dotenv
+from http_client import HttpClient
+from downloader import (
+    SegmentedDownloader, DownloadProgress, DownloadError, IncompleteDownload, BlockHasher, IDENTITY_ENCODING,
+    content_hash, hash_file
+)
+from page_parser import ListingParser, VideoSourceParser, describe
+from scheduler import PollScheduler
+from state_store import StateStore
+from metrics import Metrics, MetricsServer
+from sources import DEFAULT_SELECTORS, load_sources
+from spool import Spool
+from cpu_pool import CpuPool
+from url_resolver import UrlResolver
+from retry import Retrier, RetryPolicy
+from ratelimit import BandwidthLimiter, parse_schedule
+from lazy_import import lazy_import
+from contextlib import asynccontextmanager
+import state_store
+import mp4_probe
+import mp4_faststart
 import logging
-import cv2
-from PIL import Image
 import io
 
+# Loaded on first use: a check that finds no new video never needs them
+telegram = lazy_import('telegram')
+bot_api_upload = lazy_import('bot_api_upload')
+notifications = lazy_import('notifier')
+thumbnails = lazy_import('thumbnails')
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -29,8 +56,65 @@ TELEGRAM_CHANNEL_ID = os.getenv('TELEGRAM_CHANNEL_ID')
 ADMIN_ID = os.getenv('ADMIN_ID')  # Admin chat ID for status messages
 LOCAL_BOT_API_SERVER = os.getenv('LOCAL_BOT_API_SERVER')  # Local Bot API server URL (optional)
 CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', 7200))  # Default: 2 hours in seconds
-LAST_VIDEO_ID_FILE = 'last_video_id.json'
+POLL_MIN_INTERVAL = int(os.getenv('POLL_MIN_INTERVAL', 300))  # Shortest wait between checks while an upload is due
+POLL_MAX_INTERVAL = int(os.getenv('POLL_MAX_INTERVAL', 2 * CHECK_INTERVAL))  # Longest wait between checks
+POLL_JITTER = float(os.getenv('POLL_JITTER', 0.1))  # Random +/- fraction added to every wait
+POLL_BUDGET = float(os.getenv('POLL_BUDGET', 1.0))  # Allowed checks relative to fixed CHECK_INTERVAL polling
+POLL_HISTORY_FILE = 'poll_history.json'
+LISTING_CACHE_TTL = int(os.getenv('LISTING_CACHE_TTL', 30))  # Seconds a fetched main page is reused without a request
+MAX_CONCURRENT_JOBS = max(1, int(os.getenv('MAX_CONCURRENT_JOBS', 2)))  # Videos in flight during backlog catch-up
+MAX_VIDEO_ATTEMPTS = max(1, int(os.getenv('MAX_VIDEO_ATTEMPTS', 5)))  # Failed checks after which a video is abandoned
+MAX_CONCURRENT_DOWNLOADS = max(1, int(os.getenv('MAX_CONCURRENT_DOWNLOADS', 4)))  # Videos downloading at once, over all sources
+RESOLVE_CONCURRENCY = max(1, int(os.getenv('RESOLVE_CONCURRENCY', 4)))  # Video pages fetched at once to resolve download URLs
+DOWNLOAD_URL_TTL = int(os.getenv('DOWNLOAD_URL_TTL', 900))  # Seconds a resolved download URL is used before resolving it again
+RETRY_ATTEMPTS = max(1, int(os.getenv('RETRY_ATTEMPTS', 4)))  # Tries per fetch, resolve, download or upload within one check
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 2))  # Seconds before the first retry; doubled for each further one
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 60))  # Longest backoff between two tries
+MAX_FLOOD_WAIT = float(os.getenv('MAX_FLOOD_WAIT', 600))  # Longest rate limit wait (Telegram RetryAfter) sat out within a check
+CIRCUIT_FAILURES = max(1, int(os.getenv('CIRCUIT_FAILURES', 5)))  # Transient failures in a row that suspend calls to a host
+CIRCUIT_RESET = float(os.getenv('CIRCUIT_RESET', 60))  # Seconds calls to a failing host stay suspended
+DOWNLOAD_LIMIT_KBPS = int(os.getenv('DOWNLOAD_LIMIT_KBPS', 0))  # Video download bandwidth over all transfers in KB/s (0: unlimited)
+UPLOAD_LIMIT_KBPS = int(os.getenv('UPLOAD_LIMIT_KBPS', 0))  # Video upload bandwidth over all transfers in KB/s (0: unlimited)
+BANDWIDTH_SCHEDULE = os.getenv('BANDWIDTH_SCHEDULE', '')  # Limits by time of day, e.g. "08:00-20:00=2048/512" (KB/s down/up)
+SOURCES_FILE = os.getenv('SOURCES_FILE')  # JSON file of source -> channel mappings, all monitored in one process (optional)
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 30))  # Seconds to establish a connection
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 60))  # Seconds to wait for data on an open connection
+DOWNLOAD_CONNECTIONS = int(os.getenv('DOWNLOAD_CONNECTIONS', 4))  # Parallel range requests per video
+# Default: room for the range requests of every job in flight, so parallel downloads from one CDN do not queue
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv('HTTP_MAX_CONNECTIONS_PER_HOST', DOWNLOAD_CONNECTIONS * MAX_CONCURRENT_JOBS))
+# Size of the shared keep-alive pool, at least the per-host limit
+HTTP_MAX_CONNECTIONS = max(int(os.getenv('HTTP_MAX_CONNECTIONS', 20)), HTTP_MAX_CONNECTIONS_PER_HOST)
+DOWNLOAD_SEGMENT_SIZE_MB = int(os.getenv('DOWNLOAD_SEGMENT_SIZE_MB', 16))  # Size of each byte range
+DOWNLOAD_CHUNK_SIZE_KB = int(os.getenv('DOWNLOAD_CHUNK_SIZE_KB', 1024))  # Read size within a range
+UPLOAD_CHUNK_SIZE_KB = int(os.getenv('UPLOAD_CHUNK_SIZE_KB', 1024))  # Read size when streaming a file into an upload
+UPLOAD_PROGRESS_INTERVAL = float(os.getenv('UPLOAD_PROGRESS_INTERVAL', 10))  # Seconds between upload progress logs
+STREAM_UPLOAD = os.getenv('STREAM_UPLOAD', 'false').lower() in ('1', 'true', 'yes')  # Pipe downloads straight into the upload
+STREAM_HEAD_MB = int(os.getenv('STREAM_HEAD_MB', 16))  # Bytes buffered from the stream head for metadata/thumbnail
+STREAM_BUFFER_MB = int(os.getenv('STREAM_BUFFER_MB', 32))  # Max bytes buffered between download and upload
+DEDUP_SAMPLE_MB = int(os.getenv('DEDUP_SAMPLE_MB', 1))  # Head/tail bytes fingerprinted to spot re-listed videos (0: off)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')  # Interface the /metrics endpoint listens on
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))  # Port of the /metrics endpoint (0: off)
+METRICS_FILE = os.getenv('METRICS_FILE', '')  # Every metrics event as a JSON line (empty: off)
+ADMIN_STATUS_INTERVAL = float(os.getenv('ADMIN_STATUS_INTERVAL', 5))  # Min seconds between edits of a video's status message
+THUMBNAIL_TIME = 10  # Seconds into the video to take the thumbnail from
+THUMBNAIL_WIDTH = 320
+LAST_VIDEO_ID_FILE = 'last_video_id.json'  # Legacy state, imported into the state database once
+STATE_DB_FILE = os.getenv('STATE_DB_FILE', 'bot_state.db')  # Per-video pipeline state (SQLite)
+LOCAL_FILES_DIR = os.getenv('LOCAL_FILES_DIR')  # Directory shared with a --local Bot API server (optional)
+LOCAL_FILES_SERVER_DIR = os.getenv('LOCAL_FILES_SERVER_DIR', LOCAL_FILES_DIR)  # The same directory as the server sees it
+LOCAL_FILES_MODE = bool(LOCAL_BOT_API_SERVER and LOCAL_FILES_DIR)  # Upload by file path instead of over HTTP
+CPU_WORKERS = max(1, int(os.getenv('CPU_WORKERS', min(4, os.cpu_count() or 1))))  # Workers for MP4 parsing and thumbnails
+CPU_POOL_MODE = os.getenv('CPU_POOL_MODE', 'thread')  # 'thread', or 'process' so a hung decoder can be killed
+CPU_TASK_TIMEOUT = float(os.getenv('CPU_TASK_TIMEOUT', 60))  # Seconds a parsing or thumbnail step may take
+SPOOL_DIR = os.getenv('SPOOL_DIR', '')  # Directory for temp videos and thumbnails (LOCAL_FILES_DIR in local files mode)
+SPOOL_BUDGET_MB = int(os.getenv('SPOOL_BUDGET_MB', 0))  # Max size of the videos being processed at once (0: no limit)
+SPOOL_MIN_FREE_MB = int(os.getenv('SPOOL_MIN_FREE_MB', 100))  # Free disk space downloads never eat into
+TEMP_VIDEO_RE = re.compile(r'^temp_video_(.+)\.mp4(\.parts\.json)?$')  # Download files left by an earlier run
 MAX_VIDEO_SIZE_MB = 2000 if LOCAL_BOT_API_SERVER else 50  # 2GB with local server, 50MB with default
+SPLIT_HEADROOM = (0.95, 0.85)  # Planned part size relative to the limit; retried smaller if a part comes out too big
+SPLIT_STAGING_CHAT_ID = os.getenv('SPLIT_STAGING_CHAT_ID', '')  # Chat where parts upload concurrently before posting (empty: off)
+SPLIT_UPLOAD_CONNECTIONS = max(1, int(os.getenv('SPLIT_UPLOAD_CONNECTIONS', 4)))  # Parts uploaded at the same time
+MEDIA_GROUP_SIZE = 10  # Telegram's maximum number of videos in one album
 
 # Browser headers to bypass 403 Forbidden errors
 HEADERS = {
@@ -39,309 +123,636 @@ HEADERS = {
     'Accept-Language': 'en-US,en;q=0.9',
     'Accept-Encoding': 'gzip, deflate',
     'Connection': 'keep-alive',
-    'Upgrade-Insecure-Requests': '1',
-    'Referer': WEBSITE_URL if WEBSITE_URL else ''
+    'Upgrade-Insecure-Requests': '1'
 }
 
-class VideoParserBot:
+def retry_policies():
+    """RetryPolicy of each kind of network operation"""
+    backoff = dict(
+        attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY, max_flood_wait=MAX_FLOOD_WAIT
+    )
+    return {
+        'fetch': RetryPolicy(**backoff),
+        'resolve': RetryPolicy(**backoff),
+        # A segment cut short is fetched again; finished segments are kept. Other download
+        # errors (an empty file, a compressed body, a wrong size) would only repeat.
+        'download': RetryPolicy(retry_on=(IncompleteDownload,), **backoff),
+        # A post must not go out twice: a timeout after the file was sent is not retried
+        'upload': RetryPolicy(idempotent=False, **backoff),
+        # Admin messages only wait out flood control and brief outages
+        'notification': RetryPolicy(attempts=3, base_delay=2.0, max_delay=10.0, max_flood_wait=None),
+    }
+
+
+def default_source():
+    """The single source configured by WEBSITE_URL and TELEGRAM_CHANNEL_ID"""
+    return {
+        'name': 'default',
+        'website_url': WEBSITE_URL,
+        'channel_id': TELEGRAM_CHANNEL_ID,
+        'check_interval': CHECK_INTERVAL,
+        'poll_min_interval': POLL_MIN_INTERVAL,
+        'poll_max_interval': POLL_MAX_INTERVAL,
+        'selectors': DEFAULT_SELECTORS,
+        'state_db': STATE_DB_FILE,
+        'poll_history': POLL_HISTORY_FILE,
+        'legacy_state': LAST_VIDEO_ID_FILE,
+    }
+
+
+class SharedServices:
+    """
+    Everything the monitored sources share in one process: the Bot API client and
+    uploader, the HTTP connection pool, admin notifications, metrics, the spool for temp
+    files, the CPU pool, and the global limit on concurrent downloads
+    (MAX_CONCURRENT_DOWNLOADS).
+
+    The Telegram side (bot, uploader, notifier) is created on first use, so a check
+    that finds nothing new never loads python-telegram-bot.
+    """
+
     def __init__(self):
-        # Initialize bot with local server if configured
         if LOCAL_BOT_API_SERVER:
-            # Format: http://localhost:8081/bot{token} is constructed by the library
-            # We just provide the base URL without /bot path
-            base_url = LOCAL_BOT_API_SERVER.rstrip('/')
-            self.bot = Bot(token=TELEGRAM_BOT_TOKEN, base_url=f"{base_url}/bot")
-            logger.info(f"Using local Bot API server: {base_url}")
+            logger.info(f"Using local Bot API server: {LOCAL_BOT_API_SERVER.rstrip('/')}")
             logger.info(f"Max file size: {MAX_VIDEO_SIZE_MB} MB (2 GB limit)")
+            if LOCAL_FILES_MODE:
+                logger.info(f"Uploading by file path from {LOCAL_FILES_DIR} (server: {LOCAL_FILES_SERVER_DIR})")
         else:
-            self.bot = Bot(token=TELEGRAM_BOT_TOKEN)
             logger.info("Using default Telegram Bot API servers")
             logger.info(f"Max file size: {MAX_VIDEO_SIZE_MB} MB")
 
-        self.website_url = WEBSITE_URL
-        self.channel_id = TELEGRAM_CHANNEL_ID
+        self.metrics = Metrics(METRICS_FILE or None)
+        self.metrics_server = MetricsServer(self.metrics, METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+        self.download_slots = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        # Token buckets pacing video bytes inside the transfer loops, one per direction
+        schedule = parse_schedule(BANDWIDTH_SCHEDULE)
+        self.download_bandwidth = BandwidthLimiter(
+            'download', DOWNLOAD_LIMIT_KBPS * 1024, [(start, end, down) for start, end, down, _ in schedule], self.metrics
+        )
+        self.upload_bandwidth = BandwidthLimiter(
+            'upload', UPLOAD_LIMIT_KBPS * 1024, [(start, end, up) for start, end, _, up in schedule], self.metrics
+        )
+        # Retries with backoff, and one circuit breaker per host, for every network call
+        self.retry = Retrier(retry_policies(), CIRCUIT_FAILURES, CIRCUIT_RESET, self.metrics)
+        # Reused workers for CPU-heavy steps, so they never block the event loop
+        self.cpu = CpuPool(CPU_WORKERS, CPU_POOL_MODE, CPU_TASK_TIMEOUT)
+        # Temp files go where a local-mode server can read them
+        self.spool = Spool(
+            LOCAL_FILES_DIR if LOCAL_FILES_MODE else SPOOL_DIR,
+            budget=SPOOL_BUDGET_MB * 1024 * 1024,
+            min_free=SPOOL_MIN_FREE_MB * 1024 * 1024
+        )
+
+        # One keep-alive connection pool shared by scraping and downloading
+        self.http = HttpClient(
+            headers=HEADERS,
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT,
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_connections_per_host=HTTP_MAX_CONNECTIONS_PER_HOST
+        )
+
+    @cached_property
+    def bot(self):
+        # Initialize bot with local server if configured
+        if LOCAL_BOT_API_SERVER:
+            # Format: http://localhost:8081/bot{token} is constructed by the library
+            # We just provide the base URL without /bot path
+            base_url = LOCAL_BOT_API_SERVER.rstrip('/')
+            return telegram.Bot(token=TELEGRAM_BOT_TOKEN, base_url=f"{base_url}/bot", local_mode=LOCAL_FILES_MODE)
+        return telegram.Bot(token=TELEGRAM_BOT_TOKEN)
+
+    @cached_property
+    def notifier(self):
+        # Own circuit breakers: when uploads trip the Bot API circuit, the alerts about it still go out
+        retrier = Retrier(retry_policies(), CIRCUIT_FAILURES, CIRCUIT_RESET, self.metrics)
+        return notifications.AdminNotifier(self.bot, ADMIN_ID, edit_interval=ADMIN_STATUS_INTERVAL, retrier=retrier)
+
+    @cached_property
+    def uploader(self):
+        return bot_api_upload.BotApiUploader(
+            self.bot, progress_interval=UPLOAD_PROGRESS_INTERVAL, throttle=self.upload_bandwidth
+        )
+
+    async def start(self):
+        if self.metrics_server:
+            await self.metrics_server.start()
+
+    async def aclose(self):
+        """Deliver pending notifications and release pooled network connections"""
+        # Only what was used has been created
+        if 'notifier' in self.__dict__:
+            await self.notifier.aclose()
+        if self.metrics_server:
+            await self.metrics_server.aclose()
+        await self.http.aclose()
+        if 'uploader' in self.__dict__:
+            await self.uploader.aclose()
+        self.cpu.close()
+        self.metrics.close()
+
+
+class VideoParserBot:
+    """
+    Monitors one website and posts its new videos to one channel.
+
+    Without arguments the source comes from the environment (WEBSITE_URL,
+    TELEGRAM_CHANNEL_ID) and the bot owns its services. With SOURCES_FILE, main() runs
+    one VideoParserBot per source on a single SharedServices.
+    """
+
+    def __init__(self, source=None, services=None):
+        self.owns_services = services is None
+        self.services = services or SharedServices()
+        self.metrics = self.services.metrics
+        self.download_slots = self.services.download_slots
+        self.retry = self.services.retry
+        self.spool = self.services.spool
+        self.cpu = self.services.cpu
+
+        # Explicitly configured sources are named in admin messages and temp file paths
+        self.label = source['name'] if source else None
+        self.source = source or default_source()
+        self.name = self.source['name']
+        self.website_url = self.source['website_url']
+        self.channel_id = self.source['channel_id']
+        self.selectors = self.source['selectors']
         self.admin_id = ADMIN_ID
-        self.last_video_id = self.load_last_video_id()
+        # Estimated time each video appeared on the website, for the post lag
+        self.published_estimates = {}
+        self.temp_dir = self.spool.directory
+        if self.label:
+            # Video IDs of different sources may collide
+            self.temp_dir = os.path.join(self.temp_dir, self.label)
+        if self.temp_dir:
+            os.makedirs(self.temp_dir, exist_ok=True)
+        self.store = StateStore(self.source['state_db'])
+        self.scheduler = PollScheduler(
+            self.source['poll_history'],
+            default_interval=self.source['check_interval'],
+            min_interval=self.source['poll_min_interval'],
+            max_interval=self.source['poll_max_interval'],
+            jitter=POLL_JITTER,
+            budget=POLL_BUDGET
+        )
+
+        # Validators and parsed result of the last main page fetch
+        self.listing_cache = {
+            'etag': None,
+            'last_modified': None,
+            'videos': None,
+            'stopped_at': None,  # Block ID at which the cached parse stopped reading
+            'complete': False,  # Whether the cached parse read the whole container
+            'fetched_at': None
+        }
+
+        # The shared connection pool, sending this website as the Referer
+        self.http = self.services.http.with_headers({'Referer': self.website_url or ''})
+        self.downloader = SegmentedDownloader(
+            self.http,
+            connections=DOWNLOAD_CONNECTIONS,
+            segment_size=DOWNLOAD_SEGMENT_SIZE_MB * 1024 * 1024,
+            chunk_size=DOWNLOAD_CHUNK_SIZE_KB * 1024,
+            throttle=self.services.download_bandwidth
+        )
+        # Download URLs of pending videos, resolved ahead of their downloads
+        self.resolver = UrlResolver(self.get_video_download_url, ttl=DOWNLOAD_URL_TTL, concurrency=RESOLVE_CONCURRENCY)
+
+    @property
+    def bot(self):
+        return self.services.bot
+
+    @property
+    def notifier(self):
+        return self.services.notifier
+
+    @property
+    def uploader(self):
+        return self.services.uploader
 
     def load_last_video_id(self):
-        """Load the ID of the last processed video from file"""
+        """Load the ID of the last processed video from the legacy state file"""
+        legacy_state = self.source['legacy_state']
         try:
-            if os.path.exists(LAST_VIDEO_ID_FILE):
-                with open(LAST_VIDEO_ID_FILE, 'r') as f:
+            if legacy_state and os.path.exists(legacy_state):
+                with open(legacy_state, 'r') as f:
                     data = json.load(f)
                     return data.get('last_id', None)
         except Exception as e:
             logger.error(f"Error loading last video ID: {e}")
         return None
 
-    def save_last_video_id(self, video_id):
-        """Save the ID of the last processed video to file"""
-        try:
-            with open(LAST_VIDEO_ID_FILE, 'w') as f:
-                json.dump({'last_id': video_id}, f)
-            logger.info(f"Saved last video ID: {video_id}")
-        except Exception as e:
-            logger.error(f"Error saving last video ID: {e}")
-
-    async def send_admin_message(self, message, parse_mode=None):
-        """Send a status message to the admin with retry logic"""
-        if not self.admin_id:
-            logger.warning("ADMIN_ID not set, skipping admin notification")
-            return False
+    def send_admin_message(self, message):
+        """Queue an HTML status message to the admin; delivery happens in the background"""
+        if self.label:
+            message = f"📡 <b>{self.label}</b>\n{message}"
+        return self.notifier.send(message)
+
+    def update_status(self, video_id, headline, final=False):
+        """Show a video's progress in its own admin message, which is edited as it advances"""
+        text = f"{headline}\n🆔 Video ID: <code>{video_id}</code>"
+        if self.label:
+            text += f"\n📡 Source: {self.label}"
+        self.notifier.status((self.name, video_id), text, final)
+
+    def transfer_status(self, video_id, action):
+        """Callback that reports (done, total) bytes of a download or upload as the video's status"""
+        def report(done, total):
+            if total:
+                self.update_status(
+                    video_id,
+                    f"{action} {done * 100 // total}% "
+                    f"({done / (1024 * 1024):.1f}/{total / (1024 * 1024):.1f} MB)"
+                )
+        return report
 
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                await self.bot.send_message(
-                    chat_id=self.admin_id,
-                    text=message,
-                    parse_mode=parse_mode,
-                    read_timeout=30,
-                    write_timeout=30,
-                    connect_timeout=30
+    async def fetch_listing(self, stop=None, limit=None):
+        """
+        Fetch the main page into a list of {'id', 'url'} video blocks (newest first).
+
+        The page is parsed while it downloads, and reading stops at the first block whose
+        ID satisfies `stop` or after `limit` blocks, so only the new part of the page is
+        transferred.
+        The parsed listing is cached; polls send If-None-Match/If-Modified-Since when the
+        cached listing already reaches far enough, and a 304 response reuses it.
+        Returns None when the videos container is missing.
+        """
+        cache = self.listing_cache
+        covered = self.listing_covers(stop, limit)
+        if covered and time.monotonic() - cache['fetched_at'] < LISTING_CACHE_TTL:
+            return cache['videos']
+
+        headers = {}
+        if covered:
+            # A 304 is only useful if the cached listing answers this request
+            if cache['etag']:
+                headers['If-None-Match'] = cache['etag']
+            if cache['last_modified']:
+                headers['If-Modified-Since'] = cache['last_modified']
+
+        with self.metrics.stage('fetch') as stage:
+            async with self.http.stream(self.website_url, headers=headers) as response:
+                if response.status_code == 304 and covered:
+                    logger.info("Main page not modified since last check")
+                    cache['fetched_at'] = time.monotonic()
+                    return cache['videos']
+                response.raise_for_status()
+
+                # Leaving the block early closes the connection without reading the rest of the page
+                parser = ListingParser(
+                    container=self.selectors['container'],
+                    item=self.selectors['item'],
+                    link=self.selectors['link'],
+                    stop=stop,
+                    limit=limit,
+                    encoding=response.charset_encoding
                 )
-                logger.debug("Admin notification sent successfully")
-                return True
-            except Exception as e:
-                logger.warning(f"Failed to send admin notification (attempt {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(2)  # Wait 2 seconds before retry
+                stopped_early = False
+                parse_time = 0.0
+                async for chunk in response.aiter_bytes():
+                    stage.add_bytes(len(chunk))
+                    started = time.perf_counter()
+                    done = parser.feed(chunk)
+                    parse_time += time.perf_counter() - started
+                    if done:
+                        stopped_early = True
+                        break
                 else:
-                    logger.error(f"Failed to send admin notification after {max_retries} attempts")
-                    return False
+                    parser.finish()
+            self.metrics.record_stage('parse', parse_time)
+
+        cache['etag'] = response.headers.get('etag')
+        cache['last_modified'] = response.headers.get('last-modified')
+        cache['fetched_at'] = time.monotonic()
+        cache['stopped_at'] = parser.stopped_at
+        cache['complete'] = parser.stopped_at is None and not (limit and len(parser.videos) >= limit)
+        if stopped_early and not cache['complete']:
+            logger.info(f"Stopped reading the main page after {len(parser.videos)} video blocks")
+        if not parser.found_container:
+            logger.warning(f"Could not find {describe(self.selectors['container'])} element")
+            cache['videos'] = None
+        else:
+            for video in parser.videos:
+                if video['url']:
+                    video['url'] = self.absolute_url(video['url'])
+            cache['videos'] = parser.videos
+        return cache['videos']
+
+    def listing_covers(self, stop=None, limit=None):
+        """Whether the cached listing reaches far enough to answer a fetch_listing call"""
+        cache = self.listing_cache
+        if cache['fetched_at'] is None:
+            return False
+        videos = cache['videos']
+        if videos is None or cache['complete']:
+            return True
+        if limit and len(videos) >= limit:
+            return True
+        if stop is None:
+            return False
+        if cache['stopped_at'] is not None and stop(cache['stopped_at']):
+            return True
+        return any(video['id'] and stop(video['id']) for video in videos)
 
-    def get_latest_video_id(self):
-        """Get the ID of the latest (first) video on the page without processing it"""
-        try:
-            response = requests.get(self.website_url, headers=HEADERS, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Find the videos container
-            videos_ul = soup.find('ul', class_='videos_ul')
-            if not videos_ul:
-                logger.warning("Could not find ul.videos_ul element")
-                return None
+    def absolute_url(self, url):
+        """Make a site-relative URL absolute"""
+        if url.startswith('http'):
+            return url
+        return self.website_url.rstrip('/') + '/' + url.lstrip('/')
 
-            # Find the first video block (latest video)
-            first_video = videos_ul.find('li', class_='video_block')
-            if first_video:
-                video_id = first_video.get('id')
-                logger.info(f"Latest video ID on website: {video_id}")
-                return video_id
+    async def record_baseline(self):
+        """
+        First run: record the videos already on the website as the baseline, so only videos
+        published after them are processed. The ID saved by earlier versions in
+        last_video_id.json is imported: videos newer than it are left to be processed.
+        Returns True once the baseline is recorded.
+        """
+        videos = await self.retry.call('fetch', self.website_url, self.fetch_listing)
+        if videos is None:
+            return False
+        videos = [video for video in videos if video['id']]
 
-            return None
+        legacy_id = self.load_last_video_id()
+        if legacy_id:
+            ids = [video['id'] for video in videos]
+            if legacy_id in ids:
+                videos = videos[ids.index(legacy_id):]
+            else:
+                logger.warning(f"Last video ID {legacy_id} from {self.source['legacy_state']} is no longer listed, "
+                               f"treating every listed video as already processed")
+            videos.append({'id': legacy_id, 'url': None})
 
-        except Exception as e:
-            logger.error(f"Error fetching latest video ID: {e}")
-            return None
+        self.store.discover(videos, state=state_store.BASELINE)
+        logger.info(f"Recorded {len(videos)} video(s) already on the website as the baseline")
+        return True
 
-    def get_new_videos(self):
-        """Parse the main page and get new video links (starts from first/newest video)"""
+    async def get_new_videos(self):
+        """
+        Parse the main page and get the videos that still need processing (newest first).
+        Reading stops at the first video that was already uploaded (or predates the bot),
+        so unfinished and failed videos before it are picked up again.
+        """
         try:
-            response = requests.get(self.website_url, headers=HEADERS, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Find the videos container
-            videos_ul = soup.find('ul', class_='videos_ul')
-            if not videos_ul:
-                logger.warning("Could not find ul.videos_ul element")
-                return []
-
-            # Find all video blocks
-            video_blocks = videos_ul.find_all('li', class_='video_block')
+            videos = await self.retry.call('fetch', self.website_url, self.fetch_listing, stop=self.store.is_settled)
             new_videos = []
 
-            for block in video_blocks:
-                video_id = block.get('id')
-                if not video_id:
+            for video in videos or []:
+                if not video['id']:
                     continue
 
-                # If this is the last processed video, stop here
-                if video_id == self.last_video_id:
+                # Everything from the first settled video on has been handled
+                if self.store.is_settled(video['id']):
                     break
 
-                # Find the link to the video page
-                link_elem = block.find('a', class_='image')
-                if link_elem and link_elem.get('href'):
-                    video_url = link_elem['href']
-                    # Make absolute URL if needed
-                    if not video_url.startswith('http'):
-                        video_url = self.website_url.rstrip('/') + '/' + video_url.lstrip('/')
-
-                    new_videos.append({
-                        'id': video_id,
-                        'url': video_url
-                    })
-
-            # Process videos in order (first/newest first)
-            # No need to reverse - process from beginning of container
+                if video['url']:
+                    new_videos.append(dict(video))
+
+            # Videos seen for the first time appeared on the website since the previous check
+            now = time.time()
+            previous = self.scheduler.last_check
+            published = (previous + now) / 2 if previous else None
+            for video in new_videos:
+                if published and video['id'] not in self.store:
+                    self.published_estimates[video['id']] = published
+                    self.metrics.observe('detection_lag_seconds', now - published)
+
+            self.store.discover(new_videos)
             return new_videos
 
         except Exception as e:
             logger.error(f"Error fetching new videos: {e}")
             return []
 
-    def get_video_download_url(self, video_page_url):
-        """Get the direct video download URL from the video page"""
+    async def get_video_download_url(self, video_page_url):
+        """Get the direct video download URL from the video page, or None"""
         try:
-            response = requests.get(video_page_url, headers=HEADERS, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Navigate: div.col_video → div.player-wrapper → video
-            col_video = soup.find('div', class_='col_video')
-            if not col_video:
-                logger.warning("Could not find div.col_video")
-                return None
+            return await self.retry.call('resolve', video_page_url, self.read_download_url, video_page_url)
+        except Exception as e:
+            logger.error(f"Error getting video download URL: {e}")
+            return None
 
-            player_wrapper = col_video.find('div', class_='player-wrapper')
-            if not player_wrapper:
-                logger.warning("Could not find div.player-wrapper")
-                return None
+    async def read_download_url(self, video_page_url):
+        """Fetch a video page and return the absolute video src URL, or None when it has none"""
+        stage = self.metrics.stage('resolve')
+        with stage:
+            async with self.http.stream(video_page_url) as response:
+                response.raise_for_status()
+
+                # Navigate the source's path (by default div.col_video → div.player-wrapper → video)
+                # Reading stops as soon as the video tag has been parsed
+                parser = VideoSourceParser(path=self.selectors['video'], encoding=response.charset_encoding)
+                parse_time = 0.0
+                async for chunk in response.aiter_bytes():
+                    stage.add_bytes(len(chunk))
+                    started = time.perf_counter()
+                    done = parser.feed(chunk)
+                    parse_time += time.perf_counter() - started
+                    if done:
+                        break
+                else:
+                    parser.finish()
+            self.metrics.record_stage('parse', parse_time)
 
-            video_tag = player_wrapper.find('video')
-            if not video_tag:
-                logger.warning("Could not find video tag")
+            if parser.missing:
+                logger.warning(f"Could not find {describe(parser.missing)}")
+                stage.fail()
                 return None
 
-            video_src = video_tag.get('src')
-            if not video_src:
+            if not parser.src:
                 logger.warning("Video tag has no src attribute")
+                stage.fail()
                 return None
 
-            # Make absolute URL if needed
-            if not video_src.startswith('http'):
-                video_src = self.website_url.rstrip('/') + '/' + video_src.lstrip('/')
+            return self.absolute_url(parser.src)
 
-            return video_src
-
-        except Exception as e:
-            logger.error(f"Error getting video download URL: {e}")
+    def known_download_url(self, video_id, record):
+        """
+        The download URL an earlier attempt stored for a video, if it was resolved less
+        than DOWNLOAD_URL_TTL seconds ago; it is also added to the resolver's cache.
+        """
+        if not record.get('download_url'):
             return None
+        resolved = [at for state, at in self.store.timeline(video_id) if state == state_store.URL_RESOLVED]
+        if resolved:
+            self.resolver.seed(video_id, record['download_url'], resolved[-1])
+        return self.resolver.cached(video_id)
 
-    def download_video(self, video_url, save_path):
-        """Download video from URL"""
+    async def refresh_download_url(self, video_info):
+        """Resolve a video's download URL again after the CDN rejected it; returns the new URL or None"""
+        video_id = video_info['id']
+        self.metrics.inc('retries_total', operation='resolve')
+        download_url = await self.resolver.refresh(video_id, video_info['url'])
+        if download_url:
+            video_info['download_url'] = download_url
+            # Recorded as a new resolution, so a restart does not reuse the rejected URL
+            self.store.transition(video_id, state_store.URL_RESOLVED, download_url=download_url)
+            self.store.transition(video_id, state_store.DOWNLOADING)
+        return download_url
+
+    async def download_video(self, video_url, save_path, progress=None, priority=None, refresh_url=None):
+        """
+        Download video from URL using parallel range requests.
+        A partial download left by a crash or timeout is resumed on the next attempt.
+        The transfer waits for spool space for the whole file (see admit_download).
+        If the URL has expired (HTTP 403/410), refresh_url() is awaited for a new one.
+        Returns the content hash of the video, or None on failure.
+        """
         try:
             logger.info(f"Downloading video from {video_url}")
-            response = requests.get(video_url, headers=HEADERS, stream=True, timeout=60)
-            response.raise_for_status()
-
-            total_size = int(response.headers.get('content-length', 0))
-            logger.info(f"Video size: {total_size / (1024*1024):.2f} MB")
-
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            with self.metrics.stage('download') as stage:
+                digest = await self.downloader.download(
+                    video_url, save_path, progress,
+                    admit=lambda size: self.admit_download(save_path, size, priority),
+                    refresh_url=refresh_url,
+                    retry=lambda attempt, current_url: self.retry.call('download', current_url, attempt)
+                )
+                stage.add_bytes(os.path.getsize(save_path))
 
             logger.info(f"Video downloaded successfully to {save_path}")
-            return True
+            return digest
 
         except Exception as e:
             logger.error(f"Error downloading video: {e}")
-            return False
+            return None
 
-    def get_video_metadata(self, video_path):
+    @asynccontextmanager
+    async def admit_download(self, save_path, size, priority=None):
         """
-        Extract video metadata (duration, width, height) using OpenCV
+        Hold a download of size bytes back until the spool has room for it (twice that for
+        a video that will be split), then until one of the MAX_CONCURRENT_DOWNLOADS slots
+        shared by all sources is free. Space is taken before a slot, so videos waiting for
+        space never keep the first video in line from downloading.
         """
-        try:
-            logger.info("Extracting video metadata with OpenCV...")
-
-            # Open video file
-            cap = cv2.VideoCapture(video_path)
-
-            if not cap.isOpened():
-                logger.warning("Could not open video file for metadata extraction")
-                return None
-
-            # Get video properties
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-            # Calculate duration
-            if fps > 0:
-                duration = int(frame_count / fps)
-            else:
-                duration = None
-
-            cap.release()
-
-            if duration and width and height:
-                logger.info(f"Video metadata: {width}x{height}, duration: {duration}s ({duration/60:.1f} min)")
-                return {
-                    'duration': duration,
-                    'width': width,
-                    'height': height
-                }
+        if size > MAX_VIDEO_SIZE_MB * 1024 * 1024:
+            size *= 2
+        await self.spool.reserve(save_path, size, priority)
+        async with self.download_slots:
+            yield
 
+    async def get_fingerprint(self, video_url):
+        """
+        Early fingerprint of a remote video from its size and first and last DEDUP_SAMPLE_MB,
+        or None if disabled or the server does not support range requests.
+        """
+        if not DEDUP_SAMPLE_MB:
             return None
-
+        try:
+            return await self.downloader.fingerprint(video_url, DEDUP_SAMPLE_MB * 1024 * 1024)
         except Exception as e:
-            logger.warning(f"Error getting video metadata: {e}")
+            logger.warning(f"Could not fingerprint video: {e}")
             return None
 
-    def generate_thumbnail(self, video_path, thumbnail_path):
+    def find_uploaded(self, video_info):
         """
-        Generate a thumbnail from the video using OpenCV
+        Look up the video's fingerprint and content hash among uploaded files. On a match,
+        stores the Telegram 'file_id' (and 'size') in video_info and returns True.
         """
-        try:
-            logger.info("Generating video thumbnail with OpenCV...")
-
-            # Open video file
-            cap = cv2.VideoCapture(video_path)
+        media = self.store.find_media(video_info.get('fingerprint'), video_info.get('content_hash'))
+        if not media:
+            return False
+        logger.info(f"Video {video_info['id']} has the same content as uploaded video {media['video_id']}")
+        video_info['file_id'] = media['file_id']
+        if media['size']:
+            video_info['size'] = media['size']
+        return True
 
-            if not cap.isOpened():
-                logger.warning("Could not open video file for thumbnail generation")
+    async def get_video_metadata(self, video_path):
+        """
+        Extract video metadata (duration, width, height) from the MP4 container.
+        Reads only the moov atom, so no frames are decoded and the duration is exact.
+        """
+        try:
+            logger.info("Extracting video metadata from MP4 container...")
+            with self.metrics.stage('probe') as stage:
+                metadata = await self.cpu.run(mp4_probe.probe_file, video_path)
+                if not metadata:
+                    stage.fail()
+            if not metadata:
+                logger.warning("Could not read MP4 metadata from video file")
                 return None
 
-            # Set position to 10 seconds into the video
-            cap.set(cv2.CAP_PROP_POS_MSEC, 10000)  # 10 seconds = 10000 milliseconds
+            duration = metadata['duration']
+            logger.info(f"Video metadata: {metadata['width']}x{metadata['height']}, duration: {duration}s ({duration/60:.1f} min)")
+            return metadata
 
-            # Read frame
-            success, frame = cap.read()
+        except Exception as e:
+            logger.warning(f"Error getting video metadata: {e}")
+            return None
 
-            if not success:
-                # If 10 seconds fails, try first frame
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                success, frame = cap.read()
+    async def generate_thumbnail(self, video_path, thumbnail_path, keyframe=None):
+        """
+        Generate a thumbnail from the video with OpenCV in the CPU pool (see
+        thumbnails.extract_thumbnail); returns its path or None.
+        """
+        with self.metrics.stage('thumbnail') as stage:
+            try:
+                thumbnail = await self.cpu.run(
+                    thumbnails.extract_thumbnail, video_path, thumbnail_path, keyframe, THUMBNAIL_TIME, THUMBNAIL_WIDTH
+                )
+            except Exception as e:
+                logger.warning(f"Error generating thumbnail: {e}")
+                thumbnail = None
+            if not thumbnail:
+                stage.fail()
+            return thumbnail
 
-            cap.release()
+    async def prepare_thumbnail(self, video_path, progress):
+        """
+        Generate the thumbnail while the video is still downloading.
 
-            if not success:
-                logger.warning("Could not extract frame from video")
+        Waits only for the bytes it needs (the box headers, the moov atom and the keyframe
+        nearest to THUMBNAIL_TIME), so the thumbnail is ready when the download finishes.
+        Returns the thumbnail path, or None.
+        """
+        try:
+            # Walk the top-level boxes until moov, waiting for each box header
+            offset = 0
+            while True:
+                await progress.wait_for(offset, offset + 16)
+                with open(video_path, 'rb') as f:
+                    f.seek(offset)
+                    header = f.read(16)
+                box = next(mp4_probe.iter_boxes(header, 0, len(header)), None)
+                if box is None or offset >= progress.total_size:
+                    logger.warning("No moov atom found for the early thumbnail")
+                    return None
+                box_type, _, size, _ = box
+                if box_type == b'moov':
+                    break
+                if header[:4] == b'\0\0\0\0':
+                    # A box extending to the end of the file: there is no moov after it
+                    return None
+                offset += size
+
+            moov_offset, moov_size = offset, size
+            await progress.wait_for(moov_offset, moov_offset + moov_size)
+            keyframe = await self.cpu.run(
+                mp4_probe.find_thumbnail_keyframe, video_path, moov_offset, moov_size, THUMBNAIL_TIME
+            )
+            if not keyframe or not keyframe['parameter_sets']:
+                # Seeking with OpenCV needs the whole file; leave it to the upload stage
                 return None
 
-            # Resize frame to thumbnail size (320px width)
-            height, width = frame.shape[:2]
-            new_width = 320
-            new_height = int((new_width / width) * height)
-            resized = cv2.resize(frame, (new_width, new_height))
-
-            # Convert BGR to RGB (OpenCV uses BGR)
-            rgb_frame = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+            await progress.wait_for(keyframe['offset'], keyframe['offset'] + keyframe['size'])
+            logger.info(f"Thumbnail keyframe at {keyframe['time']:.2f}s is on disk, extracting it early")
 
-            # Save as JPEG using PIL
-            img = Image.fromarray(rgb_frame)
-            img.save(thumbnail_path, 'JPEG', quality=85)
-
-            logger.info(f"Thumbnail generated: {thumbnail_path}")
-            return thumbnail_path
+            thumbnail_path = video_path.replace('.mp4', '_thumb.jpg')
+            return await self.generate_thumbnail(video_path, thumbnail_path, keyframe)
 
         except Exception as e:
-            logger.warning(f"Error generating thumbnail: {e}")
+            logger.warning(f"Could not generate thumbnail during download: {e}")
             return None
 
-    async def upload_to_telegram(self, video_path):
+    async def upload_to_telegram(self, video_path, thumbnail=None, on_progress=None):
         """
         Upload video to Telegram channel with metadata and thumbnail.
         Uses local Bot API server if configured to support files up to 2GB.
+        A thumbnail generated during the download can be passed in; otherwise one is generated.
+        The file is streamed from disk in UPLOAD_CHUNK_SIZE_KB chunks, so memory use stays
+        flat whatever its size, and bytes sent are reported to on_progress(sent, total).
+        In local files mode the server reads the files itself; only their paths are sent.
+        Returns the sent message, or None on failure.
         """
-        thumbnail_file = None
         try:
             file_size = os.path.getsize(video_path)
             file_size_mb = file_size / (1024 * 1024)
@@ -354,14 +765,15 @@ class VideoParserBot:
                 if not LOCAL_BOT_API_SERVER:
                     error_msg += "\nTo upload files >50MB, set up local Bot API server (see LOCAL_SERVER_SETUP.md)"
                 logger.error(error_msg)
-                return False
+                return None
 
             # Extract video metadata (duration, width, height)
-            metadata = self.get_video_metadata(video_path)
+            metadata = await self.get_video_metadata(video_path)
 
-            # Generate thumbnail
-            thumbnail_path = video_path.replace('.mp4', '_thumb.jpg')
-            thumbnail = self.generate_thumbnail(video_path, thumbnail_path)
+            # Generate thumbnail unless it was extracted during the download
+            if not thumbnail:
+                thumbnail_path = video_path.replace('.mp4', '_thumb.jpg')
+                thumbnail = await self.generate_thumbnail(video_path, thumbnail_path)
 
             # Prepare video upload parameters
             duration = metadata['duration'] if metadata else None
@@ -369,32 +781,41 @@ class VideoParserBot:
             height = metadata['height'] if metadata else None
 
             # Upload the video with metadata and thumbnail
-            with open(video_path, 'rb') as video_file:
-                # Open thumbnail file if it was generated
-                if thumbnail and os.path.exists(thumbnail):
-                    thumbnail_file = open(thumbnail, 'rb')
-
-                logger.info(f"Uploading video ({file_size_mb:.2f} MB)...")
-                if duration:
-                    logger.info(f"Duration: {duration}s ({duration/60:.1f} min), Resolution: {width}x{height}")
-
-                await self.bot.send_video(
-                    chat_id=self.channel_id,
-                    video=video_file,
-                    thumbnail=thumbnail_file if thumbnail_file else None,
-                    caption=f"📹 New video uploaded\n\n📦 Size: {file_size_mb:.2f} MB",
-                    duration=duration,
-                    width=width,
-                    height=height,
+            has_thumbnail = bool(thumbnail) and os.path.exists(thumbnail)
+            logger.info(f"Uploading video ({file_size_mb:.2f} MB)...")
+            if duration:
+                logger.info(f"Duration: {duration}s ({duration/60:.1f} min), Resolution: {width}x{height}")
+
+            params = {
+                'chat_id': self.channel_id,
+                'caption': f"📹 New video uploaded\n\n📦 Size: {file_size_mb:.2f} MB",
+                'duration': duration,
+                'width': width,
+                'height': height,
+                'supports_streaming': True
+            }
+            if LOCAL_FILES_MODE:
+                message = await self.send_with_retry(
+                    self.bot.send_video,
+                    video=self.server_file_uri(video_path),
+                    thumbnail=self.server_file_uri(thumbnail) if has_thumbnail else None,
                     read_timeout=600,
                     write_timeout=600,
                     connect_timeout=600,
-                    supports_streaming=True
+                    **params
+                )
+            else:
+                message = await self.send_with_retry(
+                    self.uploader.send_video,
+                    video=self.upload_file(video_path, 'video/mp4'),
+                    thumbnail=self.upload_file(thumbnail, 'image/jpeg') if has_thumbnail else None,
+                    on_progress=on_progress,
+                    **params
                 )
 
             logger.info("Video uploaded successfully to Telegram")
 
-            # Clean up thumbnail file
+            # Clean up thumbnail file; the server has confirmed the upload, so it no longer reads it
             if thumbnail and os.path.exists(thumbnail):
                 try:
                     os.remove(thumbnail)
@@ -402,187 +823,961 @@ class VideoParserBot:
                 except Exception as e:
                     logger.warning(f"Could not remove thumbnail: {e}")
 
-            return True
+            return message
 
-        except TelegramError as e:
+        except telegram.error.TelegramError as e:
             logger.error(f"Telegram error uploading video: {e}")
-            return False
+            return None
         except Exception as e:
             logger.error(f"Error uploading video: {e}")
-            return False
-        finally:
-            # Make sure thumbnail file handle is closed
-            if thumbnail_file:
-                thumbnail_file.close()
+            return None
+
+    async def send_with_retry(self, method, *args, **kwargs):
+        """
+        Call a Bot API method as an 'upload' operation: transient failures are retried with
+        backoff and flood waits sat out, within this check, instead of at the next one.
+        """
+        return await self.retry.call('upload', self.bot.base_url, method, *args, **kwargs)
+
+    def upload_file(self, path, content_type):
+        """A file on disk as a streamed multipart part"""
+        return bot_api_upload.UploadFile.from_path(path, content_type, UPLOAD_CHUNK_SIZE_KB * 1024)
+
+    def temp_path(self, name):
+        """Path of a temporary file in the temp directory"""
+        return os.path.join(self.temp_dir, name)
+
+    def video_temp_path(self, video_id):
+        """Path a video is downloaded to"""
+        return self.temp_path(f"temp_video_{video_id}.mp4")
+
+    def file_input(self, path, content_type):
+        """What to send for a local file: its server path in local files mode, otherwise a streamed upload"""
+        return self.server_file_uri(path) if LOCAL_FILES_MODE else self.upload_file(path, content_type)
 
-    async def process_video(self, video_info):
-        """Process a single video: download and upload to Telegram"""
+    def server_file_uri(self, path):
+        """file:// URI under which a local-mode Bot API server sees a file in LOCAL_FILES_DIR"""
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(LOCAL_FILES_DIR))
+        # The server runs on Linux (Docker), whatever the bot's OS
+        return 'file://' + posixpath.join(LOCAL_FILES_SERVER_DIR, *relative.split(os.sep))
+
+    async def prepare_video(self, video_info):
+        """
+        Resolve the download URL and download a video to a temporary file.
+        Stores 'download_url' (and 'path' unless streaming) in video_info.
+        Stages finished by an earlier attempt (per the state store) are not repeated, and
+        nothing is downloaded when the fingerprint matches an uploaded video ('file_id').
+        Returns True on success.
+        """
         video_id = video_info['id']
         video_page_url = video_info['url']
+        record = self.store.get(video_id) or {}
 
         logger.info(f"Processing video ID: {video_id}")
         logger.info(f"Video page URL: {video_page_url}")
+        if record.get('attempts'):
+            self.metrics.inc('retries_total', operation='video')
 
         # Notify admin about new video processing
-        await self.send_admin_message(
-            f"🔄 <b>Processing new video</b>\n"
-            f"🆔 Video ID: <code>{video_id}</code>",
-            parse_mode='HTML'
-        )
+        self.update_status(video_id, "🔄 <b>Processing new video</b>")
 
-        # Get video download URL
-        video_download_url = self.get_video_download_url(video_page_url)
-        if not video_download_url:
-            logger.error(f"Could not get download URL for video {video_id}")
-            await self.send_admin_message(
-                f"❌ <b>Error:</b> Could not get download URL\n"
-                f"🆔 Video ID: <code>{video_id}</code>",
-                parse_mode='HTML'
-            )
-            return False
+        # Get video download URL: prefetched, resolved by an earlier attempt within its TTL, or now
+        video_download_url = self.known_download_url(video_id, record)
+        if video_download_url:
+            logger.info(f"Using download URL resolved earlier: {video_download_url}")
+        else:
+            video_download_url = await self.resolver.get(video_id, video_page_url)
+            if not video_download_url:
+                logger.error(f"Could not get download URL for video {video_id}")
+                self.store.transition(video_id, state_store.FAILED, error="Could not get download URL")
+                self.update_status(video_id, "❌ <b>Error:</b> Could not get download URL", final=True)
+                return False
+        if video_download_url != record.get('download_url'):
+            self.store.transition(video_id, state_store.URL_RESOLVED, download_url=video_download_url)
+        video_info['download_url'] = video_download_url
+
+        # The same file re-listed under a new ID is re-sent by file_id, not downloaded again
+        video_info['fingerprint'] = record.get('fingerprint') or await self.get_fingerprint(video_download_url)
+        if self.find_uploaded(video_info):
+            return True
+
+        # A download (or stream spilled to disk) finished by an earlier attempt is uploaded from disk
+        temp_video_path = self.video_temp_path(video_id)
+        if self.is_downloaded(temp_video_path, record.get('size')):
+            logger.info(f"Video {video_id} was already downloaded: {temp_video_path}")
+            video_info['path'] = temp_video_path
+            # Downloads finished before content hashing existed are hashed from disk
+            video_info['content_hash'] = record.get('content_hash') or await asyncio.to_thread(hash_file, temp_video_path)
+            return await self.prepare_parts(video_info)
+
+        # In stream mode the download happens during publishing
+        if STREAM_UPLOAD:
+            return True
 
-        # Download video
-        temp_video_path = f"temp_video_{video_id}.mp4"
-        if not self.download_video(video_download_url, temp_video_path):
+        # Download video; the thumbnail is extracted as soon as its bytes are on disk
+        self.store.transition(
+            video_id, state_store.DOWNLOADING, path=temp_video_path, fingerprint=video_info['fingerprint']
+        )
+        progress = DownloadProgress(self.transfer_status(video_id, "⬇️ <b>Downloading</b>"))
+        thumbnail_task = asyncio.create_task(self.prepare_thumbnail(temp_video_path, progress))
+        digest = await self.download_video(
+            video_download_url, temp_video_path, progress, video_info.get('queued_at'),
+            refresh_url=lambda: self.refresh_download_url(video_info)
+        )
+        if not digest:
+            await thumbnail_task
             logger.error(f"Could not download video {video_id}")
-            await self.send_admin_message(
-                f"❌ <b>Error:</b> Failed to download video\n"
-                f"🆔 Video ID: <code>{video_id}</code>",
-                parse_mode='HTML'
-            )
+            self.store.transition(video_id, state_store.FAILED, error="Download failed")
+            self.update_status(video_id, "❌ <b>Error:</b> Failed to download video", final=True)
+            # Keep the partial file: the next attempt resumes the finished segments
             return False
 
-        # Get file size
-        file_size_mb = os.path.getsize(temp_video_path) / (1024 * 1024)
+        video_info['thumbnail'] = await thumbnail_task
+        # The content hash stays that of the downloaded bytes, so re-listings still match
+        await self.make_faststart(temp_video_path)
+        self.store.transition(
+            video_id, state_store.DOWNLOADED, size=os.path.getsize(temp_video_path), content_hash=digest
+        )
+        video_info['path'] = temp_video_path
+        video_info['content_hash'] = digest
+        return await self.prepare_parts(video_info)
 
-        # Notify about upload
-        await self.send_admin_message(
-            f"⬆️ <b>Uploading to channel</b>\n"
-            f"🆔 Video ID: <code>{video_id}</code>\n"
-            f"📦 Size: {file_size_mb:.2f} MB",
-            parse_mode='HTML'
+    async def prepare_parts(self, video_info):
+        """
+        Split a downloaded video that is over MAX_VIDEO_SIZE_MB into parts ('parts' in
+        video_info), so the split overlaps the upload of the previous video.
+        Returns True on success or when no split is needed.
+        """
+        if video_info.get('parts') or os.path.getsize(video_info['path']) <= MAX_VIDEO_SIZE_MB * 1024 * 1024:
+            return True
+        with self.metrics.stage('split') as stage:
+            video_info['parts'] = await self.split_video(video_info['path'])
+            if video_info['parts']:
+                stage.add_bytes(os.path.getsize(video_info['path']))
+                return True
+            stage.fail()
+
+        self.store.transition(video_info['id'], state_store.FAILED, error="Split failed")
+        self.update_status(
+            video_info['id'], f"❌ <b>Error:</b> Could not split video into parts under {MAX_VIDEO_SIZE_MB} MB", final=True
         )
+        return False
 
-        # Upload to Telegram
-        upload_success = await self.upload_to_telegram(temp_video_path)
+    async def make_faststart(self, video_path):
+        """
+        Move the moov box of a downloaded video in front of its media data, so Telegram
+        clients can start playing it before the whole file has loaded.
+        Videos that will be split are left alone: FFmpeg writes every part faststart.
+        """
+        if os.path.getsize(video_path) > MAX_VIDEO_SIZE_MB * 1024 * 1024:
+            return
+        metadata = await self.cpu.run(mp4_probe.probe_file, video_path)
+        if not metadata or metadata['faststart']:
+            return
+
+        faststart_path = video_path.replace('.mp4', '_faststart.mp4')
+        if not self.spool.try_reserve(faststart_path, os.path.getsize(video_path)):
+            logger.info("Not enough spool space for a copy of the video, leaving moov where it is")
+            return
+        try:
+            started = time.monotonic()
+            with self.metrics.stage('faststart') as stage:
+                moved = await asyncio.to_thread(mp4_faststart.faststart, video_path, faststart_path)
+                stage.add_bytes(os.path.getsize(video_path) if moved else 0)
+            if moved:
+                os.replace(faststart_path, video_path)
+                logger.info(f"Moved moov to the start of the video in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            # The original file still plays, just not before it has fully loaded
+            logger.warning(f"Could not move moov to the start of the video: {e}")
+            self.remove_temp_file(faststart_path)
+        finally:
+            self.spool.release(faststart_path)
 
-        if upload_success:
-            await self.send_admin_message(
-                f"✅ <b>Video uploaded successfully!</b>\n"
-                f"🆔 Video ID: <code>{video_id}</code>\n"
-                f"📦 Size: {file_size_mb:.2f} MB",
-                parse_mode='HTML'
+    async def split_video(self, video_path):
+        """
+        Cut a video into parts under MAX_VIDEO_SIZE_MB at keyframes, with FFmpeg's stream
+        copy (no re-encoding). Each part starts with a keyframe and has its own duration.
+        Returns the part paths, or None on failure.
+        """
+        if not shutil.which('ffmpeg'):
+            logger.error("FFmpeg is not installed. Cannot split video.")
+            return None
+
+        limit = MAX_VIDEO_SIZE_MB * 1024 * 1024
+        for headroom in SPLIT_HEADROOM:
+            # Container overhead is not part of the estimate, hence the headroom
+            plan = await self.cpu.run(mp4_probe.plan_split, video_path, int(limit * headroom))
+            if not plan:
+                logger.error(f"Video cannot be cut at keyframes into parts under {MAX_VIDEO_SIZE_MB} MB")
+                return None
+
+            logger.info(f"Splitting video into {len(plan)} parts at keyframes")
+            paths = [video_path.replace('.mp4', f'_part{index}.mp4') for index in range(1, len(plan) + 1)]
+            try:
+                for part_path, (start, end) in zip(paths, plan):
+                    await self.cut_part(video_path, part_path, start, end)
+            except Exception as e:
+                logger.error(f"Error splitting video: {e}")
+                for part_path in paths:
+                    self.remove_temp_file(part_path)
+                return None
+
+            sizes = [os.path.getsize(part_path) for part_path in paths]
+            if max(sizes) <= limit:
+                logger.info(f"Split into parts of {', '.join(f'{size / (1024*1024):.2f}' for size in sizes)} MB")
+                return paths
+            logger.warning("A part came out over the size limit, splitting into smaller parts")
+            for part_path in paths:
+                self.remove_temp_file(part_path)
+        return None
+
+    async def cut_part(self, video_path, part_path, start, end):
+        """Stream-copy the part of a video from the keyframe at start up to end (None: to the end)"""
+        # Input seeking snaps to the last keyframe at or before the given time, so round up
+        command = ['ffmpeg', '-v', 'error', '-y', '-ss', f'{math.ceil(start * 1000) / 1000:.3f}', '-i', video_path]
+        if end is not None:
+            command += ['-t', f'{math.floor((end - start) * 1000) / 1000:.3f}']
+        command += ['-map', '0', '-c', 'copy', '-avoid_negative_ts', 'make_zero', '-movflags', '+faststart', part_path]
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg failed: {stderr.decode(errors='replace').strip()[-500:]}")
+
+    def is_downloaded(self, path, size):
+        """Whether a complete download of `size` bytes from an earlier attempt is on disk"""
+        return (
+            bool(size)
+            and os.path.exists(path)
+            and os.path.getsize(path) == size
+            and not os.path.exists(self.downloader.state_path(path))
+        )
+
+    def recover_spool(self):
+        """
+        Startup: keep the downloads of known unfinished videos, which resume on their next
+        attempt, and remove every other temp file left behind by an earlier run.
+        """
+        def resumable(name):
+            match = TEMP_VIDEO_RE.match(name)
+            if not match:
+                return False
+            record = self.store.get(match.group(1))
+            if not record or self.store.is_settled(record['id']):
+                return False
+            video_path = self.video_temp_path(record['id'])
+            if not os.path.exists(video_path):
+                return False
+            # A partial download with its segment record, or a complete one
+            return os.path.exists(self.downloader.state_path(video_path)) or os.path.getsize(video_path) == record['size']
+
+        kept, removed = self.spool.scan(self.temp_dir, resumable)
+        if removed:
+            logger.info(f"Removed {len(removed)} leftover temp file(s): {', '.join(removed)}")
+        if kept:
+            logger.info(f"Kept {len(kept)} download file(s) of unfinished videos: {', '.join(kept)}")
+
+    async def publish_video(self, video_info):
+        """
+        Upload a prepared video to Telegram and remove the temporary file.
+        A video with the same content as an earlier upload is re-sent by its file_id.
+        """
+        video_id = video_info['id']
+
+        # An earlier video of this backlog may have uploaded the same file in the meantime
+        if not video_info.get('file_id'):
+            self.find_uploaded(video_info)
+
+        if video_info.get('file_id'):
+            file_size_mb = video_info.get('size', 0) / (1024 * 1024)
+            self.update_status(video_id, "♻️ <b>Re-sending an already uploaded video</b>")
+            with self.metrics.stage('resend') as stage:
+                result = await self.resend_video(video_info['file_id'], file_size_mb)
+                if not result:
+                    stage.fail()
+        elif video_info.get('path'):
+            # Get file size
+            video_info['size'] = os.path.getsize(video_info['path'])
+            file_size_mb = video_info['size'] / (1024 * 1024)
+
+            # Notify about upload
+            parts = f" in {len(video_info['parts'])} parts" if video_info.get('parts') else ""
+            self.update_status(video_id, f"⬆️ <b>Uploading to channel</b>\n📦 Size: {file_size_mb:.2f} MB{parts}")
+
+            # Upload to Telegram
+            with self.metrics.stage('upload') as stage:
+                result = await self.upload_prepared(video_info)
+                if result:
+                    stage.add_bytes(video_info['size'])
+                else:
+                    stage.fail()
+        else:
+            self.update_status(video_id, "⬆️ <b>Streaming to channel</b>")
+            with self.metrics.stage('stream') as stage:
+                result = await self.stream_video(video_info)
+                if result:
+                    stage.add_bytes(video_info.get('size'))
+                else:
+                    stage.fail()
+            file_size_mb = video_info.get('size', 0) / (1024 * 1024)
+
+        # A split video is posted as several messages; their file_ids are stored comma-separated
+        messages = result if isinstance(result, list) else [result] if result else []
+        if messages:
+            file_id = ','.join(message.video.file_id for message in messages if message.video) or None
+            self.store.transition(
+                video_id, state_store.UPLOADED,
+                file_id=file_id,
+                message_id=messages[0].message_id,
+                fingerprint=video_info.get('fingerprint'),
+                content_hash=video_info.get('content_hash')
             )
+            published = self.published_estimates.pop(video_id, None) or (self.store.get(video_id) or {}).get('discovered_at')
+            if published:
+                self.metrics.observe('post_lag_seconds', time.time() - published)
+            if file_id:
+                self.store.remember_media(
+                    (video_info.get('fingerprint'), video_info.get('content_hash')), file_id,
+                    size=video_info.get('size'), video_id=video_id
+                )
+            self.update_status(video_id, f"✅ <b>Video uploaded successfully!</b>\n📦 Size: {file_size_mb:.2f} MB", final=True)
+            self.discard_prepared(video_info)
         else:
-            await self.send_admin_message(
-                f"❌ <b>Error:</b> Failed to upload video\n"
-                f"🆔 Video ID: <code>{video_id}</code>",
-                parse_mode='HTML'
+            self.store.transition(video_id, state_store.FAILED, error="Upload failed")
+            self.update_status(video_id, "❌ <b>Error:</b> Failed to upload video", final=True)
+            # Keep the downloaded video for the next attempt
+            self.discard_thumbnail(video_info)
+            self.discard_parts(video_info)
+
+        return bool(messages)
+
+    async def resend_video(self, file_id, file_size_mb):
+        """
+        Send a video that is already on Telegram's servers by its file_id (comma-separated
+        file_ids for a video that was split into parts).
+        Returns the sent message (a list of messages for parts), or None on failure.
+        """
+        try:
+            file_ids = file_id.split(',')
+            if len(file_ids) > 1:
+                messages = await self.post_parts(file_ids, [{}] * len(file_ids), file_size_mb)
+                logger.info(f"Video re-sent by file_id in {len(file_ids)} parts")
+                return messages
+            message = await self.send_with_retry(
+                self.bot.send_video,
+                chat_id=self.channel_id,
+                video=file_id,
+                caption=f"📹 New video uploaded\n\n📦 Size: {file_size_mb:.2f} MB",
+                supports_streaming=True
             )
+            logger.info("Video re-sent by file_id")
+            return message
+        except telegram.error.BadRequest as e:
+            # The file_id is no longer valid: forget it, so the next attempt uploads the file
+            logger.error(f"Telegram rejected file_id {file_id}: {e}")
+            self.store.forget_media(file_id)
+            return None
+        except telegram.error.TelegramError as e:
+            logger.error(f"Telegram error re-sending video: {e}")
+            return None
+
+    async def upload_prepared(self, video_info):
+        """
+        Upload a downloaded video: as a single file, or as an album of parts when it is
+        over MAX_VIDEO_SIZE_MB. Returns the sent message(s), or None on failure.
+        """
+        if not await self.prepare_parts(video_info):
+            return None
+        on_progress = self.transfer_status(video_info['id'], "⬆️ <b>Uploading</b>")
+        if video_info.get('parts'):
+            return await self.upload_parts(
+                video_info['parts'], os.path.getsize(video_info['path']) / (1024 * 1024), on_progress
+            )
+        return await self.upload_to_telegram(video_info['path'], video_info.get('thumbnail'), on_progress)
+
+    async def part_details(self, part_path):
+        """Metadata and thumbnail of one part of a split video"""
+        metadata = await self.get_video_metadata(part_path) or {}
+        thumbnail = await self.generate_thumbnail(part_path, part_path.replace('.mp4', '_thumb.jpg'))
+        return {
+            'duration': metadata.get('duration'),
+            'width': metadata.get('width'),
+            'height': metadata.get('height'),
+            'thumbnail': thumbnail
+        }
+
+    async def upload_parts(self, parts, file_size_mb, on_progress=None):
+        """
+        Upload the parts of a split video and post them as an album with numbered captions.
 
-        # Clean up temporary file
+        With a staging chat (SPLIT_STAGING_CHAT_ID) the parts are uploaded there
+        concurrently, then posted to the channel by file_id and removed from the staging
+        chat, so publishing takes about as long as the slowest part. Without one, the album
+        is uploaded to the channel directly. Bytes sent (over all parts) are reported to
+        on_progress(sent, total). Returns the sent messages, or None on failure.
+        """
+        details = await asyncio.gather(*(self.part_details(part) for part in parts))
+        staged = []
+        sent = [0] * len(parts)
+        totals = [os.path.getsize(part) for part in parts]
+
+        def part_progress(index):
+            def report(done, total):
+                sent[index], totals[index] = done, total
+                on_progress(sum(sent), sum(totals))
+            return report if on_progress else None
+        try:
+            if SPLIT_STAGING_CHAT_ID:
+                slots = asyncio.Semaphore(SPLIT_UPLOAD_CONNECTIONS)
+
+                async def stage(index):
+                    async with slots:
+                        detail = details[index]
+                        has_thumbnail = bool(detail['thumbnail']) and os.path.exists(detail['thumbnail'])
+                        params = {
+                            'chat_id': SPLIT_STAGING_CHAT_ID,
+                            'duration': detail['duration'],
+                            'width': detail['width'],
+                            'height': detail['height'],
+                            'supports_streaming': True,
+                            'disable_notification': True
+                        }
+                        if LOCAL_FILES_MODE:
+                            message = await self.send_with_retry(
+                                self.bot.send_video,
+                                video=self.server_file_uri(parts[index]),
+                                thumbnail=self.server_file_uri(detail['thumbnail']) if has_thumbnail else None,
+                                **params
+                            )
+                        else:
+                            message = await self.send_with_retry(
+                                self.uploader.send_video,
+                                video=self.upload_file(parts[index], 'video/mp4'),
+                                thumbnail=self.upload_file(detail['thumbnail'], 'image/jpeg') if has_thumbnail else None,
+                                on_progress=part_progress(index),
+                                **params
+                            )
+                        staged.append(message)
+                        logger.info(f"Uploaded part {index + 1}/{len(parts)}")
+                        return message.video.file_id
+
+                logger.info(f"Uploading {len(parts)} parts ({file_size_mb:.2f} MB in total)...")
+                # Let every upload finish before bailing out, so none is left behind in the staging chat
+                media = await asyncio.gather(*(stage(index) for index in range(len(parts))), return_exceptions=True)
+                for result in media:
+                    if isinstance(result, BaseException):
+                        raise result
+                # Parts sent by file_id keep the thumbnail they were uploaded with
+                posted = [dict(detail, thumbnail=None) for detail in details]
+            else:
+                media = [self.file_input(part, 'video/mp4') for part in parts]
+                posted = [
+                    dict(detail, thumbnail=self.file_input(detail['thumbnail'], 'image/jpeg') if detail['thumbnail'] else None)
+                    for detail in details
+                ]
+
+            messages = await self.post_parts(media, posted, file_size_mb, on_progress)
+            logger.info(f"Video uploaded successfully to Telegram in {len(parts)} parts")
+            return messages
+
+        except telegram.error.TelegramError as e:
+            logger.error(f"Telegram error uploading video parts: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error uploading video parts: {e}")
+            return None
+        finally:
+            for message in staged:
+                try:
+                    await self.bot.delete_message(chat_id=SPLIT_STAGING_CHAT_ID, message_id=message.message_id)
+                except telegram.error.TelegramError as e:
+                    logger.warning(f"Could not remove staged part from the staging chat: {e}")
+            for detail in details:
+                if detail['thumbnail']:
+                    self.remove_temp_file(detail['thumbnail'])
+
+    async def post_parts(self, media, details, file_size_mb, on_progress=None):
+        """
+        Post the parts of a video (file_ids, server paths or UploadFiles, with their
+        metadata and thumbnail in details) to the channel as albums of at most
+        MEDIA_GROUP_SIZE, captioned "Part i/n". Returns the sent messages.
+        The upload of each album of UploadFiles is reported to on_progress(sent, total).
+        """
+        count = len(media)
+        items = []
+        for index, (video, detail) in enumerate(zip(media, details)):
+            caption = f"🎞 Part {index + 1}/{count}"
+            if index == 0:
+                caption = f"📹 New video uploaded\n\n📦 Size: {file_size_mb:.2f} MB\n{caption}"
+            items.append({
+                'media': video,
+                'caption': caption,
+                'thumbnail': detail.get('thumbnail'),
+                'duration': detail.get('duration'),
+                'width': detail.get('width'),
+                'height': detail.get('height'),
+                'supports_streaming': True
+            })
+
+        # Even album sizes: a single leftover part could not be sent as an album
+        group_size = math.ceil(count / math.ceil(count / MEDIA_GROUP_SIZE))
+        messages = []
+        for start in range(0, count, group_size):
+            group = items[start:start + group_size]
+            if isinstance(group[0]['media'], bot_api_upload.UploadFile):
+                # File uploads are streamed from disk
+                messages.extend(await self.send_with_retry(
+                    self.uploader.send_media_group, self.channel_id, group, on_progress
+                ))
+            else:
+                messages.extend(await self.send_with_retry(
+                    self.bot.send_media_group,
+                    chat_id=self.channel_id,
+                    media=[telegram.InputMediaVideo(**item) for item in group],
+                    read_timeout=600,
+                    write_timeout=600,
+                    connect_timeout=600
+                ))
+        return messages
+
+    async def stream_video(self, video_info):
+        """
+        Forward the source video straight into the Telegram upload without a temp file.
+
+        The first STREAM_HEAD_MB of the response are buffered to extract metadata and a
+        thumbnail; the rest flows through a bounded buffer into the multipart body. When
+        the head has no usable metadata (e.g. the moov atom is at the end of the file), the
+        size is unknown or the video has to be split, the stream is spilled to a temp file,
+        which is then handled like a download (hashed, recorded as downloaded, moov moved
+        to the front) and uploaded as usual. Returns the sent message(s), or None on failure.
+        """
+        video_id = video_info['id']
+        head_path = self.temp_path(f"temp_video_{video_id}_head.mp4")
+        thumbnail = None
         try:
-            if os.path.exists(temp_video_path):
-                os.remove(temp_video_path)
-                logger.info(f"Removed temporary file: {temp_video_path}")
+            # Content-Length must be the size of the file that is uploaded
+            stream = self.http.stream(video_info['download_url'], headers=IDENTITY_ENCODING)
+            async with self.download_slots, stream as response:
+                response.raise_for_status()
+                total_size = int(response.headers.get('content-length', 0))
+                video_info['size'] = total_size
+                chunks = self.services.download_bandwidth.shape(response.aiter_bytes(DOWNLOAD_CHUNK_SIZE_KB * 1024))
+                logger.info(f"Streaming video ({total_size / (1024*1024):.2f} MB) from {video_info['download_url']}")
+                # Parts are cut from a complete file
+                oversized = total_size > MAX_VIDEO_SIZE_MB * 1024 * 1024
+
+                # Buffer the head of the stream for metadata and thumbnail extraction
+                head = bytearray()
+                async for chunk in chunks:
+                    head += chunk
+                    if len(head) >= STREAM_HEAD_MB * 1024 * 1024:
+                        break
+
+                metadata = None
+                if total_size and not oversized:
+                    metadata, _ = await self.cpu.run(mp4_probe.probe_bytes, bytes(head))
+                if metadata:
+                    # OpenCV needs a file to grab the thumbnail frame from
+                    with open(head_path, 'wb') as f:
+                        await asyncio.to_thread(f.write, head)
+                    thumbnail = await self.generate_thumbnail(head_path, head_path.replace('.mp4', '_thumb.jpg'))
+                    self.remove_temp_file(head_path)
+
+                if not metadata:
+                    # Nothing usable in the head, or too big for one upload: finish the download to disk instead
+                    if oversized:
+                        logger.info(f"Video is over {MAX_VIDEO_SIZE_MB} MB, spilling the stream to a temp file to split it")
+                    else:
+                        logger.info("No metadata in the stream head, spilling the stream to a temp file")
+                    temp_video_path = self.video_temp_path(video_id)
+                    if not self.spool.try_reserve(temp_video_path, total_size, video_info.get('queued_at')):
+                        logger.error("Not enough spool space to save the stream to a temp file")
+                        return None
+                    self.store.transition(
+                        video_id, state_store.DOWNLOADING, path=temp_video_path, fingerprint=video_info.get('fingerprint')
+                    )
+
+                    async def spilled():
+                        yield bytes(head)
+                        async for chunk in chunks:
+                            yield chunk
+
+                    hasher = BlockHasher()
+                    received = 0
+                    try:
+                        # Disk writes run in a thread so a slow disk does not stall the event loop
+                        with open(temp_video_path, 'wb') as f:
+                            async for chunk in spilled():
+                                await asyncio.to_thread(f.write, chunk)
+                                hasher.update(chunk)
+                                received += len(chunk)
+                        if total_size and received != total_size:
+                            raise DownloadError(f"Stream is incomplete: got {received} of {total_size} bytes")
+                    except BaseException:
+                        # Without a segment record a partial spill cannot be resumed
+                        self.remove_temp_file(temp_video_path)
+                        raise
+                else:
+                    buffer = asyncio.Queue(maxsize=max(1, STREAM_BUFFER_MB // max(1, DOWNLOAD_CHUNK_SIZE_KB // 1024)))
+
+                    async def pump():
+                        # Read ahead of the upload, bounded by the buffer size
+                        try:
+                            async for chunk in chunks:
+                                await buffer.put(chunk)
+                            await buffer.put(None)
+                        except Exception as e:
+                            await buffer.put(e)
+
+                    async def body():
+                        yield bytes(head)
+                        while True:
+                            item = await buffer.get()
+                            if item is None:
+                                return
+                            if isinstance(item, Exception):
+                                raise item
+                            yield item
+
+                    thumbnail_part = None
+                    if thumbnail and os.path.exists(thumbnail):
+                        with open(thumbnail, 'rb') as f:
+                            thumbnail_part = bot_api_upload.UploadFile.from_bytes('thumbnail.jpg', f.read(), 'image/jpeg')
+
+                    logger.info(f"Duration: {metadata['duration']}s, Resolution: {metadata['width']}x{metadata['height']}")
+                    pump_task = asyncio.create_task(pump())
+                    try:
+                        message = await self.uploader.send_video(
+                            chat_id=self.channel_id,
+                            video=bot_api_upload.UploadFile(f"video_{video_id}.mp4", total_size, body(), 'video/mp4'),
+                            thumbnail=thumbnail_part,
+                            on_progress=self.transfer_status(video_id, "⬆️ <b>Streaming to channel</b>"),
+                            caption=f"📹 New video uploaded\n\n📦 Size: {total_size / (1024 * 1024):.2f} MB",
+                            duration=metadata['duration'],
+                            width=metadata['width'],
+                            height=metadata['height'],
+                            supports_streaming=True
+                        )
+                    finally:
+                        pump_task.cancel()
+                    logger.info("Video streamed successfully to Telegram")
+                    return message
+
+            # The stream was spilled to disk: finish it like a download, then upload it the regular way
+            digest = content_hash(hasher.finish())
+            await self.make_faststart(temp_video_path)
+            video_info['size'] = os.path.getsize(temp_video_path)
+            self.store.transition(
+                video_id, state_store.DOWNLOADED, path=temp_video_path, size=video_info['size'], content_hash=digest
+            )
+            video_info['path'] = temp_video_path
+            video_info['content_hash'] = digest
+            if self.find_uploaded(video_info):
+                return await self.resend_video(video_info['file_id'], video_info['size'] / (1024 * 1024))
+            return await self.upload_prepared(video_info)
+
+        except telegram.error.TelegramError as e:
+            logger.error(f"Telegram error streaming video: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error streaming video: {e}")
+            return None
+        finally:
+            self.remove_temp_file(head_path)
+            if thumbnail:
+                self.remove_temp_file(thumbnail)
+
+    def discard_prepared(self, video_info):
+        """Remove the temporary files of a prepared video"""
+        for key in ('path', 'thumbnail'):
+            if video_info.get(key):
+                self.remove_temp_file(video_info[key])
+        self.discard_parts(video_info)
+
+    def discard_parts(self, video_info):
+        """Remove the parts of a split video; they are cut again from the video if needed"""
+        for part in video_info.pop('parts', None) or ():
+            self.remove_temp_file(part)
+
+    def discard_thumbnail(self, video_info):
+        """Remove only the thumbnail of a prepared video; the video stays for a later attempt"""
+        if video_info.get('thumbnail'):
+            self.remove_temp_file(video_info['thumbnail'])
+
+    def remove_temp_file(self, path):
+        """Remove a temporary file if it exists"""
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info(f"Removed temporary file: {path}")
         except Exception as e:
             logger.warning(f"Could not remove temporary file: {e}")
 
-        return upload_success
+    def abandon_if_exhausted(self, video_info):
+        """
+        Give up on a video that has failed MAX_VIDEO_ATTEMPTS times: settle it as abandoned
+        and remove its files, so the videos published after it are no longer held back.
+        Returns True if the video was abandoned.
+        """
+        video_id = video_info['id']
+        record = self.store.get(video_id) or {}
+        if record.get('state') != state_store.FAILED or record['attempts'] < MAX_VIDEO_ATTEMPTS:
+            return False
+        logger.error(f"Abandoning video {video_id} after {record['attempts']} failed attempts: {record['error']}")
+        self.store.transition(video_id, state_store.ABANDONED)
+        self.discard_prepared(video_info)
+        temp_video_path = self.video_temp_path(video_id)
+        self.remove_temp_file(temp_video_path)
+        self.remove_temp_file(self.downloader.state_path(temp_video_path))
+        self.send_admin_message(
+            f"🚫 <b>Gave up on video {video_id}</b> after {record['attempts']} failed attempts\n"
+            f"Last error: {record['error']}\n"
+            f"{video_info['url']}"
+        )
+        return True
+
+    async def process_backlog(self, new_videos):
+        """
+        Process all new videos oldest-first with a bounded pool of concurrent jobs.
+
+        Downloads run concurrently (up to MAX_CONCURRENT_JOBS videos in flight), while
+        uploads are published strictly in order, so the download of video N+1 overlaps
+        the upload of video N. The download URLs of all videos are resolved up front (at
+        most RESOLVE_CONCURRENCY pages at a time), so no job waits on a page fetch. After
+        a failure the remaining videos are left for the next check (where they resume
+        from their last finished stage), so the channel never gets posts out of order.
+        A video that has failed MAX_VIDEO_ATTEMPTS times is abandoned instead, and the
+        videos after it go ahead.
+        """
+        # get_new_videos() returns newest first; publish in chronological order
+        videos = list(reversed(new_videos))
+        slots = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+        loop = asyncio.get_running_loop()
+        turns = [loop.create_future() for _ in videos]
+
+        self.metrics.set('queue_depth', len(videos), source=self.name)
+        in_flight = 0
+
+        # Fetch the pages of all pending videos now, so no download waits for its page
+        for video_info in videos:
+            self.known_download_url(video_info['id'], self.store.get(video_info['id']) or {})
+        self.resolver.prefetch(videos)
+
+        async def job(index, video_info):
+            nonlocal in_flight
+            success = previous_ok = False
+            in_flight += 1
+            self.metrics.set('jobs_in_flight', in_flight, source=self.name)
+            try:
+                prepared = await self.prepare_video(video_info)
+
+                # Wait until every earlier video has been published (or has failed)
+                previous_ok = await turns[index - 1] if index > 0 else True
+                if not prepared:
+                    return False
+                if not previous_ok:
+                    logger.info(f"Skipping upload of video {video_info['id']}: an earlier video failed")
+                    self.update_status(
+                        video_info['id'], "⏸ <b>Postponed to the next check:</b> an earlier video failed", final=True
+                    )
+                    self.discard_thumbnail(video_info)
+                    self.discard_parts(video_info)
+                    return False
 
-    async def send_startup_message(self):
+                success = await self.publish_video(video_info)
+                if not success:
+                    logger.error(f"Failed to process video {video_info['id']}, will retry next time")
+                return success
+            finally:
+                # A failed video's files stay for the next attempt, but no longer hold the budget
+                self.spool.release(self.video_temp_path(video_info['id']))
+                # A video given up on no longer holds back the ones after it
+                abandoned = self.abandon_if_exhausted(video_info)
+                in_flight -= 1
+                self.metrics.set('jobs_in_flight', in_flight, source=self.name)
+                self.metrics.set('queue_depth', len(videos) - index - 1, source=self.name)
+                turns[index].set_result(success or (abandoned and previous_ok))
+                slots.release()
+
+        # Slots are acquired in order, so a job never waits on a video that has no slot
+        tasks = []
+        for index, video_info in enumerate(videos):
+            # Spool space goes to the earliest queued video first
+            video_info['queued_at'] = time.monotonic()
+            await slots.acquire()
+            if any(turn.done() and not turn.result() for turn in turns[:index]):
+                slots.release()
+                logger.info(f"Stopping backlog at video {video_info['id']}: an earlier video failed")
+                break
+            tasks.append(asyncio.create_task(job(index, video_info)))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.metrics.set('queue_depth', 0, source=self.name)
+        for video_info, result in zip(videos, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing video {video_info['id']}: {result}")
+        return sum(1 for result in results if result is True)
+
+    def send_startup_message(self):
         """Send a startup status message to admin"""
-        last_id_display = f"<code>{self.last_video_id}</code>" if self.last_video_id else "<i>None (first run)</i>"
+        last_id = self.store.last_uploaded()
+        last_id_display = f"<code>{last_id}</code>" if last_id else "<i>None yet</i>"
+        check_interval = self.source['check_interval']
         startup_msg = (
             "🤖 <b>Video Parser Bot Started!</b>\n\n"
             f"📡 <b>Website:</b> {self.website_url}\n"
-            f"🔄 <b>Check Interval:</b> {CHECK_INTERVAL} seconds ({CHECK_INTERVAL // 60} minutes)\n"
+            f"🔄 <b>Check Interval:</b> {check_interval} seconds ({check_interval // 60} minutes)\n"
             f"📊 <b>Last Processed Video:</b> {last_id_display}\n\n"
             "✅ Bot is running and monitoring for new videos..."
         )
-        return await self.send_admin_message(startup_msg, parse_mode='HTML')
+        return self.send_admin_message(startup_msg)
 
-    async def run(self):
-        """Main loop to check for new videos periodically"""
-        logger.info("Starting Video Parser Bot")
+    def log_startup(self):
+        """Log the configuration and known videos, and clean up the spool"""
+        source = self.source
+        logger.info(f"Starting Video Parser Bot for source {self.name}")
         logger.info(f"Website: {self.website_url}")
         logger.info(f"Telegram Channel: {self.channel_id}")
-        logger.info(f"Check interval: {CHECK_INTERVAL} seconds")
-
-        # If this is the first run (no saved video ID), get the latest video ID
-        # and save it without processing, so only new videos after this will be processed
-        is_first_run = self.last_video_id is None
-        if is_first_run:
-            logger.info("First run detected - will fetch only the latest video ID without processing")
-            latest_id = self.get_latest_video_id()
-            if latest_id:
-                self.save_last_video_id(latest_id)
-                self.last_video_id = latest_id
-                logger.info(f"Saved latest video ID: {latest_id}. Future runs will only process new videos after this one.")
-            else:
-                logger.warning("Could not get latest video ID on first run")
+        logger.info(f"Check interval: {source['poll_min_interval']}-{source['poll_max_interval']} seconds "
+                    f"(default {source['check_interval']})")
 
-        logger.info(f"Last processed video ID: {self.last_video_id}")
+        counts = ', '.join(f"{count} {state}" for state, count in sorted(self.store.counts().items()))
+        logger.info(f"Known videos: {counts or 'none (first run)'}")
+        self.recover_spool()
 
-        # Send startup test message immediately
-        await self.send_startup_message()
+    async def check(self):
+        """
+        One check of the website: record the baseline on the first run, then process any
+        new videos. Returns (new videos, published count); the count is None on error.
+        """
+        new_videos = []
+        try:
+            if not len(self.store):
+                # If this is the first run, record the videos already on the website
+                # without processing them, so only new videos after them are processed
+                logger.info("First run detected - recording the current videos without processing")
+                if not await self.record_baseline():
+                    logger.warning("Could not read the video list on first run, retrying at the next check")
+
+            logger.info("Checking for new videos...")
+            new_videos = await self.get_new_videos() if len(self.store) else []
+
+            self.scheduler.record_check(len(new_videos))
+            if not new_videos:
+                logger.info("No new videos found")
+                return new_videos, 0
+
+            logger.info(f"Found {len(new_videos)} new video(s), processing up to {MAX_CONCURRENT_JOBS} at a time")
+            self.send_admin_message(
+                f"🎬 <b>Found {len(new_videos)} new video(s)!</b>\n"
+                f"Processing oldest first, up to {MAX_CONCURRENT_JOBS} at a time..."
+            )
 
-        while True:
-            try:
-                logger.info("Checking for new videos...")
-                new_videos = self.get_new_videos()
-
-                if new_videos:
-                    # Only process the first video (newest one)
-                    video_info = new_videos[0]
-
-                    if len(new_videos) > 1:
-                        logger.info(f"Found {len(new_videos)} new video(s), processing only the first one")
-                        await self.send_admin_message(
-                            f"🎬 <b>Found {len(new_videos)} new video(s)!</b>\n"
-                            f"Processing the newest one (ID: <code>{video_info['id']}</code>)...",
-                            parse_mode='HTML'
-                        )
-                    else:
-                        logger.info(f"Found 1 new video")
-                        await self.send_admin_message(
-                            f"🎬 <b>Found 1 new video!</b>\n"
-                            f"Starting download and upload process...",
-                            parse_mode='HTML'
-                        )
+            # Process the whole backlog; the last video ID advances as videos are published
+            published = await self.process_backlog(new_videos)
+            if published < len(new_videos):
+                logger.error(f"Published {published}/{len(new_videos)} new video(s), will retry the rest next time")
+            return new_videos, published
 
-                    # Process only the first (newest) video
-                    success = await self.process_video(video_info)
+        except Exception as e:
+            logger.error(f"Error in main loop: {e}")
+            self.send_admin_message(
+                f"⚠️ <b>Error in main loop:</b>\n"
+                f"<code>{str(e)}</code>"
+            )
+            return new_videos, None
 
-                    if success:
-                        # Update last video ID after successful processing
-                        self.save_last_video_id(video_info['id'])
-                        self.last_video_id = video_info['id']
-                    else:
-                        logger.error(f"Failed to process video {video_info['id']}, will retry next time")
-                        # Don't update last_video_id so we retry this video next time
-                else:
-                    logger.info("No new videos found")
+    async def run_once(self):
+        """Check once and return whether every new video was published (for cron and timers)"""
+        self.log_startup()
+        new_videos, published = await self.check()
+        return published == len(new_videos)
 
-            except Exception as e:
-                logger.error(f"Error in main loop: {e}")
-                await self.send_admin_message(
-                    f"⚠️ <b>Error in main loop:</b>\n"
-                    f"<code>{str(e)}</code>",
-                    parse_mode='HTML'
+    async def run(self):
+        """Main loop to check for new videos periodically"""
+        self.log_startup()
+
+        if self.owns_services:
+            await self.services.start()
+
+        # Send startup test message immediately
+        self.send_startup_message()
+
+        while True:
+            new_videos, _ = await self.check()
+
+            # Wait before next check; the wait adapts to when the next upload is expected
+            interval = self.scheduler.next_interval()
+            next_check_time = time.strftime('%H:%M:%S', time.localtime(time.time() + interval))
+            logger.info(f"Waiting {interval} seconds before next check...")
+            if new_videos:
+                # Frequent polls inside the upload window would flood the admin chat
+                message = (
+                    f"⏳ <b>Next check at:</b> {next_check_time}\n"
+                    f"💤 Sleeping for {interval // 60} minutes..."
                 )
+                window = self.scheduler.predicted_window()
+                if window:
+                    expected = time.strftime('%H:%M', time.localtime(sum(window) / 2))
+                    message += f"\n🔮 Next upload expected around {expected}"
+                self.send_admin_message(message)
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        """Close the state database, and the services if this bot owns them"""
+        self.resolver.cancel()
+        if self.owns_services:
+            await self.services.aclose()
+        self.store.close()
+
+
+async def run_sources(configured, once=False):
+    """
+    Monitor several sources concurrently in one event loop, on shared services.
+    With once, check every source a single time; returns whether all new videos were published.
+    """
+    services = SharedServices()
+    bots = []
+    try:
+        for source in configured:
+            bots.append(VideoParserBot(source, services))
+        if once:
+            return all(await asyncio.gather(*(bot.run_once() for bot in bots)))
+        logger.info(f"Monitoring {len(bots)} source(s), at most {MAX_CONCURRENT_DOWNLOADS} downloads at a time")
+        await services.start()
+        await asyncio.gather(*(bot.run() for bot in bots))
+    finally:
+        for bot in bots:
+            await bot.close()
+        await services.aclose()
+
+
+async def main(once=False):
+    """Run the bot; with once, check a single time and return whether all new videos were published"""
+    if SOURCES_FILE:
+        configured = load_sources(
+            SOURCES_FILE, {'check_interval': CHECK_INTERVAL, 'poll_min_interval': POLL_MIN_INTERVAL}
+        )
+        return await run_sources(configured, once)
 
-            # Wait before next check
-            next_check_time = time.strftime('%H:%M:%S', time.localtime(time.time() + CHECK_INTERVAL))
-            logger.info(f"Waiting {CHECK_INTERVAL} seconds before next check...")
-            await self.send_admin_message(
-                f"⏳ <b>Next check at:</b> {next_check_time}\n"
-                f"💤 Sleeping for {CHECK_INTERVAL // 60} minutes...",
-                parse_mode='HTML'
-            )
-            await asyncio.sleep(CHECK_INTERVAL)
+    bot = VideoParserBot()
+    try:
+        if once:
+            return await bot.run_once()
+        await bot.run()
+    finally:
+        await bot.close()
 
 
 if __name__ == "__main__":
-    bot = VideoParserBot()
-    asyncio.run(bot.run())
+    arg_parser = argparse.ArgumentParser(description="Post new videos from a website to a Telegram channel")
+    arg_parser.add_argument(
+        '--once', action='store_true',
+        help='check once, process any new videos and exit (for cron or systemd timers); exits with 1 if a video failed'
+    )
+    args = arg_parser.parse_args()
+    if args.once:
+        sys.exit(0 if asyncio.run(main(once=True)) else 1)
+    asyncio.run(main())